@@ -45,13 +45,25 @@ CREATE TABLE IF NOT EXISTS logs.incidents (
     correlated_events String, -- JSON array
     timeline String, -- JSON array 
     suggested_runbooks Array(String),
-    metadata String -- JSON object
+    metadata String, -- JSON object
+    log_template_id UInt64 DEFAULT 0, -- mined log template (0 for metric incidents)
+    log_template String DEFAULT '',
+    -- Point lookups by incident_id skip granules that cannot contain the ID
+    INDEX idx_incident_id incident_id TYPE bloom_filter(0.01) GRANULARITY 1
 ) ENGINE = MergeTree()
 PARTITION BY toYYYYMM(created_at)
 ORDER BY (created_at, incident_id, ship_id)
 TTL created_at + INTERVAL 90 DAY
 SETTINGS index_granularity = 8192;
 
+-- Add log template columns to tables created before they were part of the schema
+ALTER TABLE logs.incidents ADD COLUMN IF NOT EXISTS log_template_id UInt64 DEFAULT 0 AFTER metadata;
+ALTER TABLE logs.incidents ADD COLUMN IF NOT EXISTS log_template String DEFAULT '' AFTER log_template_id;
+
+-- Add the lookup index to tables created before it was part of the schema
+ALTER TABLE logs.incidents ADD INDEX IF NOT EXISTS idx_incident_id incident_id TYPE bloom_filter(0.01) GRANULARITY 1;
+ALTER TABLE logs.incidents MATERIALIZE INDEX idx_incident_id;
+
 -- Audit table for runbook executions and manual actions
 CREATE TABLE IF NOT EXISTS logs.audit (
     audit_id String,
@@ -86,6 +98,68 @@ FROM logs.raw
 GROUP BY hour, source, level
 ORDER BY hour DESC;
 
+-- Hourly metric baselines rolled up from host_metrics log lines.
+-- Anomaly detection reads this instead of scanning 7 days of logs.raw per tick.
+CREATE TABLE IF NOT EXISTS logs.metric_baselines_hourly (
+    hour DateTime,
+    metric_name LowCardinality(String),
+    host LowCardinality(String),
+    avg_state AggregateFunction(avg, Float64),
+    quantiles_state AggregateFunction(quantiles(0.5, 0.95, 0.99), Float64),
+    sample_count SimpleAggregateFunction(sum, UInt64)
+) ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(hour)
+ORDER BY (metric_name, host, hour)
+TTL hour + INTERVAL 30 DAY
+SETTINGS index_granularity = 8192;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS logs.metric_baselines_hourly_mv
+TO logs.metric_baselines_hourly AS
+SELECT
+    toStartOfHour(timestamp) as hour,
+    extract(message, '^Metric: (\\S+) = ') as metric_name,
+    host,
+    avgState(metric_value) as avg_state,
+    quantilesState(0.5, 0.95, 0.99)(metric_value) as quantiles_state,
+    toUInt64(count()) as sample_count
+FROM (
+    SELECT
+        timestamp,
+        message,
+        host,
+        toFloat64OrZero(extractAll(message, '[0-9]+\\.?[0-9]*')[1]) as metric_value
+    FROM logs.raw
+    WHERE source = 'host_metrics'
+)
+GROUP BY hour, metric_name, host;
+
+-- One-time backfill of history logged before the materialized view existed.
+-- Only hours older than the earliest rolled-up hour are copied, so re-running
+-- this script does not double count what the view already captured.
+INSERT INTO logs.metric_baselines_hourly
+SELECT
+    toStartOfHour(timestamp) as hour,
+    extract(message, '^Metric: (\\S+) = ') as metric_name,
+    host,
+    avgState(metric_value) as avg_state,
+    quantilesState(0.5, 0.95, 0.99)(metric_value) as quantiles_state,
+    toUInt64(count()) as sample_count
+FROM (
+    SELECT
+        timestamp,
+        message,
+        host,
+        toFloat64OrZero(extractAll(message, '[0-9]+\\.?[0-9]*')[1]) as metric_value
+    FROM logs.raw
+    WHERE source = 'host_metrics'
+      AND timestamp >= now() - INTERVAL 30 DAY
+      AND timestamp < (
+          SELECT if(count() = 0, toStartOfHour(now()), min(hour))
+          FROM logs.metric_baselines_hourly
+      )
+)
+GROUP BY hour, metric_name, host;
+
 -- Create incident summary view
 CREATE VIEW IF NOT EXISTS logs.incident_summary AS
 SELECT
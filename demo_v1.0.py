@@ -18,6 +18,7 @@ from datetime import datetime, timedelta
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src/v1.0'))
+sys.path.append(os.path.join(os.path.dirname(__file__), 'services/shared'))
 
 def print_section(title):
     print(f"\n{'='*60}")
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+AIOps NAAS - Log Template Miner Benchmark
+
+Measures LogTemplateMiner throughput on a synthetic maritime log mix, or on
+a recorded log file (one message per line).
+
+Usage:
+  python3 scripts/benchmark_log_templates.py
+  python3 scripts/benchmark_log_templates.py --lines 500000
+  python3 scripts/benchmark_log_templates.py --input sample-logs/app.log
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'services', 'shared'))
+
+from log_templates import LogTemplateMiner  # noqa: E402
+
+LOG_FORMATS = (
+    "2025-09-11T13:45:{s:02d}.{ms:03d}Z ERROR database connection timeout after {n}ms on host node-{h}",
+    "User {user} logged in from 10.0.{a}.{b}",
+    "Disk usage at {pct}% on /dev/sda{h}",
+    "Heartbeat ok seq={n}",
+    "Failed to open file /var/log/app{h}.log: permission denied",
+    "GPS fix lost after {n} seconds on receiver {h}",
+    "Satellite link {state} snr={snr} dB modem={h}",
+    "Request {uuid} completed in {n}ms status={status}",
+)
+
+
+def make_lines(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    users = [f"crew{i:03d}" for i in range(200)] + ["captain", "engineer", "navigator"]
+    lines = []
+    for _ in range(count):
+        lines.append(rng.choice(LOG_FORMATS).format(
+            s=rng.randrange(60), ms=rng.randrange(1000), n=rng.randrange(100000), h=rng.randrange(16),
+            user=rng.choice(users), a=rng.randrange(256), b=rng.randrange(256), pct=rng.randrange(100),
+            state=rng.choice(("degraded", "restored", "lost")), snr=round(rng.uniform(2, 20), 1),
+            uuid=f"{rng.getrandbits(32):08x}-1111-2222-3333-{rng.getrandbits(48):012x}",
+            status=rng.choice((200, 404, 500)),
+        ))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming log template miner")
+    parser.add_argument("--input", help="Log file to mine (one message per line)")
+    parser.add_argument("--lines", type=int, default=200000, help="Synthetic lines to generate")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input, errors="replace") as f:
+            lines = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        lines = make_lines(args.lines)
+
+    miner = LogTemplateMiner()
+    start = time.perf_counter()
+    for line in lines:
+        miner.add(line)
+    elapsed = time.perf_counter() - start
+
+    print(f"Lines: {len(lines)}  Templates: {len(miner.templates)}")
+    print(f"  throughput   {len(lines) / elapsed:12,.0f} lines/s")
+    print(f"  per line     {elapsed / max(len(lines), 1) * 1e6:12.2f} us")
+    print(f"  cache hits   {miner.stats['cache_hits'] / max(len(lines), 1):12.1%}")
+    for template in sorted(miner.templates, key=lambda t: -t.size)[:10]:
+        print(f"  {template.size:>8}  {template.template_id:016x}  {template.template}")
+
+
+if __name__ == "__main__":
+    main()
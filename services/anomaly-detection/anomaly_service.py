@@ -17,19 +17,28 @@ The service:
 import asyncio
 import logging
 import json
+import os
 import time
 import re
-import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Callable, Awaitable, Tuple
 from dataclasses import dataclass
-from collections import deque
+from collections import OrderedDict
 from fastapi import FastAPI
 import uvicorn
+import numpy as np
+from sortedcontainers import SortedList
 
-import requests
+import httpx
 from nats.aio.client import Client as NATS
 from clickhouse_driver import Client as ClickHouseDriverClient
+from clickhouse_driver.errors import ServerException
+import yaml
+
+from log_templates import LogTemplateMiner
+from registry_client import DeviceRegistryClient
 
 # Configure logging
 logging.basicConfig(
@@ -72,132 +81,382 @@ class MetricQuery:
     threshold: float = 0.5
     enabled: bool = True
 
+class SortedWindow:
+    """Sorted view of one series window for O(log n) median and MAD
+
+    Used by ``SeriesWindowMatrix`` for large windows, where a full
+    ``np.median`` partition per series and tick costs more than keeping the
+    window sorted as samples arrive and leave.
+    """
+
+    __slots__ = ('values',)
+
+    def __init__(self):
+        self.values = SortedList()
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, value: float):
+        self.values.add(value)
+
+    def remove(self, value: float):
+        self.values.remove(value)
+
+    def median(self) -> float:
+        """Median of the current window"""
+        values = self.values
+        n = len(values)
+        mid = n // 2
+        if n % 2:
+            return values[mid]
+        return (values[mid - 1] + values[mid]) / 2.0
+
+    def mad(self, median: float) -> float:
+        """Median absolute deviation around ``median``"""
+        n = len(self.values)
+        mid = n // 2
+        if n % 2:
+            return self._kth_abs_deviation(median, mid)
+        return (self._kth_abs_deviation(median, mid - 1) + self._kth_abs_deviation(median, mid)) / 2.0
+
+    def _kth_abs_deviation(self, median: float, k: int) -> float:
+        """k-th smallest |x - median| over the window in O(log^2 n)
+
+        Values below the median and values at/above it each form a sorted run of
+        deviations, so the k-th deviation is the k-th element of two sorted runs.
+        """
+        values = self.values
+        pivot = values.bisect_left(median)
+        n_left = pivot
+        n_right = len(values) - pivot
+
+        def left(i: int) -> float:
+            return median - values[pivot - 1 - i]
+
+        def right(j: int) -> float:
+            return values[pivot + j] - median
+
+        # i = number of deviations taken from the left run
+        lo, hi = max(0, k + 1 - n_right), min(k + 1, n_left)
+        while lo < hi:
+            i = (lo + hi) // 2
+            if left(i) < right(k - i):
+                lo = i + 1
+            else:
+                hi = i
+
+        i, j = lo, k + 1 - lo
+        candidates = []
+        if i > 0:
+            candidates.append(left(i - 1))
+        if j > 0:
+            candidates.append(right(j - 1))
+        return max(candidates)
+
+
+# Static per-metric thresholds used by the threshold detector
+STATIC_THRESHOLDS = {
+    'cpu_usage': 85.0,
+    'memory_usage': 90.0,
+    'disk_usage': 85.0
+}
+
+
+class SeriesWindowMatrix:
+    """NumPy window matrix holding every series of one metric for batch scoring
+
+    Each tracked series owns one row of a ``(rows, window_size)`` matrix plus
+    struct-of-arrays running state (Welford mean/M2, EWMA, recent samples), so a
+    whole query result can be scored and appended with a handful of array ops.
+    Windows of at least ``order_stats_min_window`` samples also keep a
+    ``SortedWindow`` per row so the MAD detector does not re-partition them.
+    """
+
+    RECENT_WINDOW = 10
+
+    def __init__(self, window_size: int, ewma_alpha: float = 0.3,
+                 max_series: int = 10000, series_ttl: float = 3600.0, initial_rows: int = 64,
+                 order_stats_min_window: int = 1024):
+        self.window_size = window_size
+        self.ewma_alpha = ewma_alpha
+        self.max_series = max_series
+        self.series_ttl = series_ttl
+        self.rows: "OrderedDict[str, int]" = OrderedDict()  # series_key -> row, LRU first
+        self.free_rows: List[int] = []
+        self.sorted_windows: Optional[List[Optional[SortedWindow]]] = \
+            [] if window_size >= order_stats_min_window else None  # row -> sorted samples
+        self.evicted_series = 0
+        self.capacity = 0
+        self._grow(min(initial_rows, max_series))
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _grow(self, capacity: int):
+        """Resize the per-row arrays to ``capacity`` rows"""
+        old = self.capacity
+
+        def resized(current, fill, shape, dtype=np.float64):
+            arr = np.full(shape, fill, dtype=dtype)
+            if current is not None:
+                arr[:old] = current
+            return arr
+
+        self.window = resized(getattr(self, 'window', None), np.nan, (capacity, self.window_size))
+        self.recent = resized(getattr(self, 'recent', None), np.nan, (capacity, self.RECENT_WINDOW))
+        self.count = resized(getattr(self, 'count', None), 0, capacity, np.int64)
+        self.total = resized(getattr(self, 'total', None), 0, capacity, np.int64)
+        self.mean = resized(getattr(self, 'mean', None), 0.0, capacity)
+        self.m2 = resized(getattr(self, 'm2', None), 0.0, capacity)
+        self.ewma = resized(getattr(self, 'ewma', None), 0.0, capacity)
+        self.last_seen = resized(getattr(self, 'last_seen', None), 0.0, capacity)
+        if self.sorted_windows is not None:
+            self.sorted_windows.extend([None] * (capacity - old))
+        self.free_rows.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def _reset_row(self, row: int):
+        self.window[row] = np.nan
+        self.recent[row] = np.nan
+        self.count[row] = 0
+        self.total[row] = 0
+        self.mean[row] = 0.0
+        self.m2[row] = 0.0
+        self.ewma[row] = 0.0
+        if self.sorted_windows is not None:
+            self.sorted_windows[row] = SortedWindow()
+
+    def _release_lru(self):
+        _, row = self.rows.popitem(last=False)
+        if self.sorted_windows is not None:
+            self.sorted_windows[row] = None
+        self.free_rows.append(row)
+        self.evicted_series += 1
+
+    def evict_idle_series(self, now: Optional[float] = None) -> int:
+        """Free rows of series that have not received a sample within ``series_ttl``"""
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.series_ttl
+        evicted = 0
+        while self.rows:
+            row = next(iter(self.rows.values()))
+            if self.last_seen[row] >= cutoff:
+                break
+            self._release_lru()
+            evicted += 1
+        return evicted
+
+    def _row_for(self, key: str, now: float) -> int:
+        row = self.rows.get(key)
+        if row is not None:
+            self.rows.move_to_end(key)
+            return row
+
+        if not self.free_rows:
+            if self.capacity < self.max_series:
+                self._grow(min(self.capacity * 2, self.max_series))
+            else:
+                self._release_lru()
+        row = self.free_rows.pop()
+        self._reset_row(row)
+        self.rows[key] = row
+        return row
+
+    def score_and_update(self, keys: List[str], values: np.ndarray, threshold: float) -> Dict[str, np.ndarray]:
+        """Score ``values`` against each series window, then append them
+
+        ``keys`` must be unique within a batch (a PromQL instant vector never
+        repeats a label set). Returns one score array per detector, aligned
+        with ``keys``.
+        """
+        now = time.monotonic()
+        self.evict_idle_series(now)
+        x = np.asarray(values, dtype=np.float64)
+        scored = min(len(keys), self.max_series)
+        if scored < len(keys):
+            logger.warning(f"Batch of {len(keys)} series exceeds max_series={self.max_series}; scoring first {scored}")
+        scores = {name: np.zeros(len(keys)) for name in ('zscore', 'ewma', 'mad', 'threshold')}
+        if scored == 0:
+            return scores
+
+        rows = np.fromiter((self._row_for(k, now) for k in keys[:scored]), dtype=np.intp, count=scored)
+        x = x[:scored]
+        n = self.count[rows]
+        mean = self.mean[rows]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Z-score
+            std = np.sqrt(np.maximum(self.m2[rows], 0.0) / np.maximum(n - 1, 1))
+            zscore = np.where((n >= 10) & (std > 0), np.minimum(np.abs(x - mean) / std / 3.0, 1.0), 0.0)
+
+            # EWMA against the mean of the last RECENT_WINDOW samples
+            recent_n = np.minimum(self.total[rows], self.RECENT_WINDOW)
+            recent_mean = np.nansum(self.recent[rows], axis=1) / np.maximum(recent_n, 1)
+            ewma = np.where(
+                (n >= 5) & (recent_mean != 0),
+                np.minimum(np.abs(x - self.ewma[rows]) / np.maximum(recent_mean, 1.0) / 2.0, 1.0),
+                0.0
+            )
+
+            # MAD - large windows read their sorted view, small ones are partitioned
+            # in place (full windows with a plain median, partial ones skipping NaN padding)
+            mad_score = np.zeros(scored)
+            eligible = np.flatnonzero(n >= 10)
+            if eligible.size:
+                median = np.empty(eligible.size)
+                mad = np.empty(eligible.size)
+                if self.sorted_windows is not None:
+                    for i, row in enumerate(rows[eligible].tolist()):
+                        window = self.sorted_windows[row]
+                        median[i] = window.median()
+                        mad[i] = window.mad(median[i])
+                else:
+                    windows = self.window[rows[eligible]]
+                    full = n[eligible] == self.window_size
+                    for mask, median_fn in ((full, np.median), (~full, np.nanmedian)):
+                        if mask.any():
+                            sub = windows[mask]
+                            med = median_fn(sub, axis=1)
+                            median[mask] = med
+                            mad[mask] = median_fn(np.abs(sub - med[:, None]), axis=1)
+                modified_z = 0.6745 * (x[eligible] - median) / mad
+                mad_score[eligible] = np.where(mad != 0, np.minimum(np.abs(modified_z) / 3.5, 1.0), 0.0)
+
+        threshold_score = np.where(x > threshold, np.minimum((x - threshold) / (100 - threshold), 1.0), 0.0) \
+            if threshold < 100 else np.zeros(scored)
+
+        scores['zscore'][:scored] = zscore
+        scores['ewma'][:scored] = ewma
+        scores['mad'][:scored] = mad_score
+        scores['threshold'][:scored] = threshold_score
+
+        self._append(rows, x, n, now)
+        return scores
+
+    def _append(self, rows: np.ndarray, x: np.ndarray, n: np.ndarray, now: float):
+        """Append one sample per row, evicting each full window's oldest sample"""
+        total = self.total[rows]
+        pos = total % self.window_size
+        mean = self.mean[rows]
+        m2 = self.m2[rows]
+
+        # Reverse Welford for rows whose oldest sample is overwritten
+        full = n == self.window_size
+        if full.any():
+            evicted = self.window[rows[full], pos[full]]
+            remaining = n[full] - 1
+            safe = np.maximum(remaining, 1)
+            delta = evicted - mean[full]
+            new_mean = mean[full] - delta / safe
+            new_m2 = m2[full] - delta * (evicted - new_mean)
+            mean[full] = np.where(remaining > 0, new_mean, 0.0)
+            m2[full] = np.where(remaining > 0, new_m2, 0.0)
+            n = np.where(full, n - 1, n)
+
+        if self.sorted_windows is not None:
+            for row, value, oldest, evict in zip(rows.tolist(), x.tolist(),
+                                                 self.window[rows, pos].tolist(), full.tolist()):
+                window = self.sorted_windows[row]
+                if evict:
+                    window.remove(oldest)
+                window.add(value)
+
+        self.window[rows, pos] = x
+        n = n + 1
+        delta = x - mean
+        mean = mean + delta / n
+        m2 = m2 + delta * (x - mean)
+
+        self.count[rows] = n
+        self.mean[rows] = mean
+        self.m2[rows] = m2
+        self.recent[rows, total % self.RECENT_WINDOW] = x
+        self.ewma[rows] = np.where(total == 0, x, self.ewma_alpha * x + (1 - self.ewma_alpha) * self.ewma[rows])
+        self.total[rows] = total + 1
+        self.last_seen[rows] = now
+
+
+def series_key(metric_name: str, labels: Optional[Dict[str, Any]] = None) -> str:
+    """Build a stable, Prometheus-style identity for a labelled series"""
+    if not labels:
+        return metric_name
+    label_str = ','.join(f'{k}="{labels[k]}"' for k in sorted(labels))
+    return f"{metric_name}{{{label_str}}}"
+
+
 class SimpleAnomalyDetectors:
-    """Collection of simple anomaly detectors"""
+    """Collection of simple anomaly detectors backed by incremental per-series state
+
+    State is keyed by metric name plus the full label set so every host/mountpoint
+    gets its own window, held in one ``SeriesWindowMatrix`` per metric. Tracked
+    series are kept in LRU order, capped at ``max_series`` per metric and dropped
+    after ``series_ttl`` seconds without samples.
+    """
     
-    def __init__(self, window_size: int = 50):
+    def __init__(self, window_size: int = 50, ewma_alpha: float = 0.3,
+                 max_series: int = 10000, series_ttl: float = 3600.0,
+                 order_stats_min_window: int = 1024):
         self.window_size = window_size
-        self.metric_history = {}  # metric_name -> deque of values
-        self.detectors = {
-            'zscore': self._zscore_detector,
-            'ewma': self._ewma_detector,
-            'mad': self._mad_detector,
-            'threshold': self._threshold_detector,
-        }
+        self.ewma_alpha = ewma_alpha
+        self.max_series = max_series
+        self.series_ttl = series_ttl
+        self.order_stats_min_window = order_stats_min_window
+        self.series_matrices: Dict[str, SeriesWindowMatrix] = {}  # metric_name -> series windows
     
-    def _get_history(self, metric_name: str) -> deque:
-        """Get or create history deque for metric"""
-        if metric_name not in self.metric_history:
-            self.metric_history[metric_name] = deque(maxlen=self.window_size)
-        return self.metric_history[metric_name]
+    def evict_idle_series(self, now: Optional[float] = None) -> int:
+        """Drop series that have not received a sample within ``series_ttl``"""
+        now = time.monotonic() if now is None else now
+        return sum(matrix.evict_idle_series(now) for matrix in self.series_matrices.values())
     
-    def _zscore_detector(self, metric_name: str, value: float) -> float:
-        """Z-score based anomaly detection"""
-        history = self._get_history(metric_name)
-        
-        if len(history) < 10:  # Need minimum history
-            return 0.0
-            
-        values = list(history)
-        mean = statistics.mean(values)
-        try:
-            stdev = statistics.stdev(values)
-            if stdev == 0:
-                return 0.0
-            z_score = abs((value - mean) / stdev)
-            return min(z_score / 3.0, 1.0)  # Normalize to 0-1
-        except:
-            return 0.0
-    
-    def _ewma_detector(self, metric_name: str, value: float) -> float:
-        """EWMA-based anomaly detection"""
-        history = self._get_history(metric_name)
-        
-        if len(history) < 5:
-            return 0.0
-        
-        # Calculate EWMA
-        alpha = 0.3  # Smoothing factor
-        ewma = value
-        for i, val in enumerate(reversed(list(history))):
-            ewma = alpha * val + (1 - alpha) * ewma
-            
-        # Anomaly score based on deviation from EWMA
-        if len(history) > 0:
-            recent_mean = statistics.mean(list(history)[-10:])
-            if recent_mean == 0:
-                return 0.0
-            deviation = abs(value - ewma) / max(recent_mean, 1.0)
-            return min(deviation / 2.0, 1.0)
-        return 0.0
-    
-    def _mad_detector(self, metric_name: str, value: float) -> float:
-        """MAD-based anomaly detection"""
-        history = self._get_history(metric_name)
-        
-        if len(history) < 10:
-            return 0.0
-            
-        values = list(history)
-        median = statistics.median(values)
-        mad = statistics.median([abs(x - median) for x in values])
-        
-        if mad == 0:
-            return 0.0
-            
-        # Modified z-score using MAD
-        modified_z = 0.6745 * (value - median) / mad
-        return min(abs(modified_z) / 3.5, 1.0)
-    
-    def _threshold_detector(self, metric_name: str, value: float) -> float:
-        """Simple threshold-based detection"""
-        thresholds = {
-            'cpu_usage': 85.0,
-            'memory_usage': 90.0,
-            'disk_usage': 85.0
-        }
-        
-        threshold = thresholds.get(metric_name, 100.0)
-        if value > threshold:
-            return min((value - threshold) / (100 - threshold), 1.0)
-        return 0.0
+    def update_and_detect(self, metric_name: str, value: float,
+                          labels: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+        """Update the series identified by metric name and labels and return anomaly scores"""
+        scores = self.update_and_detect_batch(metric_name, [labels], [value])
+        return {name: float(score[0]) for name, score in scores.items()}
     
-    def update_and_detect(self, metric_name: str, value: float) -> Dict[str, float]:
-        """Update detectors with new value and return anomaly scores"""
-        history = self._get_history(metric_name)
-        
-        # Calculate scores before adding new value
-        scores = {}
-        for detector_name, detector_func in self.detectors.items():
-            try:
-                score = detector_func(metric_name, value)
-                scores[detector_name] = score
-            except Exception as e:
-                logger.error(f"Error in detector {detector_name} for metric {metric_name}: {e}")
-                scores[detector_name] = 0.0
-        
-        # Add new value to history
-        history.append(value)
-        
-        return scores
+    def update_and_detect_batch(self, metric_name: str, labels: List[Optional[Dict[str, Any]]],
+                                values: List[float]) -> Dict[str, np.ndarray]:
+        """Score and append one sample for each labelled series of a metric in a single vectorized pass"""
+        matrix = self.series_matrices.get(metric_name)
+        if matrix is None:
+            matrix = SeriesWindowMatrix(self.window_size, self.ewma_alpha, self.max_series, self.series_ttl,
+                                        order_stats_min_window=self.order_stats_min_window)
+            self.series_matrices[metric_name] = matrix
+        keys = [series_key(metric_name, series_labels) for series_labels in labels]
+        return matrix.score_and_update(keys, values, STATIC_THRESHOLDS.get(metric_name, 100.0))
+    
+    @property
+    def tracked_series(self) -> int:
+        return sum(len(m) for m in self.series_matrices.values())
+    
+    @property
+    def evicted_series(self) -> int:
+        return sum(m.evicted_series for m in self.series_matrices.values())
 
 class VictoriaMetricsClient:
-    """Client for querying VictoriaMetrics"""
+    """Async client for querying VictoriaMetrics over a pooled HTTP connection"""
     
-    def __init__(self, base_url: str = "http://victoria-metrics:8428"):
+    def __init__(self, base_url: str = "http://victoria-metrics:8428",
+                 query_timeout: float = 10.0, health_timeout: float = 5.0, max_connections: int = 10):
         self.base_url = base_url
-        self.session = requests.Session()
+        self.query_timeout = query_timeout
+        self.health_timeout = health_timeout
+        self.session = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=query_timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
     
-    def query_instant(self, query: str) -> List[Dict[str, Any]]:
+    async def query_instant(self, query: str) -> List[Dict[str, Any]]:
         """Execute instant query against VictoriaMetrics"""
         try:
-            url = f"{self.base_url}/api/v1/query"
             params = {
                 'query': query,
                 'time': int(time.time())
             }
             
-            response = self.session.get(url, params=params, timeout=10)
+            response = await self.session.get("/api/v1/query", params=params, timeout=self.query_timeout)
             response.raise_for_status()
             
             data = response.json()
@@ -221,28 +480,145 @@ class VictoriaMetricsClient:
             logger.error(f"Error querying VictoriaMetrics: {e}")
             return []
     
-    def health_check(self) -> bool:
+    async def query_range(self, query: str, start: float, end: float, step: float) -> List[Dict[str, Any]]:
+        """Execute range query, returning ``{'metric', 'values': [(ts, value), ...]}`` per series"""
+        try:
+            params = {
+                'query': query,
+                'start': start,
+                'end': end,
+                'step': f"{step:g}s"
+            }
+            
+            response = await self.session.get("/api/v1/query_range", params=params, timeout=self.query_timeout)
+            response.raise_for_status()
+            
+            data = response.json()
+            if data['status'] != 'success':
+                logger.error(f"VictoriaMetrics range query failed: {data}")
+                return []
+            
+            return [
+                {
+                    'metric': result['metric'],
+                    'values': [(ts, float(value)) for ts, value in result['values']]
+                }
+                for result in data['data']['result']
+            ]
+            
+        except Exception as e:
+            logger.error(f"Error querying VictoriaMetrics range: {e}")
+            return []
+    
+    async def health_check(self) -> bool:
         """Check if VictoriaMetrics is healthy"""
         try:
-            response = self.session.get(f"{self.base_url}/health", timeout=5)
+            response = await self.session.get("/health", timeout=self.health_timeout)
             return response.status_code == 200
-        except:
+        except Exception:
             return False
+    
+    async def close(self):
+        await self.session.aclose()
+
+def samples_by_timestamp(series: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Pivot range-query series into per-timestamp columns of instant-style results
+
+    Columns are ordered oldest first so they can be replayed through the
+    detectors in time order.
+    """
+    columns: Dict[float, List[Dict[str, Any]]] = {}
+    for s in series:
+        for ts, value in s['values']:
+            columns.setdefault(ts, []).append({'metric': s['metric'], 'value': value, 'timestamp': ts})
+    return [columns[ts] for ts in sorted(columns)]
+
 
 class ClickHouseClient:
-    """ClickHouse client for historical data analysis"""
+    """ClickHouse client for historical data analysis
+
+    ``clickhouse_driver`` is blocking and not thread-safe, so queries run on a
+    bounded executor where every worker thread owns its own connection. Each
+    query is also bounded by ``query_timeout`` on both sides of the wire.
+    """
     
-    def __init__(self):
-        import os
-        clickhouse_host = os.getenv('CLICKHOUSE_HOST', 'clickhouse')
-        clickhouse_user = os.getenv('CLICKHOUSE_USER', 'default')
-        clickhouse_password = os.getenv('CLICKHOUSE_PASSWORD', 'clickhouse123')
-        self.client = ClickHouseDriverClient(host=clickhouse_host, port=9000, user=clickhouse_user, password=clickhouse_password)
-        
-    def get_historical_baselines(self, metric_name: str, days: int = 7) -> Dict[str, float]:
+    def __init__(self, max_workers: int = 4, query_timeout: float = 10.0, health_timeout: float = 5.0):
+        self.host = os.getenv('CLICKHOUSE_HOST', 'clickhouse')
+        self.user = os.getenv('CLICKHOUSE_USER', 'default')
+        self.password = os.getenv('CLICKHOUSE_PASSWORD', 'clickhouse123')
+        self.query_timeout = query_timeout
+        self.health_timeout = health_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="clickhouse")
+        self._local = threading.local()
+    
+    def _client(self) -> ClickHouseDriverClient:
+        """Connection owned by the current executor thread"""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = ClickHouseDriverClient(
+                host=self.host, port=9000, user=self.user, password=self.password,
+                connect_timeout=self.query_timeout,
+                send_receive_timeout=self.query_timeout,
+                settings={'max_execution_time': int(self.query_timeout)}
+            )
+            self._local.client = client
+        return client
+    
+    async def execute(self, query: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None):
+        """Run a query on the executor without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, lambda: self._client().execute(query, params))
+        return await asyncio.wait_for(future, timeout or self.query_timeout)
+    
+    async def get_historical_baselines(self, metric_name: str, days: int = 7) -> Dict[str, float]:
         """Get historical baseline metrics for comparison"""
         try:
-            query = f"""
+            return await self.query_metric_baselines(metric_name, days)
+        except Exception as e:
+            logger.error(f"Error getting historical baselines for {metric_name}: {e}")
+            return {}
+    
+    async def query_metric_baselines(self, metric_name: str, days: int = 7, host: Optional[str] = None) -> Dict[str, float]:
+        """Read baselines from the hourly rollup, falling back to a raw log scan
+
+        The raw scan is used when the rollup table is missing or has no
+        samples for the window, e.g. before its backfill from logs.raw ran.
+
+        Raises on connection errors so callers (e.g. BaselineCache) can keep
+        serving the last good value.
+        """
+        params = {'pattern': f"%{metric_name}%", 'days': days}
+        host_filter = ""
+        if host:
+            host_filter = "AND host = %(host)s"
+            params['host'] = host
+        
+        rollup_query = f"""
+        SELECT 
+            avgMerge(avg_state) as avg_value,
+            quantilesMerge(0.5, 0.95, 0.99)(quantiles_state) as quantiles,
+            sum(sample_count) as sample_count
+        FROM logs.metric_baselines_hourly
+        WHERE metric_name LIKE %(pattern)s
+          {host_filter}
+          AND hour >= toStartOfHour(now() - INTERVAL %(days)s DAY)
+          AND hour < toStartOfHour(now() - INTERVAL 1 HOUR)
+        """
+        try:
+            result = await self.execute(rollup_query, params)
+            if result:
+                avg_value, quantiles, sample_count = result[0]
+                quantiles = list(quantiles or []) + [None] * 3
+                result = [(avg_value, quantiles[0], quantiles[1], quantiles[2], sample_count)]
+        except ServerException as e:
+            # Rollup missing on databases initialised before it was added to init.sql
+            logger.warning(f"Baseline rollup unavailable, scanning logs.raw for {metric_name}: {e.message}")
+            result = None
+        
+        if not result or not result[0][4]:
+            # Missing or empty rollup (e.g. created after the history it should cover
+            # and not backfilled yet): compute the baseline from the raw logs instead
+            result = await self.execute(f"""
             SELECT 
                 AVG(toFloat64OrZero(extractAll(message, '[0-9]+\\.?[0-9]*')[1])) as avg_value,
                 quantile(0.5)(toFloat64OrZero(extractAll(message, '[0-9]+\\.?[0-9]*')[1])) as median_value,
@@ -251,27 +627,23 @@ class ClickHouseClient:
                 COUNT(*) as sample_count
             FROM logs.raw 
             WHERE source = 'host_metrics'
-              AND message LIKE '%{metric_name}%'
-              AND timestamp >= now() - INTERVAL {days} DAY
+              AND message LIKE %(pattern)s
+              {host_filter}
+              AND timestamp >= now() - INTERVAL %(days)s DAY
               AND timestamp < now() - INTERVAL 1 HOUR
-            """
-            
-            result = self.client.execute(query)
-            if result and result[0][4] > 0:  # sample_count > 0
-                return {
-                    'avg': float(result[0][0]) if result[0][0] is not None else 0.0,
-                    'median': float(result[0][1]) if result[0][1] is not None else 0.0,
-                    'p95': float(result[0][2]) if result[0][2] is not None else 0.0,
-                    'p99': float(result[0][3]) if result[0][3] is not None else 0.0,
-                    'sample_count': int(result[0][4])
-                }
-            return {}
-            
-        except Exception as e:
-            logger.error(f"Error getting historical baselines for {metric_name}: {e}")
-            return {}
+            """, params)
+        
+        if result and result[0][4] and result[0][4] > 0:  # sample_count > 0
+            return {
+                'avg': float(result[0][0]) if result[0][0] is not None else 0.0,
+                'median': float(result[0][1]) if result[0][1] is not None else 0.0,
+                'p95': float(result[0][2]) if result[0][2] is not None else 0.0,
+                'p99': float(result[0][3]) if result[0][3] is not None else 0.0,
+                'sample_count': int(result[0][4])
+            }
+        return {}
     
-    def get_correlation_patterns(self, current_anomaly: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def get_correlation_patterns(self, current_anomaly: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Find historical patterns that correlate with current anomaly"""
         try:
             # Look for similar anomaly patterns in the past
@@ -296,7 +668,7 @@ class ClickHouseClient:
             LIMIT 100
             """
             
-            results = self.client.execute(query)
+            results = await self.execute(query)
             patterns = []
             
             for row in results:
@@ -314,7 +686,7 @@ class ClickHouseClient:
             logger.error(f"Error getting correlation patterns: {e}")
             return []
     
-    def get_incident_resolution_history(self, anomaly_type: str) -> List[Dict[str, Any]]:
+    async def get_incident_resolution_history(self, anomaly_type: str) -> List[Dict[str, Any]]:
         """Get historical incident resolutions for similar anomalies"""
         try:
             query = f"""
@@ -334,7 +706,7 @@ class ClickHouseClient:
             LIMIT 50
             """
             
-            results = self.client.execute(query)
+            results = await self.execute(query)
             resolutions = []
             
             for row in results:
@@ -354,99 +726,271 @@ class ClickHouseClient:
             logger.error(f"Error getting incident resolution history: {e}")
             return []
     
-    def health_check(self) -> bool:
+    async def health_check(self) -> bool:
         """Check ClickHouse connectivity"""
         try:
-            self.client.execute("SELECT 1")
+            await self.execute("SELECT 1", timeout=self.health_timeout)
             return True
-        except:
+        except Exception:
             return False
+    
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
-class DeviceRegistryClient:
-    """Client for querying the Device Registry service for ship_id/device_id mappings"""
+class BaselineCache:
+    """In-memory cache for historical baselines with single-flight refresh
+
+    Fresh entries (younger than ``refresh_interval``) are served straight from
+    memory. Stale entries are still served while a single background refresh
+    runs; once an entry is older than ``max_age`` callers wait for the reload.
+    Concurrent lookups for the same key share one in-flight load.
+    """
     
-    def __init__(self, base_url: str = "http://device-registry:8080"):
-        self.base_url = base_url.rstrip('/')
-        self.session = requests.Session()
-        self._cache = {}  # Simple in-memory cache for lookups
-        self._cache_ttl = 300  # 5 minute cache TTL
+    def __init__(self, loader: Callable[[str], Awaitable[Dict[str, float]]],
+                 refresh_interval: float = 300.0, max_age: float = 3600.0):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._entries: Dict[str, Tuple[float, Dict[str, float]]] = {}  # key -> (loaded_at, baselines)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refresh_failures = 0
     
-    def _get_cache_key(self, hostname: str) -> str:
-        """Generate cache key for hostname lookup"""
-        return f"registry_{hostname}"
+    async def get(self, key: str) -> Dict[str, float]:
+        """Return baselines for ``key``, loading or refreshing as needed"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.refresh_interval:
+                self.hits += 1
+                return entry[1]
+            if age < self.max_age:
+                self.hits += 1
+                self._refresh(key)
+                return entry[1]
+        
+        self.misses += 1
+        return await asyncio.shield(self._refresh(key))
     
-    def _is_cache_valid(self, cache_entry: dict) -> bool:
-        """Check if cache entry is still valid"""
-        if not cache_entry or 'timestamp' not in cache_entry:
-            return False
-        return (time.time() - cache_entry['timestamp']) < self._cache_ttl
+    def _refresh(self, key: str) -> asyncio.Future:
+        """Start (or join) the single in-flight load for ``key``"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
     
-    def lookup_hostname(self, hostname: str) -> Optional[Dict[str, Any]]:
-        """Lookup ship_id and device info by hostname or IP address with caching"""
-        if not hostname or hostname in ['unknown', 'localhost', '']:
-            return None
-            
-        cache_key = self._get_cache_key(hostname)
-        
-        # Check cache first
-        if cache_key in self._cache and self._is_cache_valid(self._cache[cache_key]):
-            logger.debug(f"Registry cache hit for hostname: {hostname}")
-            return self._cache[cache_key]['data']
-        
+    async def _load(self, key: str) -> Dict[str, float]:
         try:
-            # Query the device registry
-            response = self.session.get(
-                f"{self.base_url}/lookup/{hostname}", 
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                mapping = result.get('mapping')
-                
-                if mapping:
-                    # Cache the successful lookup
-                    self._cache[cache_key] = {
-                        'data': mapping,
-                        'timestamp': time.time()
-                    }
-                    
-                    logger.debug(f"Registry lookup success for {hostname}: {mapping['ship_id']}")
-                    return mapping
-                    
-            elif response.status_code == 404:
-                logger.debug(f"Hostname {hostname} not found in registry")
-                return None
-            else:
-                logger.warning(f"Registry lookup failed for {hostname}: HTTP {response.status_code}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"Registry lookup error for {hostname}: {e}")
-            return None
+            baselines = await self.loader(key)
         except Exception as e:
-            logger.error(f"Unexpected registry lookup error for {hostname}: {e}")
-            return None
+            self.refresh_failures += 1
+            logger.warning(f"Baseline refresh failed for {key}: {e}")
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.max_age:
+                return entry[1]
+            self._entries.pop(key, None)
+            return {}
+        self._entries[key] = (time.monotonic(), baselines)
+        return baselines
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refresh_failures": self.refresh_failures,
+            "inflight": len(self._inflight)
+        }
+
+class EnrichmentCoalescer:
+    """Shares identical enrichment lookups across every series that fires in one tick
+
+    The first caller for a key starts the lookup; later callers await the same
+    task. A new instance is created per detection tick so results never go stale.
+    """
+    
+    def __init__(self):
+        self._tasks: Dict[Tuple, asyncio.Task] = {}
+        self.requested = 0
+    
+    @property
+    def executed(self) -> int:
+        return len(self._tasks)
+    
+    def get(self, key: Tuple, factory: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        self.requested += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+        return task
+
+# Built-in filter rules, used when LOG_FILTER_RULES_PATH does not exist. The first
+# rule is the former inline check
+#   log_level in ['INFO', 'DEBUG', 'TRACE'] and anomaly_severity in ['info', 'low', 'debug']
+# and the rest are the former _is_normal_operational_message patterns.
+DEFAULT_LOG_FILTER_RULES = [
+    {'name': 'non_critical_level', 'levels': ['INFO', 'DEBUG', 'TRACE'], 'severities': ['info', 'low', 'debug']},
+    {'name': 'metric_report', 'pattern': r'Metric: .+ = \d+'},
+    {'name': 'health_check', 'pattern': r'Health check'},
+    {'name': 'status_ok', 'pattern': r'Status: OK'},
+    {'name': 'connection_established', 'pattern': r'Connection established'},
+    {'name': 'startup_complete', 'pattern': r'Startup complete'},
+    {'name': 'heartbeat', 'pattern': r'Heartbeat'},
+    {'name': 'process_started', 'pattern': r'Process started'},
+    {'name': 'configuration_loaded', 'pattern': r'Configuration loaded'},
+]
+
+# Backreferences (\\1, (?P=name)) and group conditionals ((?(1)...)) that are not themselves escaped
+_REGEX_GROUP_REFERENCE = re.compile(r'(?<!\\)(?:\\\\)*(?:\\[1-9]|\(\?P=|\(\?\()')
+
+
+class LogFilter:
+    """Drop rules for anomalous logs, compiled once and evaluated in file order
+
+    Each rule has a ``name`` and any of ``levels``, ``severities`` and a
+    case-insensitive message ``pattern``; a log is dropped by the first rule,
+    in file order, whose conditions all hold, and that rule is credited in
+    ``rule_hits``. Patterns of rules without level/severity conditions are
+    also merged into one alternation with a named group per rule: one scan
+    tells whether any of them matches, so a log that none of them drops never
+    has them searched one by one. When the scan does match, only the pattern
+    rules listed before the matching one are searched individually.
+
+    Merging renumbers groups, so patterns may not use named groups or
+    backreferences.
+    """
     
-    def health_check(self) -> bool:
-        """Check if Device Registry service is healthy"""
+    def __init__(self, rules: List[Dict[str, Any]]):
+        # (name, levels, severities, pattern, merged) in file order
+        self.rules: List[Tuple[str, Optional[frozenset], Optional[frozenset], Optional['re.Pattern'], bool]] = []
+        alternation: List[str] = []
+        self._group_rules: Dict[str, int] = {}
+        self.rule_hits: Dict[str, int] = {}
+        
+        for i, rule in enumerate(rules):
+            name = rule['name']
+            if name in self.rule_hits:
+                raise ValueError(f"Duplicate log filter rule name: {name}")
+            levels = frozenset(l.upper() for l in rule['levels']) if rule.get('levels') else None
+            severities = frozenset(s.lower() for s in rule['severities']) if rule.get('severities') else None
+            pattern = rule.get('pattern')
+            if pattern is None and levels is None and severities is None:
+                raise ValueError(f"Log filter rule {name} has no conditions")
+            compiled = re.compile(pattern, re.IGNORECASE) if pattern is not None else None
+            if compiled is not None and (compiled.groupindex or _REGEX_GROUP_REFERENCE.search(pattern)):
+                raise ValueError(f"Log filter rule {name} uses named groups or backreferences")
+            merged = compiled is not None and levels is None and severities is None
+            if merged:
+                group = f"r{i}"
+                self._group_rules[group] = i
+                alternation.append(f"(?P<{group}>{pattern})")
+            self.rule_hits[name] = 0
+            self.rules.append((name, levels, severities, compiled, merged))
+        
+        self.message_pattern = re.compile('|'.join(alternation), re.IGNORECASE) if alternation else None
+        self.evaluated = 0
+        self.dropped = 0
+    
+    @classmethod
+    def from_file(cls, path: str) -> 'LogFilter':
+        """Load rules from a YAML file with a top-level ``rules`` list"""
         try:
-            response = self.session.get(f"{self.base_url}/health", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+            with open(path, 'r') as f:
+                rules = (yaml.safe_load(f) or {}).get('rules', [])
+            logger.info(f"Loaded {len(rules)} log filter rules from {path}")
+        except FileNotFoundError:
+            logger.warning(f"Log filter rules {path} not found, using built-in rules")
+            rules = DEFAULT_LOG_FILTER_RULES
+        return cls(rules)
+    
+    def match(self, level: str, severity: str, message: str) -> Optional[str]:
+        """Name of the first rule that drops this log, or None to keep it"""
+        self.evaluated += 1
+        rule = self._match(level.upper(), severity.lower(), message)
+        if rule is not None:
+            self.rule_hits[rule] += 1
+            self.dropped += 1
+        return rule
+    
+    def _match(self, level: str, severity: str, message: str) -> Optional[str]:
+        found = self.message_pattern.search(message) if self.message_pattern is not None else None
+        merged_hit = self._group_rules[found.lastgroup] if found is not None else None
+        for i, (name, levels, severities, pattern, merged) in enumerate(self.rules):
+            if i == merged_hit:
+                return name
+            if merged:
+                # Earlier merged rules can still match elsewhere in the message
+                if merged_hit is not None and pattern.search(message):
+                    return name
+            elif ((levels is None or level in levels) and (severities is None or severity in severities)
+                    and (pattern is None or pattern.search(message))):
+                return name
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'evaluated': self.evaluated,
+            'dropped': self.dropped,
+            'passed': self.evaluated - self.dropped,
+            'rule_hits': dict(self.rule_hits)
+        }
 
 class AnomalyDetectionService:
     """Main anomaly detection service with historical analysis"""
     
     def __init__(self):
-        self.vm_client = VictoriaMetricsClient()
-        self.clickhouse_client = ClickHouseClient()
-        self.device_registry_client = DeviceRegistryClient()
-        self.detectors = SimpleAnomalyDetectors()
+        health_timeout = float(os.getenv('HEALTH_CHECK_TIMEOUT_SECONDS', '5'))
+        self.vm_client = VictoriaMetricsClient(
+            os.getenv('VICTORIA_METRICS_URL', 'http://victoria-metrics:8428'),
+            query_timeout=float(os.getenv('VM_QUERY_TIMEOUT_SECONDS', '10')),
+            health_timeout=health_timeout
+        )
+        self.clickhouse_client = ClickHouseClient(
+            max_workers=int(os.getenv('CLICKHOUSE_MAX_WORKERS', '4')),
+            query_timeout=float(os.getenv('CLICKHOUSE_QUERY_TIMEOUT_SECONDS', '10')),
+            health_timeout=health_timeout
+        )
+        self.baseline_cache = BaselineCache(
+            self._load_baselines,
+            refresh_interval=float(os.getenv('BASELINE_REFRESH_SECONDS', '300')),
+            max_age=float(os.getenv('BASELINE_MAX_AGE_SECONDS', '3600'))
+        )
+        self.device_registry_client = DeviceRegistryClient.from_env()
+        self.detectors = SimpleAnomalyDetectors(
+            window_size=int(os.getenv('ANOMALY_WINDOW_SIZE', '50')),
+            max_series=int(os.getenv('ANOMALY_MAX_SERIES', '10000')),
+            series_ttl=float(os.getenv('ANOMALY_SERIES_TTL_SECONDS', '3600')),
+            order_stats_min_window=int(os.getenv('ANOMALY_ORDER_STATS_MIN_WINDOW', '1024'))
+        )
+        self.log_filter = LogFilter.from_file(os.getenv('LOG_FILTER_RULES_PATH', '/app/log-filter-rules.yaml'))
+        self.log_templates = LogTemplateMiner(
+            cache_size=int(os.getenv('LOG_TEMPLATE_CACHE_SIZE', '100000')),
+            max_templates=int(os.getenv('LOG_TEMPLATE_MAX_TEMPLATES', '20000'))
+        )
         self.nats_client = None
         self.health_status = {"healthy": False, "vm_connected": False, "nats_connected": False, "clickhouse_connected": False, "registry_connected": False}
         
+        # Detection tick cadence and per-tick query fan-out
+        self.detection_interval = float(os.getenv('DETECTION_INTERVAL_SECONDS', '10'))
+        self.query_step = float(os.getenv('VM_QUERY_STEP_SECONDS', os.getenv('DETECTION_INTERVAL_SECONDS', '10')))
+        self.last_sample_time: Dict[str, float] = {}  # query name -> newest VM sample timestamp seen
+        self.query_semaphore = asyncio.Semaphore(int(os.getenv('METRIC_QUERY_CONCURRENCY', '8')))
+        self.tick_stats = {
+            "ticks": 0,
+            "last_duration_seconds": 0.0,
+            "max_duration_seconds": 0.0,
+            "avg_duration_seconds": 0.0,
+            "overruns": 0,
+            "query_durations_seconds": {},
+            "enrichment_requests": 0,
+            "enrichment_calls": 0,
+            "skipped_queries": 0
+        }
+        
         # Metric queries to monitor
         self.metric_queries = [
             MetricQuery(
@@ -466,6 +1010,10 @@ class AnomalyDetectionService:
             )
         ]
     
+    async def _load_baselines(self, metric_name: str) -> Dict[str, float]:
+        """Baseline cache loader backed by the ClickHouse hourly rollup"""
+        return await self.clickhouse_client.query_metric_baselines(metric_name)
+    
     async def connect_nats(self):
         """Connect to NATS"""
         try:
@@ -475,6 +1023,9 @@ class AnomalyDetectionService:
             # Subscribe to anomalous logs from Vector
             await self.nats_client.subscribe("logs.anomalous", cb=self.process_anomalous_log)
             
+            # Drop cached registry lookups when devices are (re-)registered
+            await self.device_registry_client.subscribe_invalidations(self.nats_client)
+            
             # Simple connection - no JetStream for now to avoid complexity
             logger.info("Connected to NATS and subscribed to anomalous logs")
             self.health_status["nats_connected"] = True
@@ -488,30 +1039,23 @@ class AnomalyDetectionService:
         """Process individual anomalous log messages from Vector"""
         try:
             log_data = json.loads(msg.data.decode())
-            print("TESTING THIS DATA",log_data)
             # Extract tracking information from message
             message = log_data.get('message', '')
             tracking_id = log_data.get('tracking_id')
             log_level = log_data.get('level', '').upper()
             anomaly_severity = log_data.get('anomaly_severity', 'low').lower()
             
-            # CRITICAL FIX: Only process ERROR, CRITICAL, WARNING logs - skip INFO/DEBUG
-            if log_level in ['INFO', 'DEBUG', 'TRACE'] and anomaly_severity in ['info', 'low', 'debug']:
-                print("ENTERED THIS BLOCK WITH", log_data, log_level, anomaly_severity)
-                logger.debug(f"Skipping non-critical log: level={log_level}, severity={anomaly_severity}, tracking_id={tracking_id}")
+            # Drop non-critical levels and normal operational messages (see LOG_FILTER_RULES_PATH)
+            rule = self.log_filter.match(log_level, anomaly_severity, message)
+            if rule is not None:
+                logger.debug(f"Skipping log by rule {rule}: level={log_level}, severity={anomaly_severity}, tracking_id={tracking_id}")
                 return
             
-            # CRITICAL FIX: Additional filtering for normal operational messages
-            if self._is_normal_operational_message(message):
-                print("ENTERED THAT BLOCK WITH", log_data, log_level, anomaly_severity, message)
-                logger.debug(f"Skipping normal operational message: {message[:50]}...")
-                return
-            print("ENTERED AFTER BLOCK WITH", log_data, log_level, anomaly_severity, message)
-            # Log processing for tracking (only for actual anomalies)
-            logger.info(f"Processing anomalous log: tracking_id={tracking_id}, level={log_level}, severity={anomaly_severity}, message='{message[:100]}...'")
+            logger.debug(f"Processing anomalous log: tracking_id={tracking_id}, level={log_level}, severity={anomaly_severity}, message='{message[:100]}...'")
             
             # CRITICAL FIX: Set appropriate anomaly score based on severity
             anomaly_score = self._calculate_anomaly_score(log_level, anomaly_severity)
+            template = self.log_templates.add(message)
             
             # Create log-based anomaly event
             event = AnomalyEvent(
@@ -524,6 +1068,8 @@ class AnomalyDetectionService:
                 threshold=0.7,
                 metadata={
                     "log_message": message,
+                    "log_template": template.template,
+                    "log_template_id": template.template_id,
                     "tracking_id": tracking_id,
                     "log_level": log_level,
                     "source_host": log_data.get('host'),
@@ -531,8 +1077,8 @@ class AnomalyDetectionService:
                     "anomaly_severity": anomaly_severity,
                     "original_timestamp": log_data.get('timestamp'),
                     # CRITICAL FIX: Add ship_id, device_id extraction
-                    "ship_id": self._extract_ship_id(log_data),
-                    "device_id": self._extract_device_id(log_data)
+                    "ship_id": await self._extract_ship_id(log_data),
+                    "device_id": await self._extract_device_id(log_data)
                 },
                 labels=log_data.get('labels', {})
             )
@@ -545,21 +1091,7 @@ class AnomalyDetectionService:
     
     def _is_normal_operational_message(self, message: str) -> bool:
         """Check if message is a normal operational log that shouldn't create incidents"""
-        normal_patterns = [
-            r'Metric: .+ = \d+',  # Normal metric reports
-            r'Health check',
-            r'Status: OK',
-            r'Connection established',
-            r'Startup complete',
-            r'Heartbeat',
-            r'Process started',
-            r'Configuration loaded'
-        ]
-        
-        for pattern in normal_patterns:
-            if re.search(pattern, message, re.IGNORECASE):
-                return True
-        return False
+        return self.log_filter._match('', '', message) is not None
     
     def _calculate_anomaly_score(self, log_level: str, anomaly_severity: str) -> float:
         """Calculate appropriate anomaly score based on log level and severity"""
@@ -572,7 +1104,7 @@ class AnomalyDetectionService:
         else:
             return 0.6
     
-    def _extract_ship_id(self, log_data: dict) -> str:
+    async def _extract_ship_id(self, log_data: dict) -> str:
         """Extract ship_id from log data with device registry lookup and intelligent fallbacks"""
         # Try direct ship_id field first
         if log_data.get('ship_id'):
@@ -581,7 +1113,7 @@ class AnomalyDetectionService:
         # Try device registry lookup using hostname
         host = log_data.get('host', '')
         if host and host != 'unknown':
-            registry_result = self.device_registry_client.lookup_hostname(host)
+            registry_result = await self.device_registry_client.lookup_hostname(host)
             if registry_result and registry_result.get('ship_id'):
                 logger.debug(f"Registry lookup success for host {host}: {registry_result['ship_id']}")
                 return registry_result['ship_id']
@@ -589,7 +1121,7 @@ class AnomalyDetectionService:
         # Try device registry lookup using IP address from metadata
         source_host = log_data.get('metadata', {}).get('source_host', '') if isinstance(log_data.get('metadata'), dict) else ''
         if source_host and source_host != host and source_host != 'unknown':
-            registry_result = self.device_registry_client.lookup_hostname(source_host)
+            registry_result = await self.device_registry_client.lookup_hostname(source_host)
             if registry_result and registry_result.get('ship_id'):
                 logger.debug(f"Registry lookup success for source_host {source_host}: {registry_result['ship_id']}")
                 return registry_result['ship_id']
@@ -613,7 +1145,7 @@ class AnomalyDetectionService:
         logger.warning(f"Could not resolve ship_id for log data with host={host}, source_host={source_host}")
         return 'unknown-ship'
     
-    def _extract_device_id(self, log_data: dict) -> str:
+    async def _extract_device_id(self, log_data: dict) -> str:
         """Extract device_id from log data with device registry lookup"""
         # Try direct device_id field
         if log_data.get('device_id'):
@@ -622,7 +1154,7 @@ class AnomalyDetectionService:
         # Try device registry lookup using hostname
         host = log_data.get('host', '')
         if host and host != 'unknown':
-            registry_result = self.device_registry_client.lookup_hostname(host)
+            registry_result = await self.device_registry_client.lookup_hostname(host)
             if registry_result and registry_result.get('device_id'):
                 logger.debug(f"Registry device_id lookup success for host {host}: {registry_result['device_id']}")
                 return registry_result['device_id']
@@ -630,7 +1162,7 @@ class AnomalyDetectionService:
         # Try device registry lookup using IP address from metadata
         source_host = log_data.get('metadata', {}).get('source_host', '') if isinstance(log_data.get('metadata'), dict) else ''
         if source_host and source_host != host and source_host != 'unknown':
-            registry_result = self.device_registry_client.lookup_hostname(source_host)
+            registry_result = await self.device_registry_client.lookup_hostname(source_host)
             if registry_result and registry_result.get('device_id'):
                 logger.debug(f"Registry device_id lookup success for source_host {source_host}: {registry_result['device_id']}")
                 return registry_result['device_id']
@@ -664,84 +1196,168 @@ class AnomalyDetectionService:
             logger.error(f"Error publishing anomaly event: {e}")
     
     async def process_metrics(self):
-        """Process metrics with historical baseline analysis"""
+        """Process all enabled metric queries concurrently for one detection tick"""
         logger.info("Processing metrics for anomaly detection...")
+        tick_start = time.monotonic()
+        self.detectors.evict_idle_series()
+        enrichment = EnrichmentCoalescer()
         
-        for metric_query in self.metric_queries:
-            if not metric_query.enabled:
-                continue
-                
+        queries = [q for q in self.metric_queries if q.enabled]
+        durations = await asyncio.gather(*(self._run_metric_query(q, enrichment) for q in queries))
+        
+        duration = time.monotonic() - tick_start
+        stats = self.tick_stats
+        stats["ticks"] += 1
+        stats["last_duration_seconds"] = duration
+        stats["max_duration_seconds"] = max(stats["max_duration_seconds"], duration)
+        stats["avg_duration_seconds"] += (duration - stats["avg_duration_seconds"]) / stats["ticks"]
+        if duration > self.detection_interval:
+            stats["overruns"] += 1
+            logger.warning(f"Detection tick took {duration:.2f}s, longer than the {self.detection_interval:.0f}s interval")
+        stats["query_durations_seconds"] = {q.name: d for q, d in zip(queries, durations)}
+        stats["enrichment_requests"] += enrichment.requested
+        stats["enrichment_calls"] += enrichment.executed
+    
+    async def _run_metric_query(self, metric_query: MetricQuery, enrichment: "EnrichmentCoalescer") -> float:
+        """Run one query pipeline under the concurrency limit, returning its duration"""
+        async with self.query_semaphore:
+            started = time.monotonic()
             try:
-                # Get current metrics
-                results = self.vm_client.query_instant(metric_query.query)
-                
-                # Get historical baselines for comparison
-                baselines = self.clickhouse_client.get_historical_baselines(metric_query.name)
-                
-                for result in results:
-                    value = result['value']
-                    metric_labels = result['metric']
-                    
-                    # Enhanced anomaly detection with historical context
-                    scores = self.detectors.update_and_detect(metric_query.name, value)
-                    
-                    # Historical baseline comparison
-                    historical_anomaly_score = 0.0
-                    if baselines and 'p95' in baselines:
-                        if value > baselines['p95']:
-                            historical_anomaly_score = min((value - baselines['p95']) / (baselines['p99'] - baselines['p95'] + 0.001), 1.0)
-                    
-                    # Combine statistical and historical scores
-                    max_statistical_score = max(scores.values()) if scores else 0.0
-                    combined_score = max(max_statistical_score, historical_anomaly_score)
-                    
-                    # Check if any detection method found an anomaly above threshold
-                    if combined_score > metric_query.threshold:
-                        # Get correlation patterns and resolution history
-                        correlation_patterns = self.clickhouse_client.get_correlation_patterns({
-                            'metric_name': metric_query.name,
-                            'value': value,
-                            'timestamp': datetime.now()
-                        })
-                        
-                        resolution_history = self.clickhouse_client.get_incident_resolution_history(metric_query.name)
-                        
-                        # Create enhanced anomaly event
-                        event = AnomalyEvent(
-                            timestamp=datetime.now(),
-                            metric_name=metric_query.name,
-                            metric_value=value,
-                            anomaly_score=combined_score,
-                            anomaly_type="statistical_with_baseline",
-                            detector_name="enhanced_detector",
-                            threshold=metric_query.threshold,
-                            metadata={
-                                "query": metric_query.query,
-                                "vm_timestamp": result['timestamp'],
-                                "statistical_scores": scores,
-                                "historical_baselines": baselines,
-                                "historical_anomaly_score": historical_anomaly_score,
-                                "combined_score": combined_score,
-                                "correlation_patterns_count": len(correlation_patterns),
-                                "resolution_history_count": len(resolution_history),
-                                "similar_incidents": resolution_history[:3]  # Top 3 similar incidents
-                            },
-                            labels=metric_labels
-                        )
-                        
-                        await self.publish_anomaly(event)
-                        logger.info(f"Published enhanced anomaly: {metric_query.name} = {combined_score:.3f} (statistical: {max_statistical_score:.3f}, historical: {historical_anomaly_score:.3f})")
-                        
+                await self._process_metric_query(metric_query, enrichment)
             except Exception as e:
                 logger.error(f"Error processing metric {metric_query.name}: {e}")
+            return time.monotonic() - started
+    
+    async def _process_metric_query(self, metric_query: MetricQuery, enrichment: "EnrichmentCoalescer"):
+        """Fetch new samples for a single MetricQuery, then score and publish anomalies"""
+        # Get new samples and historical baselines for comparison
+        columns, baselines = await asyncio.gather(
+            self._fetch_new_samples(metric_query),
+            self.baseline_cache.get(metric_query.name)
+        )
+        
+        for results in columns:
+            await self._score_and_publish(metric_query, results, baselines, enrichment)
+    
+    async def _fetch_new_samples(self, metric_query: MetricQuery) -> List[List[Dict[str, Any]]]:
+        """Return per-timestamp result columns newer than the last sample seen for this query
+
+        The first fetch is an instant query (unless warm-up already ran). After
+        that only the delta since the last seen timestamp is requested, capped at
+        one detector window, and no request is made until a new step is due.
+        """
+        last_seen = self.last_sample_time.get(metric_query.name)
+        now = time.time()
+        
+        if last_seen is None:
+            results = await self.vm_client.query_instant(metric_query.query)
+            columns = [results] if results else []
+        else:
+            start = max(last_seen + self.query_step, now - self.detectors.window_size * self.query_step)
+            if start > now:
+                self.tick_stats["skipped_queries"] += 1
+                return []
+            series = await self.vm_client.query_range(metric_query.query, start, now, self.query_step)
+            columns = samples_by_timestamp(series)
+        
+        if columns:
+            self.last_sample_time[metric_query.name] = max(r['timestamp'] for r in columns[-1])
+        return columns
+    
+    async def warm_up_detectors(self):
+        """Fill every detector window with one bulk range query per MetricQuery"""
+        end = time.time()
+        start = end - self.detectors.window_size * self.query_step
+        
+        async def warm(metric_query: MetricQuery):
+            async with self.query_semaphore:
+                series = await self.vm_client.query_range(metric_query.query, start, end, self.query_step)
+            columns = samples_by_timestamp(series)
+            for results in columns:
+                self.detectors.update_and_detect_batch(
+                    metric_query.name, [r['metric'] for r in results], [r['value'] for r in results]
+                )
+            if columns:
+                self.last_sample_time[metric_query.name] = max(r['timestamp'] for r in columns[-1])
+            logger.info(f"Warmed {metric_query.name}: {len(series)} series, {len(columns)} samples each")
+        
+        await asyncio.gather(*(warm(q) for q in self.metric_queries if q.enabled))
+    
+    async def _score_and_publish(self, metric_query: MetricQuery, results: List[Dict[str, Any]],
+                                 baselines: Dict[str, float], enrichment: "EnrichmentCoalescer"):
+        """Score one column of results and publish an event for each anomalous series"""
+        # Vectorized detection across every series returned by the query
+        values = np.fromiter((r['value'] for r in results), dtype=np.float64, count=len(results))
+        batch_scores = self.detectors.update_and_detect_batch(
+            metric_query.name, [r['metric'] for r in results], values
+        )
+        max_statistical = np.maximum.reduce(list(batch_scores.values()))
+        
+        # Historical baseline comparison
+        historical = np.zeros(len(results))
+        if baselines and 'p95' in baselines:
+            p95, p99 = baselines['p95'], baselines['p99']
+            historical = np.where(values > p95, np.minimum((values - p95) / (p99 - p95 + 0.001), 1.0), 0.0)
+        
+        # Combine statistical and historical scores
+        combined = np.maximum(max_statistical, historical)
+        
+        for i in np.flatnonzero(combined > metric_query.threshold):
+            result = results[i]
+            value = result['value']
+            metric_labels = result['metric']
+            scores = {name: float(arr[i]) for name, arr in batch_scores.items()}
+            max_statistical_score = float(max_statistical[i])
+            historical_anomaly_score = float(historical[i])
+            combined_score = float(combined[i])
+            
+            # Correlation patterns and resolution history only depend on the metric,
+            # so every series firing in this tick shares one lookup of each
+            correlation_patterns, resolution_history = await asyncio.gather(
+                enrichment.get(('correlation_patterns', metric_query.name), lambda: self.clickhouse_client.get_correlation_patterns({
+                    'metric_name': metric_query.name,
+                    'value': value,
+                    'timestamp': datetime.now()
+                })),
+                enrichment.get(('resolution_history', metric_query.name),
+                               lambda: self.clickhouse_client.get_incident_resolution_history(metric_query.name))
+            )
+            
+            # Create enhanced anomaly event
+            event = AnomalyEvent(
+                timestamp=datetime.now(),
+                metric_name=metric_query.name,
+                metric_value=value,
+                anomaly_score=combined_score,
+                anomaly_type="statistical_with_baseline",
+                detector_name="enhanced_detector",
+                threshold=metric_query.threshold,
+                metadata={
+                    "query": metric_query.query,
+                    "vm_timestamp": result['timestamp'],
+                    "statistical_scores": scores,
+                    "historical_baselines": baselines,
+                    "historical_anomaly_score": historical_anomaly_score,
+                    "combined_score": combined_score,
+                    "correlation_patterns_count": len(correlation_patterns),
+                    "resolution_history_count": len(resolution_history),
+                    "similar_incidents": resolution_history[:3]  # Top 3 similar incidents
+                },
+                labels=metric_labels
+            )
+            
+            await self.publish_anomaly(event)
+            logger.info(f"Published enhanced anomaly: {metric_query.name} = {combined_score:.3f} (statistical: {max_statistical_score:.3f}, historical: {historical_anomaly_score:.3f})")
     
     async def health_check_loop(self):
         """Periodic health check loop with ClickHouse and Device Registry"""
         while True:
             try:
-                vm_healthy = self.vm_client.health_check()
-                clickhouse_healthy = self.clickhouse_client.health_check()
-                registry_healthy = self.device_registry_client.health_check()
+                vm_healthy, clickhouse_healthy, registry_healthy = await asyncio.gather(
+                    self.vm_client.health_check(),
+                    self.clickhouse_client.health_check(),
+                    self.device_registry_client.health_check()
+                )
                 nats_healthy = self.nats_client and not self.nats_client.is_closed
                 
                 self.health_status["vm_connected"] = vm_healthy
@@ -768,17 +1384,17 @@ class AnomalyDetectionService:
                 await asyncio.sleep(30)
     
     async def detection_loop(self):
-        """Main anomaly detection loop"""
+        """Main anomaly detection loop, keeping a fixed tick cadence"""
         logger.info("Starting anomaly detection loop...")
         
         while True:
+            started = time.monotonic()
             try:
                 await self.process_metrics()
-                await asyncio.sleep(10)  # Process every 10 seconds
-                
             except Exception as e:
                 logger.error(f"Error in detection loop: {e}")
-                await asyncio.sleep(10)
+            # Sleep for the remainder of the interval rather than a full interval after processing
+            await asyncio.sleep(max(0.0, self.detection_interval - (time.monotonic() - started)))
     
     async def run_background_tasks(self):
         """Run background detection and health check tasks"""
@@ -788,18 +1404,28 @@ class AnomalyDetectionService:
         await self.connect_nats()
         
         # Wait for VictoriaMetrics to be ready
-        while not self.vm_client.health_check():
+        while not await self.vm_client.health_check():
             logger.info("Waiting for VictoriaMetrics to be ready...")
             await asyncio.sleep(5)
         
         self.health_status["vm_connected"] = True
-        logger.info("VictoriaMetrics is ready, starting detection loops")
+        logger.info("VictoriaMetrics is ready, warming detector windows")
+        await self.warm_up_detectors()
+        logger.info("Starting detection loops")
         
         # Start background tasks
         await asyncio.gather(
             self.detection_loop(),
             self.health_check_loop()
         )
+    
+    async def close(self):
+        """Release NATS, HTTP and ClickHouse resources"""
+        if self.nats_client and not self.nats_client.is_closed:
+            await self.nats_client.close()
+        await self.vm_client.close()
+        await self.device_registry_client.close()
+        self.clickhouse_client.close()
 
 # FastAPI app for health checks
 app = FastAPI(title="AIOps Anomaly Detection Service")
@@ -814,7 +1440,16 @@ async def health():
 async def metrics():
     """Metrics endpoint for monitoring"""
     return {
-        "detector_windows": {k: len(v) for k, v in service.detectors.metric_history.items()},
+        "batch_series": {k: len(v) for k, v in service.detectors.series_matrices.items()},
+        "tracked_series": service.detectors.tracked_series,
+        "max_series": service.detectors.max_series,
+        "evicted_series": service.detectors.evicted_series,
+        "baseline_cache": service.baseline_cache.stats(),
+        "log_filter": service.log_filter.stats(),
+        "log_templates": {**service.log_templates.stats, "templates": len(service.log_templates.templates)},
+        "registry_cache": service.device_registry_client.snapshot(),
+        "tick": service.tick_stats,
+        "last_sample_time": service.last_sample_time,
         "queries": [q.name for q in service.metric_queries if q.enabled]
     }
 
@@ -831,11 +1466,12 @@ async def main():
         await server.serve()
     except KeyboardInterrupt:
         logger.info("Service interrupted by user")
-        if service.nats_client:
-            await service.nats_client.close()
     except Exception as e:
         logger.error(f"Service error: {e}")
         raise
+    finally:
+        background_task.cancel()
+        await service.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -7,18 +7,24 @@ Java, Node.js, Python, and other microservices with standardized processing.
 
 Features:
 - HTTP log endpoint for direct application integration
-- TCP log receiver for traditional log shipping
-- JSON log parsing and normalization
-- Structured log forwarding to Vector/NATS
+- Streaming NDJSON bulk endpoint (gzip/zstd) for backlog uploads
+- TCP and UDP log receivers for traditional log shipping
+- Multi-format log parsing (JSON, Logback, Python logging, winston, syslog,
+  logfmt) with the detected format remembered per source
+- Structured log forwarding to Vector/NATS in batched NDJSON messages
 - Application health monitoring
 """
 
 import asyncio
 import logging
 import json
+import os
+import re
 import uuid
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Any, Optional, Tuple
 from dataclasses import dataclass
 
 from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
@@ -26,9 +32,37 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import uvicorn
 import nats
-import aiohttp
-from socketserver import ThreadingTCPServer, StreamRequestHandler
-import threading
+
+try:
+    import orjson
+
+    def encode_json(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    _encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False, default=str)
+
+    def encode_json(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode()
+
+
+def utc_timestamp(value: Optional[datetime] = None) -> str:
+    """ISO 8601 UTC timestamp with millisecond precision and a ``Z`` suffix
+
+    This is the format Vector's app_logs_for_logs remap parses; naive
+    datetimes are taken as local time.
+    """
+    value = value.astimezone(timezone.utc) if value is not None else datetime.now(timezone.utc)
+    return value.replace(tzinfo=None).isoformat(timespec='milliseconds') + 'Z'
+
+
+def normalize_timestamp(value: str) -> Optional[str]:
+    """Client ISO 8601 timestamp as UTC ``...Z``; None when it does not parse"""
+    if value.endswith('Z') and len(value) >= 20 and value[4] == '-' and value[7] == '-' and value[10] == 'T':
+        return value
+    try:
+        return utc_timestamp(datetime.fromisoformat(value))
+    except ValueError:
+        return None
 
 # Configure logging
 logging.basicConfig(
@@ -73,31 +107,699 @@ class StandardizedLogEntry:
     metadata: Dict[str, Any] = None
     raw_log: str = ""
 
-class TCPLogHandler(StreamRequestHandler):
-    """TCP log handler for traditional log shipping"""
-    
-    def handle(self):
-        """Handle incoming TCP log connections"""
+class LogFormat:
+    """A line format: ``parse`` returns the extracted fields, or None if the line is not in this format"""
+    name = "plain"
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        return {'message': line}
+
+
+class JsonLogFormat(LogFormat):
+    name = "json"
+
+    # raw_decode skips json.loads' whitespace regex passes; lines arrive stripped
+    _raw_decode = json.JSONDecoder().raw_decode
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        if not line.startswith('{'):
+            return None
+        try:
+            fields, end = self._raw_decode(line)
+        except ValueError:
+            return None
+        return fields if end == len(line) else None
+
+
+class RegexLogFormat(LogFormat):
+    """Format matched by one precompiled regex whose named groups are the fields"""
+
+    def __init__(self, name: str, pattern: str):
+        self.name = name
+        self._match = re.compile(pattern).match
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        match = self._match(line)
+        if match is None:
+            return None
+        return {key: value for key, value in match.groupdict().items() if value is not None}
+
+
+class SyslogLogFormat(RegexLogFormat):
+    """Syslog line; the PRI severity becomes the level, header extras go under 'fields'
+    and '-' (NILVALUE) values are dropped"""
+
+    SEVERITY_LEVELS = ('FATAL', 'FATAL', 'FATAL', 'ERROR', 'WARN', 'INFO', 'INFO', 'DEBUG')
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        fields = super().parse(line)
+        if fields is None:
+            return None
+        pri = int(fields.pop('pri'))
+        fields['level'] = self.SEVERITY_LEVELS[pri % 8]
+        extra = {'facility': pri // 8}
+        for key in ('procid', 'msgid', 'structured_data'):
+            value = fields.pop(key, '-')
+            if value != '-':
+                extra[key] = value
+        for key in ('host', 'application'):
+            if fields.get(key) == '-':
+                del fields[key]
+        fields['message'] = fields.get('message', '').lstrip('\ufeff')
+        fields['fields'] = extra
+        return fields
+
+
+class LogfmtLogFormat(LogFormat):
+    """``key=value key="quoted value"`` lines with at least a message or level key"""
+    name = "logfmt"
+
+    # Pairs must be separated by whitespace so every value ends at a fixed
+    # position; letting pairs abut makes the match backtrack exponentially
+    # on values containing '=' (query strings and the like).
+    _LINE = re.compile(r'[\w.\-/]+=(?:"(?:[^"\\]|\\.)*"|[^\s"]*)'
+                       r'(?:\s+[\w.\-/]+=(?:"(?:[^"\\]|\\.)*"|[^\s"]*))*\s*')
+    _PAIR = re.compile(r'([\w.\-/]+)=(?:"((?:[^"\\]|\\.)*)"|([^\s"]*))')
+    KEYS = {
+        'msg': 'message', 'message': 'message',
+        'level': 'level', 'lvl': 'level', 'severity': 'level',
+        'ts': 'timestamp', 'time': 'timestamp', 'timestamp': 'timestamp',
+        'logger': 'logger', 'thread': 'thread', 'service': 'service',
+        'app': 'application', 'application': 'application',
+        'trace_id': 'traceId', 'traceId': 'traceId', 'span_id': 'spanId', 'spanId': 'spanId',
+    }
+
+    def parse(self, line: str) -> Optional[Dict[str, Any]]:
+        if '=' not in line or self._LINE.fullmatch(line) is None:
+            return None
+        fields: Dict[str, Any] = {}
+        extra: Dict[str, str] = {}
+        for key, quoted, bare in self._PAIR.findall(line):
+            value = quoted.replace('\\"', '"') if quoted else bare
+            target = self.KEYS.get(key)
+            if target is None:
+                extra[key] = value
+            else:
+                fields[target] = value
+        if 'message' not in fields and 'level' not in fields:
+            return None
+        if extra:
+            fields['fields'] = extra
+        return fields
+
+
+class LogParserRegistry:
+    """Ordered set of log formats with the detected format cached per source
+
+    A line from a source seen before is first tried against that source's
+    last format, so steady streams cost one precompiled match per line.
+    When it does not match (or the source is new) every format is tried in
+    order, and the winner is remembered for up to ``cache_size`` sources.
+    Lines matching nothing are returned as plain messages without touching
+    the cache.
+    """
+
+    def __init__(self, formats: Optional[List[LogFormat]] = None, cache_size: int = 10000):
+        self.formats = formats if formats is not None else default_log_formats()
+        self.cache_size = cache_size
+        self._plain = LogFormat()
+        self._source_formats: 'OrderedDict[str, LogFormat]' = OrderedDict()
+        self.stats = {
+            'cache_hits': 0,
+            'detections': 0,
+            'unparsed': 0,
+        }
+
+    def parse(self, line: str, source: Optional[str] = None) -> Dict[str, Any]:
+        """Parse ``line``; the result carries the matching format name under 'format'"""
+        cached = self._source_formats.get(source) if source is not None else None
+        if cached is not None:
+            fields = cached.parse(line)
+            if fields is not None:
+                self.stats['cache_hits'] += 1
+                fields['format'] = cached.name
+                return fields
+
+        self.stats['detections'] += 1
+        for log_format in self.formats:
+            if log_format is cached:
+                continue
+            fields = log_format.parse(line)
+            if fields is not None:
+                break
+        else:
+            log_format, fields = self._plain, self._plain.parse(line)
+            self.stats['unparsed'] += 1
+
+        # Plain matches anything, so it is never cached in place of a real format
+        if source is not None and log_format is not cached and log_format is not self._plain:
+            self._source_formats[source] = log_format
+            self._source_formats.move_to_end(source)
+            while len(self._source_formats) > self.cache_size:
+                self._source_formats.popitem(last=False)
+        fields['format'] = log_format.name
+        return fields
+
+    def source_formats(self) -> Dict[str, str]:
+        return {source: log_format.name for source, log_format in self._source_formats.items()}
+
+
+def default_log_formats() -> List[LogFormat]:
+    """Formats in detection order; the anchored prefixes make mismatches cheap"""
+    timestamp = r'(?P<timestamp>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d{1,9})?(?:Z|[+-]\d{2}:?\d{2})?)'
+    return [
+        JsonLogFormat(),
+        SyslogLogFormat(
+            "syslog_rfc5424",
+            r'<(?P<pri>\d{1,3})>1 (?P<timestamp>\S+) (?P<host>\S+) (?P<application>\S+) (?P<procid>\S+) '
+            r'(?P<msgid>\S+) (?P<structured_data>-|(?:\[(?:[^\]\\]|\\.)*\])+)(?: (?P<message>.*))?$'),
+        SyslogLogFormat(
+            "syslog_rfc3164",
+            r'<(?P<pri>\d{1,3})>(?P<timestamp>[A-Z][a-z]{2} [ \d]\d \d{2}:\d{2}:\d{2}) (?P<host>\S+) '
+            r'(?P<application>[^:\[\s]+)(?:\[(?P<procid>[^\]]+)\])?: ?(?P<message>.*)$'),
+        # Logback/Log4j "timestamp LEVEL [thread] logger: message"
+        RegexLogFormat(
+            "logback", timestamp + r'\s+(?P<level>[A-Za-z]+)\s+\[(?P<thread>[^\]]+)\]\s+(?P<logger>[^:\s]+):\s*(?P<message>.*)$'),
+        # Logback default layout "timestamp [thread] LEVEL logger - message"
+        RegexLogFormat(
+            "logback_default", timestamp + r'\s+\[(?P<thread>[^\]]+)\]\s+(?P<level>[A-Za-z]+)\s+(?P<logger>\S+)\s+-\s?(?P<message>.*)$'),
+        # Python logging "timestamp - logger - LEVEL - message"
+        RegexLogFormat(
+            "python", timestamp + r'\s*-\s*(?P<logger>[^-]+?)\s*-\s*(?P<level>[A-Za-z]+)\s*-\s?(?P<message>.*)$'),
+        # winston "timestamp level: message"
+        RegexLogFormat("winston", timestamp + r'\s+(?P<level>[A-Za-z]+):\s*(?P<message>.*)$'),
+        LogfmtLogFormat(),
+    ]
+
+
+class LineFramer:
+    """Splits a TCP byte stream into log lines
+
+    Frames are newline-delimited by default. With ``octet_counting`` a frame
+    may also be sent as ``MSG-LEN SP MSG`` (RFC 6587 octet counting, as used
+    by rsyslog/syslog-ng over TCP); newline-delimited frames are still
+    accepted in that mode, so one listener serves both kinds of senders.
+    Frames longer than ``max_line_bytes`` are skipped rather than buffered.
+    """
+
+    def __init__(self, octet_counting: bool = False, max_line_bytes: int = 65536):
+        self.octet_counting = octet_counting
+        self.max_line_bytes = max_line_bytes
+        self._buffer = bytearray()
+        self._skip = 0  # bytes left of an oversized frame; -1 skips to the next newline
+        self.oversized = 0
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add received bytes and return every complete frame"""
+        buffer = self._buffer
+        buffer += data
+        limit = self.max_line_bytes
+        frames: List[bytes] = []
+        pos, size = 0, len(buffer)
+        while pos < size:
+            if self._skip:
+                if self._skip > 0:
+                    taken = min(self._skip, size - pos)
+                    pos += taken
+                    self._skip -= taken
+                    continue
+                newline = buffer.find(b'\n', pos)
+                if newline < 0:
+                    pos = size
+                    break
+                pos, self._skip = newline + 1, 0
+                continue
+
+            if self.octet_counting and 0x31 <= buffer[pos] <= 0x39:  # MSG-LEN starts with 1-9
+                space = buffer.find(b' ', pos, pos + 11)
+                if space >= 0 and buffer[pos:space].isdigit():
+                    length = int(buffer[pos:space])
+                    if length > limit:
+                        self.oversized += 1
+                        self._skip, pos = length, space + 1
+                        continue
+                    end = space + 1 + length
+                    if end > size:
+                        break
+                    frames.append(bytes(buffer[space + 1:end]))
+                    pos = end
+                    continue
+                if space < 0 and size - pos < 11 and buffer[pos:size].isdigit():
+                    break  # the length prefix is still arriving
+
+            newline = buffer.find(b'\n', pos)
+            if newline < 0:
+                if size - pos > limit:
+                    self.oversized += 1
+                    self._skip, pos = -1, size
+                break
+            if newline - pos <= limit:
+                frames.append(bytes(buffer[pos:newline]))
+            else:
+                self.oversized += 1
+            pos = newline + 1
+        del buffer[:pos]
+        return frames
+
+    def flush(self) -> List[bytes]:
+        """Return a trailing unterminated line once the connection has closed"""
+        frames = [] if self._skip or not self._buffer else [bytes(self._buffer)]
+        self._buffer.clear()
+        return frames
+
+
+class LogIngestionServer:
+    """asyncio TCP/UDP log listener feeding a bounded queue
+
+    Every TCP connection is served by a coroutine with its own read buffer
+    and LineFramer. Lines go into one bounded queue drained by ``workers``
+    tasks that call ``handler(line, client_ip, transport)``. When the queue
+    is full a TCP connection stops reading until there is room, so a fast
+    sender is slowed down by TCP flow control instead of growing memory;
+    UDP has no flow control, so datagrams that find the queue full are
+    dropped and counted.
+    """
+
+    def __init__(self, handler: Callable[[str, str, str], Awaitable[Any]], host: str = '0.0.0.0',
+                 tcp_port: Optional[int] = 5140, udp_port: Optional[int] = 5140,
+                 queue_size: int = 10000, workers: int = 4, read_size: int = 65536,
+                 max_line_bytes: int = 65536, octet_counting: bool = False):
+        self.handler = handler
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.queue_size = queue_size
+        self.workers = workers
+        self.read_size = read_size
+        self.max_line_bytes = max_line_bytes
+        self.octet_counting = octet_counting
+        self.queue: Optional[asyncio.Queue] = None
+        self.tcp_server: Optional[asyncio.AbstractServer] = None
+        self.udp_transport: Optional[asyncio.DatagramTransport] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._writers: set = set()
+        self.stats = {
+            'connections_total': 0,
+            'connections_active': 0,
+            'bytes_received': 0,
+            'lines_received': 0,
+            'udp_datagrams': 0,
+            'udp_dropped': 0,
+            'oversized_dropped': 0,
+            'backpressure_waits': 0,
+            'handler_errors': 0,
+        }
+
+    @classmethod
+    def from_env(cls, handler, **overrides) -> 'LogIngestionServer':
+        """Build a server from the LOG_TCP_* / LOG_UDP_* / LOG_INGEST_* environment variables"""
+        udp_port = int(os.getenv('LOG_UDP_PORT', '5140'))
+        config = dict(
+            tcp_port=int(os.getenv('LOG_TCP_PORT', '5140')),
+            udp_port=udp_port or None,
+            queue_size=int(os.getenv('LOG_INGEST_QUEUE_SIZE', '10000')),
+            workers=int(os.getenv('LOG_INGEST_WORKERS', '4')),
+            max_line_bytes=int(os.getenv('LOG_MAX_LINE_BYTES', '65536')),
+            octet_counting=os.getenv('LOG_TCP_FRAMING', 'newline').lower() == 'octet-counting',
+        )
+        config.update(overrides)
+        return cls(handler, **config)
+
+    @property
+    def running(self) -> bool:
+        return self.tcp_server is not None or self.udp_transport is not None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'queue_depth': self.queue.qsize() if self.queue else 0,
+            'queue_size': self.queue_size,
+        }
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._worker_tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        if self.tcp_port is not None:
+            self.tcp_server = await asyncio.start_server(self._serve_connection, self.host, self.tcp_port,
+                                                         limit=self.read_size)
+            self.tcp_port = self.tcp_server.sockets[0].getsockname()[1]
+            logger.info(f"TCP log server listening on port {self.tcp_port}")
+        if self.udp_port is not None:
+            self.udp_transport, _ = await loop.create_datagram_endpoint(
+                lambda: _LogDatagramProtocol(self), local_addr=(self.host, self.udp_port))
+            self.udp_port = self.udp_transport.get_extra_info('sockname')[1]
+            logger.info(f"UDP log server listening on port {self.udp_port}")
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Stop listening, give queued lines ``drain_timeout`` seconds, then stop the workers"""
+        if self.tcp_server is not None:
+            self.tcp_server.close()
+            for writer in list(self._writers):
+                writer.close()
+            await self.tcp_server.wait_closed()
+            self.tcp_server = None
+        if self.udp_transport is not None:
+            self.udp_transport.close()
+            self.udp_transport = None
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Dropping {self.queue.qsize()} queued log lines on shutdown")
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        client_ip = peer[0] if peer else 'unknown'
+        framer = LineFramer(self.octet_counting, self.max_line_bytes)
+        queue = self.queue
+        self._writers.add(writer)
+        self.stats['connections_total'] += 1
+        self.stats['connections_active'] += 1
         try:
             while True:
-                data = self.rfile.readline()
+                data = await reader.read(self.read_size)
                 if not data:
                     break
-                
-                log_line = data.decode('utf-8').strip()
-                if log_line:
-                    # Process the log line
-                    asyncio.create_task(self.server.log_collector.process_tcp_log(log_line, self.client_address[0]))
-                    
+                self.stats['bytes_received'] += len(data)
+                for frame in framer.feed(data):
+                    await self._enqueue(queue, frame, client_ip, 'tcp')
+            for frame in framer.flush():
+                await self._enqueue(queue, frame, client_ip, 'tcp')
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug(f"TCP log connection from {client_ip} closed: {e}")
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.error(f"Error handling TCP log connection: {e}")
+            logger.error(f"Error handling TCP log connection from {client_ip}: {e}")
+        finally:
+            self.stats['oversized_dropped'] += framer.oversized
+            self.stats['connections_active'] -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _enqueue(self, queue: asyncio.Queue, frame: bytes, client_ip: str, transport: str):
+        line = frame.decode('utf-8', 'replace').strip()
+        if not line:
+            return
+        self.stats['lines_received'] += 1
+        try:
+            queue.put_nowait((line, client_ip, transport))
+        except asyncio.QueueFull:
+            # Stop reading this connection until the workers catch up
+            self.stats['backpressure_waits'] += 1
+            await queue.put((line, client_ip, transport))
+
+    def _datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        self.stats['udp_datagrams'] += 1
+        self.stats['bytes_received'] += len(data)
+        for frame in data.split(b'\n'):
+            line = frame.decode('utf-8', 'replace').strip()
+            if not line:
+                continue
+            self.stats['lines_received'] += 1
+            try:
+                self.queue.put_nowait((line, addr[0], 'udp'))
+            except asyncio.QueueFull:
+                self.stats['udp_dropped'] += 1
+
+    async def _worker(self):
+        queue = self.queue
+        while True:
+            line, client_ip, transport = await queue.get()
+            try:
+                await self.handler(line, client_ip, transport)
+            except Exception as e:
+                self.stats['handler_errors'] += 1
+                logger.error(f"Error processing {transport} log line from {client_ip}: {e}")
+            finally:
+                queue.task_done()
+
+
+class _LogDatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: LogIngestionServer):
+        self.server = server
+
+    def datagram_received(self, data: bytes, addr):
+        self.server._datagram_received(data, addr)
+
+    def error_received(self, exc: Exception):
+        logger.warning(f"UDP log receiver error: {exc}")
+
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is in requirements.txt
+    zstandard = None
+
+
+CORRUPT_BODY_ERRORS = (zlib.error,) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class UnsupportedEncoding(ValueError):
+    """Request body Content-Encoding that the NDJSON endpoint cannot decode"""
+
+
+class BodyDecompressor:
+    """Incremental decoder for a streamed request body
+
+    Supports identity, gzip (including concatenated members), deflate and,
+    when the zstandard package is installed, zstd. Output is produced in
+    pieces of at most ``max_piece`` bytes so a highly compressed body never
+    expands into one large buffer.
+    """
+
+    def __init__(self, encoding: Optional[str], max_piece: int = 1024 * 1024):
+        self.encoding = (encoding or 'identity').strip().lower()
+        self.max_piece = max_piece
+        if self.encoding in ('gzip', 'x-gzip'):
+            self._new = lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self._new = lambda: zlib.decompressobj()
+        elif self.encoding == 'zstd':
+            if zstandard is None:
+                raise UnsupportedEncoding("zstd bodies need the zstandard package")
+            self._new_zstd = zstandard.ZstdDecompressor().decompressobj
+            self._zstd = self._new_zstd()
+            self._new = None
+        elif self.encoding == 'identity':
+            self._new = None
+        else:
+            raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}")
+        self._zlib = self._new() if self._new else None
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        if self.encoding == 'identity':
+            yield data
+        elif self.encoding == 'zstd':
+            # zstandard's decompressobj has no output limit; input chunks are bounded by the server
+            while data:
+                piece = self._zstd.decompress(data)
+                if piece:
+                    yield piece
+                if not self._zstd.eof:
+                    break
+                # Next zstd frame, if the body holds several
+                data = self._zstd.unused_data
+                self._zstd = self._new_zstd()
+        else:
+            while data:
+                piece = self._zlib.decompress(data, self.max_piece)
+                if piece:
+                    yield piece
+                if self._zlib.eof:
+                    # Next gzip member, if the body holds several
+                    data = self._zlib.unused_data
+                    self._zlib = self._new()
+                else:
+                    data = self._zlib.unconsumed_tail
+
+
+_LOG_ENTRY_STRINGS = ('timestamp', 'logger_name', 'host', 'thread', 'trace_id', 'span_id')
+
+
+def ndjson_log_record(entry: Any, level_mapping: Dict[str, str], batch_id: str,
+                      now_iso: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Validate one decoded NDJSON entry against the LogEntry schema and build its pipeline record
+
+    Returns (record, None) or (None, reason). Hand-written checks replace
+    per-entry pydantic models, and timestamps already in UTC ``...Z`` form
+    are passed through without being parsed; other ISO 8601 values are
+    converted to it and unparseable ones replaced by the receive time.
+    """
+    if not isinstance(entry, dict):
+        return None, "entry is not a JSON object"
+    message = entry.get('message')
+    service_name = entry.get('service_name')
+    application = entry.get('application')
+    if not isinstance(message, str):
+        return None, "message must be a string"
+    if not isinstance(service_name, str):
+        return None, "service_name must be a string"
+    if not isinstance(application, str):
+        return None, "application must be a string"
+    level = entry.get('level', 'INFO')
+    if not isinstance(level, str):
+        return None, "level must be a string"
+    metadata = entry.get('metadata')
+    if metadata is not None and not isinstance(metadata, dict):
+        return None, "metadata must be an object"
+
+    record = {
+        'timestamp': now_iso,
+        'level': level_mapping.get(level.lower(), level.upper()),
+        'message': message,
+        'source': 'http_application',
+        'host': 'unknown',
+        'service': service_name,
+        'application': application,
+        'metadata': {'ingestion_method': 'http_ndjson', 'batch_id': batch_id, **(metadata or {})}
+    }
+    for field in _LOG_ENTRY_STRINGS:
+        value = entry.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            return None, f"{field} must be a string"
+        if field == 'timestamp':
+            record['timestamp'] = normalize_timestamp(value) or now_iso
+        elif value or field != 'host':
+            record[field] = value
+    return record, None
+
+
+class BatchedLogPublisher:
+    """Coalesces log records into newline-delimited JSON NATS messages
+
+    Records are encoded once as they arrive and buffered until
+    ``max_batch_lines`` records or ``max_batch_bytes`` bytes are waiting, or
+    ``flush_interval`` seconds have passed since the first buffered record.
+    Each flush publishes one NDJSON message on ``subject`` and one aggregated
+    data-flow event describing the whole batch on ``flow_subject``, instead
+    of two messages per line.
+    """
+
+    def __init__(self, subject: str = "logs.applications", flow_subject: str = "data.flow.application_logs",
+                 max_batch_lines: int = 500, max_batch_bytes: int = 512 * 1024, flush_interval: float = 0.05):
+        self.subject = subject
+        self.flow_subject = flow_subject
+        self.max_batch_lines = max_batch_lines
+        self.max_batch_bytes = max_batch_bytes
+        self.flush_interval = flush_interval
+        self.nats_client = None
+        self._lines: List[bytes] = []
+        self._bytes = 0
+        self._levels: Dict[str, int] = {}
+        self._applications: Dict[str, int] = {}
+        self._trace_ids: List[str] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set = set()
+        self.stats = {
+            'records': 0,
+            'batches': 0,
+            'bytes_published': 0,
+            'flow_events': 0,
+            'dropped_disconnected': 0,
+            'publish_errors': 0,
+        }
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'BatchedLogPublisher':
+        """Build a publisher from the LOG_BATCH_* environment variables"""
+        config = dict(
+            max_batch_lines=int(os.getenv('LOG_BATCH_MAX_LINES', '500')),
+            max_batch_bytes=int(os.getenv('LOG_BATCH_MAX_BYTES', str(512 * 1024))),
+            flush_interval=float(os.getenv('LOG_BATCH_FLUSH_SECONDS', '0.05')),
+        )
+        config.update(overrides)
+        return cls(**config)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, 'buffered_records': len(self._lines), 'buffered_bytes': self._bytes}
+
+    async def publish(self, record: Dict[str, Any]):
+        """Buffer one record, flushing when the batch is full"""
+        line = encode_json(record)
+        self._lines.append(line)
+        self._bytes += len(line) + 1
+        self.stats['records'] += 1
+        level = record.get('level', 'INFO')
+        self._levels[level] = self._levels.get(level, 0) + 1
+        application = record.get('application', 'unknown')
+        self._applications[application] = self._applications.get(application, 0) + 1
+        trace_id = record.get('trace_id')
+        if trace_id and len(self._trace_ids) < 10:
+            self._trace_ids.append(trace_id)
+
+        if len(self._lines) >= self.max_batch_lines or self._bytes >= self.max_batch_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._flush_soon)
+
+    def _flush_soon(self):
+        self._timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """Publish everything buffered so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._lines:
+            return
+        # Swap the batch out before awaiting so concurrent publishers start a new one
+        lines, size = self._lines, self._bytes
+        levels, applications, trace_ids = self._levels, self._applications, self._trace_ids
+        self._lines, self._bytes = [], 0
+        self._levels, self._applications, self._trace_ids = {}, {}, []
+
+        nats_client = self.nats_client
+        if not nats_client or nats_client.is_closed:
+            self.stats['dropped_disconnected'] += len(lines)
+            return
+        batch_id = uuid.uuid4().hex[:12]
+        try:
+            await nats_client.publish(self.subject, b'\n'.join(lines))
+            self.stats['batches'] += 1
+            self.stats['bytes_published'] += size
+            await nats_client.publish(self.flow_subject, encode_json({
+                'tracking_id': f"app-batch-{batch_id}",
+                'stage': 'Application Log Collection',
+                'component': 'application-log-collector',
+                'status': 'completed',
+                'data_size': size,
+                'metadata': {
+                    'log_count': len(lines),
+                    'levels': levels,
+                    'applications': applications,
+                    'trace_ids': trace_ids,
+                }
+            }))
+            self.stats['flow_events'] += 1
+        except Exception as e:
+            self.stats['publish_errors'] += 1
+            logger.error(f"Error publishing batch of {len(lines)} logs: {e}")
+
+    async def close(self):
+        await self.flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
 
 class ApplicationLogCollector:
     """Main application log collector service"""
     
     def __init__(self):
         self.nats_client = None
-        self.tcp_server = None
+        self.ingestion_server = LogIngestionServer.from_env(self.process_tcp_log)
+        self.publisher = BatchedLogPublisher.from_env()
+        self.parsers = LogParserRegistry(cache_size=int(os.getenv('LOG_FORMAT_CACHE_SIZE', '10000')))
         self.processed_logs = 0
         self.error_count = 0
         
@@ -118,86 +820,49 @@ class ApplicationLogCollector:
         try:
             self.nats_client = nats.NATS()
             await self.nats_client.connect("nats://nats:4222")
+            self.publisher.nats_client = self.nats_client
             logger.info("Connected to NATS for log forwarding")
         except Exception as e:
             logger.error(f"Failed to connect to NATS: {e}")
     
-    def start_tcp_server(self, port: int = 5140):
-        """Start TCP log server in background thread"""
+    async def start_tcp_server(self):
+        """Start the TCP/UDP log listeners on the event loop"""
         try:
-            self.tcp_server = ThreadingTCPServer(('0.0.0.0', port), TCPLogHandler)
-            self.tcp_server.log_collector = self  # Attach self reference
-            
-            # Start in background thread
-            tcp_thread = threading.Thread(target=self.tcp_server.serve_forever, daemon=True)
-            tcp_thread.start()
-            
-            logger.info(f"TCP log server started on port {port}")
+            await self.ingestion_server.start()
         except Exception as e:
-            logger.error(f"Failed to start TCP server: {e}")
+            logger.error(f"Failed to start TCP/UDP log server: {e}")
     
     def normalize_log_level(self, level: str) -> str:
         """Normalize log level to standard format"""
         return self.level_mapping.get(level.lower(), level.upper())
     
-    def parse_structured_log(self, log_line: str) -> Optional[Dict[str, Any]]:
-        """Parse structured JSON log line"""
-        try:
-            return json.loads(log_line)
-        except:
-            # Try to parse common patterns
-            patterns = [
-                # Java Logback/Log4j pattern
-                r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[.,]\d{3})\s+(\w+)\s+\[([^\]]+)\]\s+([^:]+):\s*(.*)',
-                # Python logging pattern
-                r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}[.,]\d{3})\s*-\s*([^-]+)\s*-\s*(\w+)\s*-\s*(.*)',
-                # Node.js winston pattern
-                r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}[.,]\d{3}Z?)\s+(\w+):\s*(.*)'
-            ]
-            
-            import re
-            for pattern in patterns:
-                match = re.match(pattern, log_line)
-                if match:
-                    groups = match.groups()
-                    return {
-                        'timestamp': groups[0],
-                        'level': groups[1] if len(groups) > 1 else 'INFO',
-                        'message': groups[-1],
-                        'raw': log_line
-                    }
-            
-            # Fallback: treat as plain message
-            return {
-                'timestamp': datetime.now().isoformat(),
-                'level': 'INFO',
-                'message': log_line,
-                'raw': log_line
-            }
+    def parse_structured_log(self, log_line: str, source: Optional[str] = None) -> Dict[str, Any]:
+        """Parse a log line in any registered format, trying ``source``'s last format first"""
+        return self.parsers.parse(log_line, source)
     
-    async def process_tcp_log(self, log_line: str, client_ip: str):
-        """Process TCP log entry"""
+    async def process_tcp_log(self, log_line: str, client_ip: str, transport: str = 'tcp'):
+        """Process a log line received over TCP or UDP"""
         try:
-            parsed = self.parse_structured_log(log_line)
-            if not parsed:
-                return
+            parsed = self.parse_structured_log(log_line, f"{transport}:{client_ip}")
             
             # Create standardized log entry
             standardized = StandardizedLogEntry(
                 timestamp=datetime.now(),
-                level=self.normalize_log_level(parsed.get('level', 'INFO')),
+                level=self.normalize_log_level(str(parsed.get('level', 'INFO'))),
                 message=parsed.get('message', log_line),
-                source='tcp_application',
-                host=client_ip,
-                service=parsed.get('service', 'unknown'),
-                application=parsed.get('application', 'tcp-app'),
-                logger_name=parsed.get('logger', None),
-                trace_id=parsed.get('traceId', None),
-                span_id=parsed.get('spanId', None),
+                source=f'{transport}_application',
+                host=parsed.get('host') or client_ip,
+                service=parsed.get('service') or parsed.get('service_name', 'unknown'),
+                application=parsed.get('application', f'{transport}-app'),
+                logger_name=parsed.get('logger') or parsed.get('logger_name'),
+                trace_id=parsed.get('traceId') or parsed.get('trace_id'),
+                span_id=parsed.get('spanId') or parsed.get('span_id'),
                 thread=parsed.get('thread', None),
                 metadata={
+                    **(parsed.get('fields') or {}),
                     'source_ip': client_ip,
-                    'ingestion_method': 'tcp'
+                    'ingestion_method': transport,
+                    'log_format': parsed['format']
                 },
                 raw_log=log_line
             )
@@ -206,7 +871,7 @@ class ApplicationLogCollector:
             self.processed_logs += 1
             
         except Exception as e:
-            logger.error(f"Error processing TCP log: {e}")
+            logger.error(f"Error processing {transport} log: {e}")
             self.error_count += 1
     
     async def process_http_log_batch(self, log_batch: LogBatch) -> Dict[str, Any]:
@@ -241,8 +906,7 @@ class ApplicationLogCollector:
                         'ingestion_method': 'http',
                         'batch_id': log_batch.batch_id,
                         **(log_entry.metadata or {})
-                    },
-                    raw_log=json.dumps(log_entry.dict())
+                    }
                 )
                 
                 await self.forward_log_to_pipeline(standardized)
@@ -261,52 +925,91 @@ class ApplicationLogCollector:
             'batch_id': log_batch.batch_id or str(uuid.uuid4())
         }
     
+    async def process_ndjson_stream(self, chunks: AsyncIterator[bytes], encoding: Optional[str] = None,
+                                    batch_id: Optional[str] = None, max_error_samples: int = 10) -> Dict[str, Any]:
+        """Validate and publish a streamed NDJSON body one line at a time
+
+        Lines are decoded and framed as chunks arrive, so memory stays
+        bounded by the chunk size however large the upload is; publishing
+        goes through the batched publisher, which slows the upload down when
+        NATS falls behind.
+        """
+        decompressor = BodyDecompressor(encoding)
+        framer = LineFramer(max_line_bytes=int(os.getenv('LOG_MAX_LINE_BYTES', '65536')))
+        batch_id = batch_id or str(uuid.uuid4())
+        raw_decode = JsonLogFormat._raw_decode
+        publish = self.publisher.publish
+        levels = self.level_mapping
+        processed = errors = line_number = 0
+        error_samples: List[Dict[str, Any]] = []
+
+        async def handle(frames: List[bytes]):
+            nonlocal processed, errors, line_number
+            now_iso = utc_timestamp()
+            for frame in frames:
+                line_number += 1
+                line = frame.strip()
+                if not line:
+                    continue
+                try:
+                    text = line.decode('utf-8')
+                    entry, end = raw_decode(text)
+                    if end != len(text):
+                        raise ValueError(f"trailing data at column {end + 1}")
+                    record, reason = ndjson_log_record(entry, levels, batch_id, now_iso)
+                except ValueError as e:  # includes UnicodeDecodeError and JSONDecodeError
+                    record, reason = None, f"invalid JSON: {e}"
+                if record is None:
+                    errors += 1
+                    if len(error_samples) < max_error_samples:
+                        error_samples.append({'line': line_number, 'error': reason})
+                    continue
+                await publish(record)
+                processed += 1
+
+        try:
+            async for chunk in chunks:
+                for piece in decompressor.decompress(chunk):
+                    await handle(framer.feed(piece))
+            await handle(framer.flush())
+            # The upload is on NATS by the time the client gets its response
+            await self.publisher.flush()
+        finally:
+            errors += framer.oversized
+            self.processed_logs += processed
+            self.error_count += errors
+
+        return {
+            'processed': processed,
+            'errors': errors,
+            'error_samples': error_samples,
+            'batch_id': batch_id
+        }
+    
     async def forward_log_to_pipeline(self, log_entry: StandardizedLogEntry):
         """Forward standardized log to the data pipeline"""
         try:
-            # Convert to Vector-compatible format
+            # Vector-compatible record; unset fields are omitted, and the raw
+            # line only travels when parsing left something out of the message
             vector_log = {
-                'timestamp': log_entry.timestamp.isoformat(),
+                'timestamp': utc_timestamp(log_entry.timestamp),
                 'level': log_entry.level,
                 'message': log_entry.message,
                 'source': log_entry.source,
                 'host': log_entry.host,
                 'service': log_entry.service,
                 'application': log_entry.application,
-                'logger_name': log_entry.logger_name,
-                'trace_id': log_entry.trace_id,
-                'span_id': log_entry.span_id,
-                'thread': log_entry.thread,
-                'metadata': log_entry.metadata or {},
-                'raw_log': log_entry.raw_log
-            }
-            
-            # Send to NATS for Vector ingestion
-            if self.nats_client and not self.nats_client.is_closed:
-                await self.nats_client.publish(
-                    "logs.applications",
-                    json.dumps(vector_log).encode()
-                )
-            
-            # Also send to data flow tracking
-            flow_event = {
-                'tracking_id': log_entry.trace_id or f"app-{uuid.uuid4().hex[:8]}",
-                'stage': 'Application Log Collection',
-                'component': 'application-log-collector',
-                'status': 'completed',
-                'data_size': len(log_entry.raw_log),
-                'metadata': {
-                    'application': log_entry.application,
-                    'service': log_entry.service,
-                    'level': log_entry.level
-                }
+                'metadata': log_entry.metadata or {}
             }
+            for field in ('logger_name', 'trace_id', 'span_id', 'thread'):
+                value = getattr(log_entry, field)
+                if value is not None:
+                    vector_log[field] = value
+            if log_entry.raw_log and log_entry.raw_log != log_entry.message:
+                vector_log['raw_log'] = log_entry.raw_log
             
-            if self.nats_client:
-                await self.nats_client.publish(
-                    "data.flow.application_logs",
-                    json.dumps(flow_event).encode()
-                )
+            # Batched to NATS for Vector ingestion, with one data flow event per batch
+            await self.publisher.publish(vector_log)
             
         except Exception as e:
             logger.error(f"Error forwarding log to pipeline: {e}")
@@ -450,6 +1153,19 @@ class ApplicationLogCollector:
                 logger = logging.getLogger('my_service')
                 logger.addHandler(handler)
                 logger.setLevel(logging.INFO)
+                ''',
+                'ndjson_bulk_upload': '''
+                # Upload a spooled backlog (one JSON LogEntry per line) after a link outage
+                import gzip
+                import requests
+                
+                with open('/var/spool/app-logs/backlog.ndjson', 'rb') as f:
+                    requests.post(
+                        'http://application-log-collector:8090/api/logs/ndjson',
+                        data=gzip.compress(f.read()),
+                        headers={'Content-Encoding': 'gzip', 'Content-Type': 'application/x-ndjson'},
+                        timeout=300
+                    )
                 '''
             }
         }
@@ -472,7 +1188,15 @@ service = ApplicationLogCollector()
 async def startup_event():
     """Initialize service on startup"""
     await service.connect_nats()
-    service.start_tcp_server()
+    await service.start_tcp_server()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the log listeners and flush queued lines"""
+    await service.ingestion_server.stop()
+    await service.publisher.close()
+    if service.nats_client and not service.nats_client.is_closed:
+        await service.nats_client.close()
 
 @app.get("/health")
 async def health_check():
@@ -481,7 +1205,7 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "nats_connected": service.nats_client and not service.nats_client.is_closed,
-        "tcp_server_running": service.tcp_server is not None,
+        "tcp_server_running": service.ingestion_server.running,
         "processed_logs": service.processed_logs,
         "error_count": service.error_count
     }
@@ -496,6 +1220,26 @@ async def ingest_log_batch(log_batch: LogBatch, background_tasks: BackgroundTask
         "timestamp": datetime.now().isoformat()
     }
 
+@app.post("/api/logs/ndjson")
+async def ingest_log_ndjson(request: Request, batch_id: Optional[str] = None):
+    """Ingest newline-delimited JSON log entries streamed in the request body
+
+    Each line is a LogEntry object. The body may be sent with
+    Content-Encoding gzip, deflate or zstd.
+    """
+    try:
+        result = await service.process_ndjson_stream(
+            request.stream(), request.headers.get('content-encoding'), batch_id)
+    except UnsupportedEncoding as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except CORRUPT_BODY_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Corrupt compressed body: {e}")
+    return {
+        "status": "accepted",
+        "batch_result": result,
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/api/logs/single")
 async def ingest_single_log(log_entry: LogEntry, background_tasks: BackgroundTasks):
     """Ingest a single log entry"""
@@ -521,7 +1265,10 @@ async def get_stats():
         "error_rate": service.error_count / max(service.processed_logs, 1),
         "uptime_seconds": datetime.now().timestamp(),
         "nats_connected": service.nats_client and not service.nats_client.is_closed,
-        "tcp_server_running": service.tcp_server is not None
+        "tcp_server_running": service.ingestion_server.running,
+        "ingestion": service.ingestion_server.snapshot(),
+        "parsers": service.parsers.stats,
+        "publisher": service.publisher.snapshot()
     }
 
 if __name__ == "__main__":
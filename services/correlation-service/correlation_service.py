@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+AIOps NAAS - Correlation Service
+
+In-process replacement for the Benthos correlation stage:
+anomaly.detected.enriched.final → correlation-service → incidents.created
+
+The service:
+1. Consumes fully enriched anomalies from NATS
+2. Deduplicates them against recently created incidents (same ship and log template)
+3. Suppresses low-priority events and repeats of an incident already raised
+4. Correlates cpu/memory pressure and application logs with system metrics
+5. Publishes incidents in the schema consumed by the incident API
+
+All state lives in sliding-window indexes held in memory, so every event is
+handled with a constant number of dictionary operations and no database
+round trips.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import FastAPI
+import nats
+import uvicorn
+
+from log_templates import LogTemplateMiner
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+SEVERITY_PRIORITY = {"critical": 4, "high": 3, "medium": 2, "warning": 2, "info": 1, "debug": 1}
+PRIORITY_SEVERITY = {4: "critical", 3: "high", 2: "medium"}
+
+RUNBOOKS_BY_TYPE = {
+    "resource_pressure": ["investigate_high_resource_usage", "scale_resources", "check_system_limits"],
+    "weather_degradation": ["weather_response_protocol", "switch_backup_comm", "adjust_satellite_parameters"],
+    "communication_issues": ["comm_system_diagnostics", "antenna_alignment_check", "backup_communication"],
+    "system_overload": ["load_balancing", "process_optimization", "resource_scaling"],
+    "application_system_correlation": ["investigate_app_system_correlation", "check_resource_limits", "review_application_logs"],
+}
+RUNBOOKS_BY_METRIC = {
+    "cpu_usage": ["investigate_cpu_usage", "check_cpu_intensive_processes"],
+    "memory_usage": ["investigate_memory_usage", "check_memory_leaks"],
+}
+
+OPERATIONAL_INCIDENT_TYPES = {
+    "weather_impacted": "weather_degradation",
+    "system_overloaded": "system_overload",
+    "degraded_comms": "communication_issues",
+}
+
+
+def _text(value: Any, default: str) -> str:
+    return value if isinstance(value, str) and value else default
+
+
+class ExpiringIndex:
+    """Hash index whose entries expire ``ttl`` seconds after they were last set
+
+    Entries live in an OrderedDict and a refreshed entry moves to the end.
+    Every entry has the same TTL, so the dict stays ordered by deadline and
+    ``expire`` only ever inspects its head, which makes set/get/expire O(1)
+    with exactly one slot per live key.
+    """
+
+    __slots__ = ('ttl', 'max_entries', '_entries')
+
+    def __init__(self, ttl: float, max_entries: int = 100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def set(self, key: Hashable, value: Any, now: float):
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        entries[key] = (now + self.ttl, value)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def get(self, key: Hashable, now: float) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            return None
+        return entry[1]
+
+    def expire(self, now: float):
+        entries = self._entries
+        while entries and next(iter(entries.values()))[0] <= now:
+            entries.popitem(last=False)
+
+
+class CorrelationEngine:
+    """Deduplication, suppression and correlation over sliding time windows
+
+    Windows mirror the Benthos pipeline this replaces:
+    - dedup: an incident already created for the same ship, device and mined
+      log template (or metric, for metric anomalies) within ``dedup_window``
+      seconds
+    - correlation: the latest event per (ship, source, metric) within
+      ``correlation_window`` seconds
+    - suppression: one incident per (type, ship, device, metric, service)
+      within ``suppression_window`` seconds and per tracking id (or ship,
+      device, metric and minute bucket) within ``tracking_window`` seconds
+
+    The device is ``device_id`` when the event carries one, else ``host``.
+    """
+
+    def __init__(self, dedup_window: float = 300, correlation_window: float = 600,
+                 suppression_window: float = 900, tracking_window: float = 1800,
+                 max_entries: int = 100000, clock: Callable[[], float] = time.time,
+                 log_templates: Optional[LogTemplateMiner] = None):
+        self.clock = clock
+        self.log_templates = log_templates or LogTemplateMiner()
+        self.dedup_index = ExpiringIndex(dedup_window, max_entries)
+        self.correlation_index = ExpiringIndex(correlation_window, max_entries)
+        self.suppression_index = ExpiringIndex(suppression_window, max_entries)
+        self.tracking_index = ExpiringIndex(tracking_window, max_entries)
+        self.stats = {
+            "events_received": 0,
+            "duplicates": 0,
+            "suppressed_low_priority": 0,
+            "suppressed_repeat": 0,
+            "correlated": 0,
+            "incidents_created": 0,
+        }
+
+    def indexes(self) -> Dict[str, ExpiringIndex]:
+        return {
+            "dedup": self.dedup_index,
+            "correlation": self.correlation_index,
+            "suppression": self.suppression_index,
+            "tracking": self.tracking_index,
+        }
+
+    def process(self, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the incident to publish for ``event``, or None if it is dropped"""
+        now = self.clock()
+        for index in self.indexes().values():
+            index.expire(now)
+        self.stats["events_received"] += 1
+
+        ship_id = _text(event.get('ship_id'), "unknown-ship")
+        device_id = _text(event.get('device_id'), _text(event.get('host'), "unknown-device"))
+        event_source = _text(event.get('event_source'), "unknown")
+        metric_name = _text(event.get('metric_name'), "unknown")
+        score = event.get('final_anomaly_score')
+        if score is None:
+            score = event.get('anomaly_score')
+
+        if self._is_low_priority(event, score):
+            self.stats["suppressed_low_priority"] += 1
+            return None
+
+        # Every accepted event is visible to correlation, even if it is itself a duplicate
+        self.correlation_index.set((ship_id, event_source, metric_name), event, now)
+
+        log_template_id, log_template = self._log_template(event)
+        # Template IDs are fixed at creation, so dedup survives the template generalising
+        dedup_key = (ship_id, device_id, log_template_id or metric_name)
+        if self.dedup_index.get(dedup_key, now) is not None:
+            self.stats["duplicates"] += 1
+            return None
+
+        related = self._find_related(ship_id, event_source, metric_name, now)
+        incident_type = self._classify(event, event_source, metric_name, related)
+
+        suppression_key = (incident_type, ship_id, device_id, metric_name, _text(event.get('service'), "unknown"))
+        tracking_key = event.get('tracking_id') or (ship_id, device_id, metric_name, int(now // 60))
+        if (self.suppression_index.get(suppression_key, now) is not None
+                or self.tracking_index.get(tracking_key, now) is not None):
+            self.stats["suppressed_repeat"] += 1
+            return None
+
+        incident = self._build_incident(event, ship_id, event_source, metric_name, score, incident_type, related)
+        if log_template_id:
+            incident["log_template"] = log_template
+            incident["log_template_id"] = log_template_id
+        self.suppression_index.set(suppression_key, incident['incident_id'], now)
+        self.tracking_index.set(tracking_key, incident['incident_id'], now)
+        self.dedup_index.set(dedup_key, incident['incident_id'], now)
+        if related is not None:
+            self.stats["correlated"] += 1
+        self.stats["incidents_created"] += 1
+        return incident
+
+    def _log_template(self, event: Dict[str, Any]) -> Tuple[int, str]:
+        """Template ID and text for a log event, or (0, '') for metric events
+
+        IDs assigned upstream by anomaly detection are kept so every service
+        groups an error under the same ID; only events without one are mined here.
+        """
+        metadata = event.get('metadata') if isinstance(event.get('metadata'), dict) else {}
+        for source in (event, metadata):
+            if source.get('log_template_id'):
+                return int(source['log_template_id']), _text(source.get('log_template'), '')
+        log_message = event.get('log_message') or event.get('message')
+        if not isinstance(log_message, str) or not log_message:
+            return 0, ''
+        template = self.log_templates.add(log_message)
+        return template.template_id, template.template
+
+    @staticmethod
+    def _is_low_priority(event: Dict[str, Any], score: Optional[float]) -> bool:
+        if score is None:
+            return False
+        if score < 0.3:
+            return True
+        enrichment = event.get('enrichment_context') or {}
+        return enrichment.get('operational_priority') == "low" and score < 0.5
+
+    def _find_related(self, ship_id: str, event_source: str, metric_name: str, now: float) -> Optional[Dict[str, Any]]:
+        if metric_name == "cpu_usage":
+            return self.correlation_index.get((ship_id, event_source, "memory_usage"), now)
+        if metric_name == "memory_usage":
+            return self.correlation_index.get((ship_id, event_source, "cpu_usage"), now)
+        if event_source == "basic_metrics":
+            return self.correlation_index.get((ship_id, "application_logs", "log_anomaly"), now)
+        if event_source == "application_logs":
+            return self.correlation_index.get((ship_id, "basic_metrics", "cpu_usage"), now)
+        return None
+
+    @staticmethod
+    def _classify(event: Dict[str, Any], event_source: str, metric_name: str,
+                  related: Optional[Dict[str, Any]]) -> str:
+        is_enriched = event.get('correlation_level') == "level_1_enriched"
+        operational_status = event.get('operational_status') or "normal"
+        related_source = related.get('event_source') if related else None
+        related_metric = (related.get('metric_name') or "") if related else ""
+
+        if is_enriched and operational_status != "normal":
+            return OPERATIONAL_INCIDENT_TYPES.get(operational_status, "operational_anomaly")
+        if event_source == "application_logs" and related_source == "basic_metrics":
+            if "cpu" in related_metric or "memory" in related_metric:
+                return "application_system_correlation"
+            return "application_infrastructure_issue"
+        if event_source == "basic_metrics" and related_source == "application_logs":
+            return "system_application_correlation"
+        if related and {metric_name, related_metric} == {"cpu_usage", "memory_usage"}:
+            return "resource_pressure"
+        if is_enriched and event.get('enrichment_context'):
+            return "enriched_anomaly"
+        return "single_anomaly"
+
+    @staticmethod
+    def _severity_priority(severity: Any) -> int:
+        return SEVERITY_PRIORITY.get(severity.lower(), 1) if isinstance(severity, str) and severity else 1
+
+    def _build_incident(self, event: Dict[str, Any], ship_id: str, event_source: str, metric_name: str,
+                        score: Optional[float], incident_type: str,
+                        related: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        priority = self._severity_priority(event.get('severity'))
+        if related is not None:
+            priority = max(priority, self._severity_priority(related.get('severity')))
+        correlated_events = [event] if related is None else [event, related]
+        if related is not None:
+            confidence = 0.85
+        elif event.get('correlation_level') == "level_1_enriched":
+            confidence = 0.75
+        else:
+            confidence = 0.6
+
+        created_at = datetime.now(timezone.utc).isoformat()
+        metric_value = event.get('metric_value')
+        anomaly_score = score if score is not None else 0.5
+        tracking_id = event.get('tracking_id') or None
+
+        return {
+            "event_type": "incident",
+            "incident_id": str(uuid.uuid4()),
+            "created_at": created_at,
+            "updated_at": created_at,
+            "status": "open",
+            "acknowledged": False,
+            "incident_type": incident_type,
+            "incident_severity": PRIORITY_SEVERITY.get(priority, "low"),
+            "ship_id": ship_id,
+            "service": _text(event.get('service'), "unknown_service"),
+            "metric_name": metric_name if metric_name != "unknown" else "unknown_metric",
+            "metric_value": metric_value if metric_value is not None else 0.0,
+            "anomaly_score": anomaly_score,
+            "device_id": _text(event.get('device_id'), "unknown-device"),
+            "correlation_id": _text(event.get('correlation_id'), str(uuid.uuid4())),
+            "tracking_id": tracking_id,
+            "correlated_events": correlated_events,
+            "timeline": [{
+                "timestamp": created_at,
+                "event": "incident_created",
+                "description": f"Incident created by anomaly correlation - {incident_type} on {ship_id}",
+                "source": "correlation_service",
+                "metadata": {
+                    "anomaly_score": anomaly_score,
+                    "metric_name": metric_name,
+                    "metric_value": metric_value,
+                    "tracking_id": tracking_id,
+                    "correlation_confidence": confidence
+                }
+            }],
+            "metadata": {
+                "correlation_confidence": confidence,
+                "event_source": event_source,
+                "host": _text(event.get('host'), "unknown"),
+                "original_timestamp": event.get('timestamp') or created_at,
+                "correlated_events_count": len(correlated_events),
+                "ship_id_source": _text(event.get('ship_id_source'), "unknown"),
+                "registry_metadata": event.get('registry_metadata') or {}
+            },
+            "suggested_runbooks": self._runbooks(incident_type, metric_name, event_source),
+        }
+
+    @staticmethod
+    def _runbooks(incident_type: str, metric_name: str, event_source: str) -> list:
+        if incident_type in RUNBOOKS_BY_TYPE:
+            return list(RUNBOOKS_BY_TYPE[incident_type])
+        if metric_name in RUNBOOKS_BY_METRIC:
+            return list(RUNBOOKS_BY_METRIC[metric_name])
+        if event_source == "application_logs":
+            return ["review_application_logs", "check_application_health", "investigate_error_patterns"]
+        return ["generic_investigation", "check_system_health"]
+
+
+class CorrelationService:
+    """NATS consumer that runs enriched anomalies through the correlation engine"""
+
+    def __init__(self):
+        self.nats_url = os.getenv('NATS_URL', 'nats://nats:4222')
+        self.input_subject = os.getenv('CORRELATION_INPUT_SUBJECT', 'anomaly.detected.enriched.final')
+        self.output_subject = os.getenv('CORRELATION_OUTPUT_SUBJECT', 'incidents.created')
+        self.engine = CorrelationEngine(
+            dedup_window=float(os.getenv('CORRELATION_DEDUP_WINDOW_SECONDS', '300')),
+            correlation_window=float(os.getenv('CORRELATION_WINDOW_SECONDS', '600')),
+            suppression_window=float(os.getenv('CORRELATION_SUPPRESSION_WINDOW_SECONDS', '900')),
+            tracking_window=float(os.getenv('CORRELATION_TRACKING_WINDOW_SECONDS', '1800')),
+            max_entries=int(os.getenv('CORRELATION_MAX_ENTRIES', '100000'))
+        )
+        self.nats_client = None
+        self.health_status = {"healthy": False, "nats_connected": False}
+        self.errors = 0
+
+    async def connect_nats(self):
+        """Connect to NATS and subscribe to enriched anomalies"""
+        try:
+            self.nats_client = await nats.connect(self.nats_url)
+            await self.nats_client.subscribe(self.input_subject, queue="correlation_queue", cb=self.handle_message)
+            self.health_status["nats_connected"] = True
+            logger.info(f"Subscribed to {self.input_subject} on {self.nats_url}")
+        except Exception as e:
+            logger.error(f"Failed to connect to NATS: {e}")
+            self.health_status["nats_connected"] = False
+
+    async def handle_message(self, msg):
+        try:
+            incident = self.engine.process(json.loads(msg.data.decode()))
+            if incident is not None:
+                await self.nats_client.publish(self.output_subject, json.dumps(incident, default=str).encode())
+                logger.debug(f"Incident {incident['incident_id']} created: {incident['incident_type']} on {incident['ship_id']}")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error correlating anomaly: {e}")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **self.engine.stats,
+            "errors": self.errors,
+            "index_sizes": {name: len(index) for name, index in self.engine.indexes().items()},
+            "log_templates": {**self.engine.log_templates.stats, "templates": len(self.engine.log_templates.templates)},
+        }
+
+
+# Initialize service
+service = CorrelationService()
+
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await service.connect_nats()
+    service.health_status["healthy"] = service.health_status["nats_connected"]
+    logger.info(f"Correlation service started - Health: {service.health_status}")
+
+    yield
+
+    if service.nats_client:
+        await service.nats_client.drain()
+
+app = FastAPI(
+    title="AIOps NAAS Correlation Service",
+    description="Deduplicates, suppresses and correlates enriched anomalies into incidents",
+    version="0.1.0",
+    lifespan=lifespan
+)
+
+@app.get("/health")
+async def health():
+    """Health check endpoint"""
+    return service.health_status
+
+@app.get("/metrics")
+async def metrics():
+    """Correlation counters and window index sizes"""
+    return service.metrics()
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv('CORRELATION_PORT', '8092')))
@@ -16,15 +16,19 @@ Features:
 import asyncio
 import logging
 import json
+import math
+import os
+import time
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
-from collections import defaultdict, deque
+from itertools import islice
+from typing import Callable, Dict, List, Any, Optional
+from dataclasses import dataclass
+from collections import OrderedDict, defaultdict, deque
 
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 import uvicorn
@@ -39,9 +43,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class DataFlowEvent:
-    """Data flow tracking event"""
+    """Data flow tracking event (slotted: the tracker holds tens of thousands)"""
     event_id: str
     tracking_id: str
     stage: str
@@ -54,8 +58,14 @@ class DataFlowEvent:
     
     def to_dict(self):
         return {
-            **asdict(self),
+            'event_id': self.event_id,
+            'tracking_id': self.tracking_id,
+            'stage': self.stage,
+            'component': self.component,
             'timestamp': self.timestamp.isoformat(),
+            'status': self.status,
+            'data_size': self.data_size,
+            'latency_ms': self.latency_ms,
             'metadata': self.metadata or {}
         }
 
@@ -70,18 +80,278 @@ class PipelineStage:
     expected_latency_ms: float
     health_endpoint: Optional[str] = None
 
+class _Trace:
+    """Events of one tracking_id plus the time it was last touched"""
+    __slots__ = ('events', 'last_seen')
+
+    def __init__(self, max_events: int, now: float):
+        self.events = deque(maxlen=max_events)
+        self.last_seen = now
+
+
+class TraceStore:
+    """Bounded storage for flow events with lookups by tracking_id and stage
+
+    - recent events live in a ring buffer of ``max_events``; tail reads walk
+      it from the end, so reading the last k events is O(k)
+    - each stage keeps its own ring buffer of ``max_events_per_stage``
+    - traces are kept in least-recently-updated order: a trace untouched for
+      ``trace_ttl`` seconds expires, and beyond ``max_traces`` the oldest is
+      evicted; each trace keeps at most ``max_events_per_trace`` events
+
+    Memory is therefore flat no matter how long the service runs.
+    """
+
+    def __init__(self, max_events: int = 10000, max_traces: int = 5000,
+                 max_events_per_trace: int = 50, max_events_per_stage: int = 1000,
+                 trace_ttl: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.max_traces = max_traces
+        self.max_events_per_trace = max_events_per_trace
+        self.max_events_per_stage = max_events_per_stage
+        self.trace_ttl = trace_ttl
+        self._clock = clock
+        self._recent = deque(maxlen=max_events)
+        self._traces: 'OrderedDict[str, _Trace]' = OrderedDict()
+        self._stages: Dict[str, deque] = {}
+        self.stats = {
+            'events_added': 0,
+            'traces_expired': 0,
+            'traces_evicted': 0,
+        }
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'TraceStore':
+        """Build a store sized from the TRACE_* environment variables"""
+        config = dict(
+            max_events=int(os.getenv('TRACE_MAX_EVENTS', '10000')),
+            max_traces=int(os.getenv('TRACE_MAX_TRACES', '5000')),
+            max_events_per_trace=int(os.getenv('TRACE_MAX_EVENTS_PER_TRACE', '50')),
+            max_events_per_stage=int(os.getenv('TRACE_MAX_EVENTS_PER_STAGE', '1000')),
+            trace_ttl=float(os.getenv('TRACE_TTL_SECONDS', '3600')),
+        )
+        config.update(overrides)
+        return cls(**config)
+
+    def __len__(self) -> int:
+        return len(self._recent)
+
+    @property
+    def trace_count(self) -> int:
+        return len(self._traces)
+
+    def add(self, event: DataFlowEvent):
+        now = self._clock()
+        self.stats['events_added'] += 1
+        self._recent.append(event)
+
+        stage_events = self._stages.get(event.stage)
+        if stage_events is None:
+            stage_events = self._stages[event.stage] = deque(maxlen=self.max_events_per_stage)
+        stage_events.append(event)
+
+        trace = self._traces.get(event.tracking_id)
+        if trace is None:
+            trace = self._traces[event.tracking_id] = _Trace(self.max_events_per_trace, now)
+        else:
+            trace.last_seen = now
+            self._traces.move_to_end(event.tracking_id)
+        trace.events.append(event)
+        self._expire(now)
+
+    def _expire(self, now: float):
+        # Traces are ordered by last update, so expired ones are at the front
+        traces = self._traces
+        while traces:
+            tracking_id, trace = next(iter(traces.items()))
+            if now - trace.last_seen >= self.trace_ttl:
+                self.stats['traces_expired'] += 1
+            elif len(traces) > self.max_traces:
+                self.stats['traces_evicted'] += 1
+            else:
+                break
+            del traces[tracking_id]
+
+    def trace(self, tracking_id: str) -> List[DataFlowEvent]:
+        """Events recorded for ``tracking_id`` in arrival order"""
+        trace = self._traces.get(tracking_id)
+        if trace is None or self._clock() - trace.last_seen >= self.trace_ttl:
+            return []
+        return list(trace.events)
+
+    def tail(self, limit: int, stage: Optional[str] = None) -> List[DataFlowEvent]:
+        """Last ``limit`` events, overall or for one stage, oldest first"""
+        events = self._recent if stage is None else self._stages.get(stage, ())
+        if limit <= 0:
+            return []
+        recent = list(islice(reversed(events), limit))
+        recent.reverse()
+        return recent
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'events_buffered': len(self._recent),
+            'active_traces': len(self._traces),
+            'stages_indexed': len(self._stages),
+        }
+
+
+class LatencySketch:
+    """Mergeable latency histogram with relative-error quantiles (DDSketch)
+
+    Values are counted in logarithmic buckets so that every quantile is
+    within ``relative_accuracy`` of the true value, whatever the range.
+    Sketches merge and subtract by adding bucket counts, which is what lets
+    a sliding window drop an expired second in O(buckets).
+    """
+    __slots__ = ('relative_accuracy', '_gamma_log', '_buckets', 'count', 'zero_count')
+
+    MIN_VALUE = 1e-3  # ms; smaller latencies are counted as zero
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma_log = math.log((1 + relative_accuracy) / (1 - relative_accuracy))
+        self._buckets: Dict[int, int] = {}
+        self.count = 0
+        self.zero_count = 0
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= self.MIN_VALUE:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) / self._gamma_log)
+        self._buckets[key] = self._buckets.get(key, 0) + 1
+
+    def merge(self, other: 'LatencySketch', sign: int = 1):
+        """Add ``other`` into this sketch, or remove it with ``sign=-1``"""
+        self.count += sign * other.count
+        self.zero_count += sign * other.zero_count
+        buckets = self._buckets
+        for key, n in other._buckets.items():
+            remaining = buckets.get(key, 0) + sign * n
+            if remaining:
+                buckets[key] = remaining
+            else:
+                buckets.pop(key, None)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        gamma = math.exp(self._gamma_log)
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if rank < seen:
+                return 2 * gamma ** key / (gamma + 1)
+        return 2 * gamma ** max(self._buckets) / (gamma + 1)
+
+
+class _SecondBucket:
+    __slots__ = ('second', 'events', 'errors', 'latency')
+
+    def __init__(self, second: int, relative_accuracy: float):
+        self.second = second
+        self.events = 0
+        self.errors = 0
+        self.latency = LatencySketch(relative_accuracy)
+
+
+class StageWindow:
+    """Sliding-window throughput, error rate and latency quantiles for one stage
+
+    Events land in per-second buckets covering the last ``window_seconds``.
+    Totals and a window-wide latency sketch are kept up to date as buckets
+    enter and leave, so reading the window costs one sort of the sketch's
+    buckets rather than a merge of every second.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, window_seconds: int = 300, relative_accuracy: float = 0.01,
+                 clock: Callable[[], float] = time.time):
+        self.window_seconds = window_seconds
+        self.relative_accuracy = relative_accuracy
+        self._clock = clock
+        self._buckets: deque = deque()
+        self._latency = LatencySketch(relative_accuracy)
+        self._events = 0
+        self._errors = 0
+        self._first_second: Optional[int] = None
+
+    def record(self, is_error: bool = False, latency_ms: Optional[float] = None):
+        second = int(self._clock())
+        self._expire(second)
+        if not self._buckets or self._buckets[-1].second != second:
+            self._buckets.append(_SecondBucket(second, self.relative_accuracy))
+        if self._first_second is None:
+            self._first_second = second
+        bucket = self._buckets[-1]
+        bucket.events += 1
+        self._events += 1
+        if is_error:
+            bucket.errors += 1
+            self._errors += 1
+        if latency_ms is not None:
+            bucket.latency.add(latency_ms)
+            self._latency.add(latency_ms)
+
+    def _expire(self, second: int):
+        oldest = second - self.window_seconds
+        buckets = self._buckets
+        while buckets and buckets[0].second <= oldest:
+            bucket = buckets.popleft()
+            self._events -= bucket.events
+            self._errors -= bucket.errors
+            self._latency.merge(bucket.latency, sign=-1)
+
+    def events_in_last(self, seconds: int) -> int:
+        """Events in the trailing ``seconds`` (at most the window length)"""
+        since = int(self._clock()) - seconds
+        total = 0
+        for bucket in reversed(self._buckets):
+            if bucket.second <= since:
+                break
+            total += bucket.events
+        return total
+
+    def summary(self) -> Dict[str, Any]:
+        now = int(self._clock())
+        self._expire(now)
+        # Until a full window has passed, rates are over the time observed
+        span = self.window_seconds
+        if self._first_second is not None:
+            span = max(1, min(span, now - self._first_second + 1))
+        return {
+            'window_seconds': self.window_seconds,
+            'events': self._events,
+            'errors': self._errors,
+            'events_per_second': self._events / span,
+            'events_last_minute': self.events_in_last(60),
+            'error_rate': self._errors / self._events if self._events else 0.0,
+            'latency_samples': self._latency.count,
+            **{f'latency_p{int(q * 100)}_ms': self._latency.quantile(q) for q in self.QUANTILES},
+        }
+
+
 class DataFlowTracker:
     """Tracks data flow through the pipeline"""
     
-    def __init__(self):
-        self.flow_events = deque(maxlen=10000)  # Recent events
-        self.active_traces = {}  # tracking_id -> flow events
+    def __init__(self, trace_store: Optional[TraceStore] = None, window_seconds: Optional[int] = None,
+                 clock: Callable[[], float] = time.time):
+        self.traces = trace_store or TraceStore.from_env()
+        self.window_seconds = window_seconds or int(os.getenv('STAGE_WINDOW_SECONDS', '300'))
         self.stage_metrics = defaultdict(lambda: {
             'events_processed': 0,
             'avg_latency_ms': 0.0,
+            'latency_count': 0,
+            'latency_sum_ms': 0.0,
             'error_count': 0,
-            'throughput_per_minute': 0.0,
-            'last_activity': None
+            'last_activity': None,
+            'window': StageWindow(self.window_seconds, clock=clock)
         })
         
         # Define pipeline stages
@@ -144,12 +414,7 @@ class DataFlowTracker:
     
     def add_flow_event(self, event: DataFlowEvent):
         """Add a new flow event"""
-        self.flow_events.append(event)
-        
-        # Update active traces
-        if event.tracking_id not in self.active_traces:
-            self.active_traces[event.tracking_id] = []
-        self.active_traces[event.tracking_id].append(event)
+        self.traces.add(event)
         
         # Update stage metrics
         stage_key = f"{event.stage}_{event.component}"
@@ -157,14 +422,16 @@ class DataFlowTracker:
         metrics['events_processed'] += 1
         metrics['last_activity'] = event.timestamp
         
-        if event.status == 'error':
+        is_error = event.status == 'error'
+        if is_error:
             metrics['error_count'] += 1
         
-        if event.latency_ms:
-            # Update rolling average latency
-            current_avg = metrics['avg_latency_ms']
-            count = metrics['events_processed']
-            metrics['avg_latency_ms'] = ((current_avg * (count - 1)) + event.latency_ms) / count
+        if event.latency_ms is not None:
+            metrics['latency_count'] += 1
+            metrics['latency_sum_ms'] += event.latency_ms
+            metrics['avg_latency_ms'] = metrics['latency_sum_ms'] / metrics['latency_count']
+        
+        metrics['window'].record(is_error, event.latency_ms)
     
     def get_pipeline_health(self) -> Dict[str, Any]:
         """Get overall pipeline health status"""
@@ -181,10 +448,9 @@ class DataFlowTracker:
                 (datetime.now() - metrics['last_activity']).total_seconds() < 300
             )
             
-            # Calculate error rate
-            error_rate = (
-                metrics['error_count'] / max(metrics['events_processed'], 1)
-            ) if metrics['events_processed'] > 0 else 0
+            # Health follows the recent window, not the lifetime totals
+            window = metrics['window'].summary()
+            error_rate = window['error_rate']
             
             # Determine stage health
             stage_status = "healthy"
@@ -204,6 +470,13 @@ class DataFlowTracker:
                 'error_count': metrics['error_count'],
                 'error_rate': error_rate,
                 'avg_latency_ms': metrics['avg_latency_ms'],
+                'events_per_second': window['events_per_second'],
+                'throughput_per_minute': window['events_last_minute'],
+                'throughput_utilization': window['events_per_second'] / stage.expected_throughput,
+                'latency_p50_ms': window['latency_p50_ms'],
+                'latency_p95_ms': window['latency_p95_ms'],
+                'latency_p99_ms': window['latency_p99_ms'],
+                'window': window,
                 'last_activity': metrics['last_activity'].isoformat() if metrics['last_activity'] else None,
                 'expected_throughput': stage.expected_throughput,
                 'expected_latency_ms': stage.expected_latency_ms
@@ -212,16 +485,46 @@ class DataFlowTracker:
         return {
             'overall_status': overall_health,
             'stages': stage_health,
-            'total_active_traces': len(self.active_traces),
-            'total_events_tracked': len(self.flow_events)
+            'total_active_traces': self.traces.trace_count,
+            'total_events_tracked': len(self.traces),
+            'trace_store': self.traces.snapshot()
         }
     
+    def render_prometheus_metrics(self) -> str:
+        """Per-stage counters and window statistics in Prometheus text format"""
+        families = [
+            ('pipeline_stage_events_total', 'counter', 'Flow events seen per stage'),
+            ('pipeline_stage_errors_total', 'counter', 'Flow events with error status per stage'),
+            ('pipeline_stage_events_per_second', 'gauge', 'Event rate over the sliding window'),
+            ('pipeline_stage_error_ratio', 'gauge', 'Error ratio over the sliding window'),
+            ('pipeline_stage_latency_ms', 'summary', 'Stage latency; quantiles over the sliding window'),
+        ]
+        samples = defaultdict(list)
+        for stage_key, metrics in list(self.stage_metrics.items()):
+            stage, _, component = stage_key.rpartition('_')
+            labels = f'stage="{_escape_label(stage)}",component="{_escape_label(component)}"'
+            window = metrics['window'].summary()
+            samples['pipeline_stage_events_total'].append(f"{{{labels}}} {metrics['events_processed']}")
+            samples['pipeline_stage_errors_total'].append(f"{{{labels}}} {metrics['error_count']}")
+            samples['pipeline_stage_events_per_second'].append(f"{{{labels}}} {window['events_per_second']}")
+            samples['pipeline_stage_error_ratio'].append(f"{{{labels}}} {window['error_rate']}")
+            latency = samples['pipeline_stage_latency_ms']
+            for q in StageWindow.QUANTILES:
+                value = window[f'latency_p{int(q * 100)}_ms']
+                latency.append(f'{{{labels},quantile="{q}"}} {"NaN" if value is None else value}')
+            latency.append(f"_sum{{{labels}}} {metrics['latency_sum_ms']}")
+            latency.append(f"_count{{{labels}}} {metrics['latency_count']}")
+
+        lines = []
+        for name, metric_type, help_text in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.extend(name + sample for sample in samples[name])
+        return "\n".join(lines) + "\n"
+
     def get_data_lineage(self, tracking_id: str) -> List[Dict[str, Any]]:
         """Get complete data lineage for a tracking ID"""
-        if tracking_id not in self.active_traces:
-            return []
-        
-        events = self.active_traces[tracking_id]
+        events = self.traces.trace(tracking_id)
         lineage = []
         
         for event in sorted(events, key=lambda x: x.timestamp):
@@ -237,10 +540,13 @@ class DataFlowTracker:
         
         return lineage
     
-    def get_recent_flows(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get recent flow events"""
-        recent = list(self.flow_events)[-limit:]
-        return [event.to_dict() for event in recent]
+    def get_recent_flows(self, limit: int = 100, stage: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get recent flow events, optionally for a single stage"""
+        return [event.to_dict() for event in self.traces.tail(limit, stage)]
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
 
 class DataFlowVisualizationService:
     """Main data flow visualization service"""
@@ -436,12 +742,17 @@ async def get_pipeline_health():
     """Get overall pipeline health status"""
     return service.tracker.get_pipeline_health()
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for per-stage throughput, errors and latency"""
+    return service.tracker.render_prometheus_metrics()
+
 @app.get("/api/flow/recent")
-async def get_recent_flows(limit: int = 100):
-    """Get recent flow events"""
+async def get_recent_flows(limit: int = 100, stage: Optional[str] = None):
+    """Get recent flow events, optionally filtered to one stage"""
     return {
-        "events": service.tracker.get_recent_flows(limit),
-        "total_tracked": len(service.tracker.flow_events)
+        "events": service.tracker.get_recent_flows(limit, stage),
+        "total_tracked": len(service.tracker.traces)
     }
 
 @app.get("/api/flow/lineage/{tracking_id}")
@@ -614,7 +925,8 @@ async def get_dashboard():
                         ${stageData.component}<br>
                         Events: ${stageData.events_processed}<br>
                         Errors: ${stageData.error_count}<br>
-                        Latency: ${stageData.avg_latency_ms.toFixed(1)}ms
+                        Rate: ${stageData.events_per_second.toFixed(2)}/s<br>
+                        Latency p95: ${stageData.latency_p95_ms === null ? '-' : stageData.latency_p95_ms.toFixed(1) + 'ms'}
                     `;
                     stagesContainer.appendChild(stageDiv);
                 });
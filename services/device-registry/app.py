@@ -5,8 +5,13 @@ Maintains hostname → ship_id mappings and device inventory for AIOps NAAS plat
 """
 
 import os
+import json
+import asyncio
+import logging
+import queue
 import sqlite3
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from contextlib import contextmanager
@@ -15,6 +20,13 @@ from fastapi import FastAPI, HTTPException, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 import uvicorn
+import nats
+
+logger = logging.getLogger(__name__)
+
+# Consumers of the shared registry client drop cached lookups for the
+# identifiers published here
+INVALIDATION_SUBJECT = "device_registry.updated"
 
 
 # Pydantic models for API
@@ -46,6 +58,10 @@ class HostnameMapping(BaseModel):
     last_seen: datetime = Field(default_factory=datetime.utcnow, description="Last activity timestamp")
 
 
+class BulkLookupRequest(BaseModel):
+    hostnames: List[str] = Field(..., max_length=1000, description="Hostnames or IP addresses to resolve (max 1000)")
+
+
 class RegistrationRequest(BaseModel):
     hostname: str = Field(..., description="Device hostname (required)")
     ip_address: str = Field(..., description="Primary IP address (required)")
@@ -58,20 +74,85 @@ class RegistrationRequest(BaseModel):
 
 
 # Database management
-class DeviceRegistryDB:
-    def __init__(self, db_path: str = "/app/data/device_registry.db"):
+class SQLiteConnectionPool:
+    """Fixed set of long-lived WAL-mode connections shared by the worker threads
+
+    Connections stay open, so each keeps its cache of prepared statements
+    across requests. WAL lets readers run while a write is in progress.
+    """
+
+    def __init__(self, db_path: str, size: int = 4, busy_timeout_ms: int = 5000):
         self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.init_database()
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout_ms}")
+        return conn
 
     @contextmanager
-    def get_connection(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+    def connection(self):
+        conn = self._idle.get()
         try:
             yield conn
+        except BaseException:
+            # Never hand an open transaction to the next borrower
+            conn.rollback()
+            raise
         finally:
-            conn.close()
+            self._idle.put(conn)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+# Columns returned for a hostname/IP lookup; every identifier of a device
+# (hostname, primary IP, additional IPs) is a row in hostname_mappings
+MAPPING_QUERY = """
+    SELECT hm.ship_id, hm.device_id, hm.device_type, 
+           d.vendor, d.model, d.location, s.name as ship_name,
+           d.hostname, d.ip_address,
+           hm.hostname as matched_identifier
+    FROM hostname_mappings hm
+    JOIN devices d ON hm.device_id = d.device_id
+    JOIN ships s ON hm.ship_id = s.ship_id
+"""
+
+
+class DeviceRegistryDB:
+    def __init__(self, db_path: str = "/app/data/device_registry.db", pool_size: int = 4,
+                 last_seen_flush_interval: float = 5.0):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.pool = SQLiteConnectionPool(db_path, size=pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="registry-db")
+        self.last_seen_flush_interval = last_seen_flush_interval
+        # Read-through map of identifier -> mapping, loaded at startup and refreshed on write
+        self.mappings: Dict[str, Dict[str, Any]] = {}
+        self._last_seen: Dict[str, datetime] = {}
+        self.init_database()
+        self.load_mappings()
+
+    def get_connection(self):
+        return self.pool.connection()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking database call on the registry's worker threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+
+    def close(self):
+        self.flush_last_seen()
+        self.executor.shutdown(wait=True)
+        self.pool.close()
 
     def init_database(self):
         """Initialize database schema and handle migrations"""
@@ -130,9 +211,31 @@ class DeviceRegistryDB:
             conn.execute("CREATE INDEX IF NOT EXISTS idx_devices_ship_id ON devices (ship_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_hostname_mappings_ship_id ON hostname_mappings (ship_id)")
             conn.execute("CREATE INDEX IF NOT EXISTS idx_devices_type ON devices (device_type)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_hostname_mappings_device_id ON hostname_mappings (device_id)")
+            
+            # Make sure every device hostname and primary IP is an indexed alias, so a
+            # lookup is always a single primary-key match (older databases only had
+            # some identifiers in hostname_mappings)
+            conn.execute("""
+                INSERT OR IGNORE INTO hostname_mappings (hostname, ship_id, device_id, device_type)
+                SELECT hostname, ship_id, device_id, device_type FROM devices
+                UNION ALL
+                SELECT ip_address, ship_id, device_id, device_type FROM devices WHERE ip_address IS NOT NULL
+            """)
             
             conn.commit()
 
+    def load_mappings(self):
+        """(Re)load the in-memory map of every identifier"""
+        with self.get_connection() as conn:
+            rows = conn.execute(MAPPING_QUERY).fetchall()
+        self.mappings = {row['matched_identifier']: dict(row) for row in rows}
+
+    def _refresh_device(self, conn, device_id: str):
+        """Update the in-memory map with the current identifiers of ``device_id``"""
+        for row in conn.execute(MAPPING_QUERY + " WHERE hm.device_id = ?", (device_id,)).fetchall():
+            self.mappings[row['matched_identifier']] = dict(row)
+
     def _migrate_database(self, conn):
         """Handle database migrations for hostname AND IP requirements"""
         try:
@@ -221,52 +324,58 @@ class DeviceRegistryDB:
                             """, (additional_ip, ship_id, device_id, device_type, datetime.utcnow()))
                 
                 conn.commit()
+                self._refresh_device(conn, device_id)
                 return device_id
         except sqlite3.IntegrityError:
             return None
 
     def lookup_hostname(self, hostname: str) -> Optional[Dict[str, Any]]:
         """Lookup ship_id and device info by hostname or IP address"""
+        mapping = self.mappings.get(hostname)
+        if mapping is not None:
+            return mapping
+        # Read through for rows written by another process since the map was loaded
         with self.get_connection() as conn:
-            # First try exact match in hostname_mappings
-            result = conn.execute("""
-                SELECT hm.ship_id, hm.device_id, hm.device_type, 
-                       d.vendor, d.model, d.location, s.name as ship_name,
-                       d.hostname, d.ip_address,
-                       hm.hostname as matched_identifier
-                FROM hostname_mappings hm
-                JOIN devices d ON hm.device_id = d.device_id
-                JOIN ships s ON hm.ship_id = s.ship_id
-                WHERE hm.hostname = ?
-            """, (hostname,)).fetchone()
-            
-            # If no exact match and input looks like IP, try to find by device IP pattern
-            if not result and self._is_ip_address(hostname):
-                # Try to find devices where ip_address contains this IP or similar pattern
-                result = conn.execute("""
-                    SELECT hm.ship_id, hm.device_id, hm.device_type, 
-                           d.vendor, d.model, d.location, s.name as ship_name,
-                           d.hostname, d.ip_address,
-                           d.ip_address as matched_identifier
-                    FROM devices d
-                    JOIN hostname_mappings hm ON d.device_id = hm.device_id
-                    JOIN ships s ON hm.ship_id = s.ship_id
-                    WHERE d.ip_address LIKE ? OR d.hostname LIKE ?
-                    LIMIT 1
-                """, (f"%{hostname}%", f"%{hostname}%")).fetchone()
-            
-            if result:
-                return dict(result)
+            row = conn.execute(MAPPING_QUERY + " WHERE hm.hostname = ?", (hostname,)).fetchone()
+        if row is None:
             return None
-
-    def _is_ip_address(self, hostname: str) -> bool:
-        """Check if the hostname string looks like an IP address"""
-        try:
-            import ipaddress
-            ipaddress.ip_address(hostname)
-            return True
-        except ValueError:
-            return False
+        mapping = self.mappings[hostname] = dict(row)
+        return mapping
+
+    def lookup_hostnames(self, hostnames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Lookup many hostnames/IPs; unknown ones are left out"""
+        mappings = {h: self.mappings[h] for h in hostnames if h in self.mappings}
+        misses = [h for h in hostnames if h not in mappings]
+        if misses:
+            with self.get_connection() as conn:
+                # Chunked to stay under SQLite's bound-parameter limit
+                for i in range(0, len(misses), 500):
+                    chunk = misses[i:i + 500]
+                    rows = conn.execute(
+                        MAPPING_QUERY + f" WHERE hm.hostname IN ({', '.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    for row in rows:
+                        mappings[row['matched_identifier']] = self.mappings[row['matched_identifier']] = dict(row)
+        return mappings
+
+    def touch(self, hostnames):
+        """Record a lookup; last_seen is written in batches by flush_last_seen"""
+        now = datetime.utcnow()
+        for hostname in hostnames:
+            self._last_seen[hostname] = now
+
+    def flush_last_seen(self):
+        """Write the last_seen timestamps recorded since the previous flush"""
+        pending, self._last_seen = self._last_seen, {}
+        if not pending:
+            return
+        with self.get_connection() as conn:
+            conn.executemany("""
+                UPDATE hostname_mappings 
+                SET last_seen = ?
+                WHERE hostname = ?
+            """, [(seen, hostname) for hostname, seen in pending.items()])
+            conn.commit()
 
     def update_last_seen(self, hostname: str):
         """Update last_seen timestamp for hostname"""
@@ -333,7 +442,56 @@ app = FastAPI(
 )
 
 # Database instance
-db = DeviceRegistryDB()
+db = DeviceRegistryDB(
+    os.getenv('DATABASE_PATH', '/app/data/device_registry.db'),
+    pool_size=int(os.getenv('DB_POOL_SIZE', '4')),
+    last_seen_flush_interval=float(os.getenv('LAST_SEEN_FLUSH_SECONDS', '5'))
+)
+
+# NATS connection for cache invalidation events (optional; registry works without it)
+nats_client = None
+
+
+last_seen_task = None
+
+
+async def flush_last_seen_periodically():
+    """Write batched last_seen updates so lookups never wait on a write"""
+    while True:
+        await asyncio.sleep(db.last_seen_flush_interval)
+        try:
+            await db.run(db.flush_last_seen)
+        except Exception as e:
+            logger.warning(f"Failed to flush last_seen updates: {e}")
+
+
+@app.on_event("startup")
+async def connect_nats():
+    global nats_client, last_seen_task
+    last_seen_task = asyncio.create_task(flush_last_seen_periodically())
+    try:
+        nats_client = await nats.connect(os.getenv('NATS_URL', 'nats://nats:4222'))
+    except Exception as e:
+        logger.warning(f"NATS unavailable, registry updates will not invalidate client caches: {e}")
+
+
+@app.on_event("shutdown")
+async def close_nats():
+    if last_seen_task is not None:
+        last_seen_task.cancel()
+    if nats_client is not None:
+        await nats_client.close()
+    await db.run(db.flush_last_seen)
+
+
+async def publish_invalidation(hostnames: List[str], **details):
+    """Tell registry clients to drop cached lookups for ``hostnames``"""
+    if nats_client is None or nats_client.is_closed:
+        return
+    try:
+        await nats_client.publish(INVALIDATION_SUBJECT, json.dumps({"hostnames": hostnames, **details}).encode())
+    except Exception as e:
+        logger.warning(f"Failed to publish registry invalidation for {hostnames}: {e}")
 
 
 # Dependency to get database
@@ -351,7 +509,7 @@ async def health_check():
 @app.post("/ships", response_model=Dict[str, Any])
 async def create_ship(ship: Ship, db: DeviceRegistryDB = Depends(get_db)):
     """Create a new ship"""
-    if db.create_ship(ship):
+    if await db.run(db.create_ship, ship):
         return {"success": True, "ship_id": ship.ship_id, "message": "Ship created successfully"}
     else:
         raise HTTPException(status_code=400, detail="Ship ID already exists")
@@ -360,13 +518,14 @@ async def create_ship(ship: Ship, db: DeviceRegistryDB = Depends(get_db)):
 @app.get("/ships", response_model=List[Dict[str, Any]])
 async def list_ships(db: DeviceRegistryDB = Depends(get_db)):
     """List all ships"""
-    return db.list_ships()
+    return await db.run(db.list_ships)
 
 
 @app.post("/devices/register", response_model=Dict[str, Any])
 async def register_device(request: RegistrationRequest, db: DeviceRegistryDB = Depends(get_db)):
     """Register a new device with hostname AND IP address requirements"""
-    device_id = db.register_device(
+    device_id = await db.run(
+        db.register_device,
         hostname=request.hostname,
         ip_address=request.ip_address,
         ship_id=request.ship_id,
@@ -379,6 +538,7 @@ async def register_device(request: RegistrationRequest, db: DeviceRegistryDB = D
     
     if device_id:
         identifiers_registered = [request.hostname, request.ip_address] + (request.additional_ip_addresses or [])
+        await publish_invalidation(identifiers_registered, device_id=device_id, ship_id=request.ship_id)
         return {
             "success": True,
             "device_id": device_id,
@@ -395,16 +555,19 @@ async def register_device(request: RegistrationRequest, db: DeviceRegistryDB = D
 @app.get("/devices", response_model=List[Dict[str, Any]])
 async def list_devices(ship_id: Optional[str] = None, db: DeviceRegistryDB = Depends(get_db)):
     """List devices, optionally filtered by ship_id"""
-    return db.list_devices(ship_id)
+    return await db.run(db.list_devices, ship_id)
 
 
 @app.get("/lookup/{hostname}", response_model=Dict[str, Any])
 async def lookup_hostname(hostname: str, db: DeviceRegistryDB = Depends(get_db)):
     """Lookup ship_id and device info by hostname"""
-    result = db.lookup_hostname(hostname)
+    # Known identifiers are served from memory without leaving the event loop
+    result = db.mappings.get(hostname)
+    if result is None:
+        result = await db.run(db.lookup_hostname, hostname)
     if result:
-        # Update last_seen timestamp
-        db.update_last_seen(hostname)
+        # Update last_seen timestamp (batched)
+        db.touch((hostname,))
         return {
             "success": True,
             "hostname": hostname,
@@ -414,12 +577,25 @@ async def lookup_hostname(hostname: str, db: DeviceRegistryDB = Depends(get_db))
         raise HTTPException(status_code=404, detail="Hostname not found in registry")
 
 
+@app.post("/lookup/bulk", response_model=Dict[str, Any])
+async def lookup_hostnames(request: BulkLookupRequest, db: DeviceRegistryDB = Depends(get_db)):
+    """Resolve many hostnames/IPs in one round trip"""
+    hostnames = list(dict.fromkeys(request.hostnames))
+    mappings = await db.run(db.lookup_hostnames, hostnames)
+    db.touch(mappings)
+    return {
+        "success": True,
+        "mappings": mappings,
+        "not_found": [hostname for hostname in hostnames if hostname not in mappings]
+    }
+
+
 @app.post("/lookup/{hostname}/update-last-seen")
 async def update_last_seen(hostname: str, db: DeviceRegistryDB = Depends(get_db)):
     """Update last_seen timestamp for hostname"""
-    result = db.lookup_hostname(hostname)
+    result = await db.run(db.lookup_hostname, hostname)
     if result:
-        db.update_last_seen(hostname)
+        await db.run(db.update_last_seen, hostname)
         return {"success": True, "hostname": hostname, "last_seen": datetime.utcnow()}
     else:
         raise HTTPException(status_code=404, detail="Hostname not found in registry")
@@ -428,7 +604,7 @@ async def update_last_seen(hostname: str, db: DeviceRegistryDB = Depends(get_db)
 @app.get("/devices/{device_id}/identifiers", response_model=Dict[str, Any])
 async def get_device_identifiers(device_id: str, db: DeviceRegistryDB = Depends(get_db)):
     """Get all identifiers (hostnames/IPs) for a device"""
-    identifiers = db.get_device_identifiers(device_id)
+    identifiers = await db.run(db.get_device_identifiers, device_id)
     if identifiers:
         return {
             "success": True,
@@ -443,8 +619,8 @@ async def get_device_identifiers(device_id: str, db: DeviceRegistryDB = Depends(
 @app.get("/stats", response_model=Dict[str, Any])
 async def get_stats(db: DeviceRegistryDB = Depends(get_db)):
     """Get registry statistics"""
-    ships = db.list_ships()
-    devices = db.list_devices()
+    ships = await db.run(db.list_ships)
+    devices = await db.run(db.list_devices)
     
     device_types = {}
     ship_device_counts = {}
@@ -461,6 +637,7 @@ async def get_stats(db: DeviceRegistryDB = Depends(get_db)):
         "total_devices": len(devices),
         "device_types": device_types,
         "ship_device_counts": ship_device_counts,
+        "cached_identifiers": len(db.mappings),
         "timestamp": datetime.utcnow()
     }
 
@@ -18,15 +18,20 @@ The service:
 import asyncio
 import logging
 import json
+import os
 import time
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 import uvicorn
 
 from nats.aio.client import Client as NATS
 
+from llm_client import LLMClient, LLMUnavailable
+from log_templates import mask, template_id
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -118,12 +123,310 @@ class ContextualAnomalyDetectors:
                 
         return 0.0
 
+def message_fingerprint(message: str) -> int:
+    """Template ID of a log message with its variable fields masked"""
+    return template_id(mask(message.strip()))
+
+class LLMAnalysisBatcher:
+    """Micro-batches events that share (ship_id, device_id, message fingerprint)
+
+    The first event of a group opens a ``window`` second batch; events with
+    the same key that arrive before it closes join it, and ``analyze_group``
+    is called once with all of them. Every member awaits the same result.
+    A batch is flushed early once it holds ``max_batch`` events.
+    """
+    
+    def __init__(self, analyze_group, window: float = 0.5, max_batch: int = 50):
+        self.analyze_group = analyze_group
+        self.window = window
+        self.max_batch = max_batch
+        self._groups = {}
+        self.stats = {"events": 0, "batches": 0, "largest_batch": 0}
+    
+    @staticmethod
+    def group_key(event_data):
+        return (
+            event_data.get('ship_id'),
+            event_data.get('device_id'),
+            message_fingerprint(event_data.get('log_message') or event_data.get('metric_name') or '')
+        )
+    
+    async def submit(self, event_data):
+        """Add an event to its group's batch and wait for the group result"""
+        self.stats["events"] += 1
+        loop = asyncio.get_running_loop()
+        key = self.group_key(event_data)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = {
+                "events": [],
+                "future": loop.create_future(),
+                "timer": loop.call_later(self.window, self._flush, key),
+            }
+        group["events"].append(event_data)
+        future = group["future"]
+        if len(group["events"]) >= self.max_batch:
+            self._flush(key)
+        return await asyncio.shield(future)
+    
+    def _flush(self, key):
+        group = self._groups.pop(key, None)
+        if group is None:
+            return
+        group["timer"].cancel()
+        self.stats["batches"] += 1
+        self.stats["largest_batch"] = max(self.stats["largest_batch"], len(group["events"]))
+        asyncio.ensure_future(self._run(group))
+    
+    async def _run(self, group):
+        future = group["future"]
+        try:
+            result = await self.analyze_group(group["events"])
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # members may all have gone; don't log it as unretrieved
+        else:
+            future.set_result(result)
+
+class _DeviceHistory:
+    """Minute buckets of one (ship, device) pair with running window totals"""
+    
+    __slots__ = ('buckets', 'minutes_1h', 'minutes_24h', 'totals_1h', 'totals_24h',
+                 'active_minutes_24h', 'events_1h', 'events_24h')
+    
+    def __init__(self):
+        self.buckets = {}            # minute -> {template_id: count}
+        self.minutes_1h = deque()    # bucket minutes still counted in the 1h totals
+        self.minutes_24h = deque()   # every live bucket minute, oldest first
+        self.totals_1h = {}
+        self.totals_24h = {}
+        self.active_minutes_24h = {}  # template_id -> minutes in the last 24h it occurred in
+        self.events_1h = 0
+        self.events_24h = 0
+    
+    def expire(self, minute):
+        """Drop buckets that have left the 1h / 24h windows ending at ``minute``"""
+        while self.minutes_1h and self.minutes_1h[0] <= minute - 60:
+            for tid, count in self.buckets[self.minutes_1h.popleft()].items():
+                self.totals_1h[tid] -= count
+                if not self.totals_1h[tid]:
+                    del self.totals_1h[tid]
+                self.events_1h -= count
+        while self.minutes_24h and self.minutes_24h[0] <= minute - 1440:
+            for tid, count in self.buckets.pop(self.minutes_24h.popleft()).items():
+                self.totals_24h[tid] -= count
+                self.active_minutes_24h[tid] -= 1
+                if not self.totals_24h[tid]:
+                    del self.totals_24h[tid]
+                    del self.active_minutes_24h[tid]
+                self.events_24h -= count
+    
+    def add(self, minute, tid, count=1):
+        bucket = self.buckets.get(minute)
+        if bucket is None:
+            bucket = self.buckets[minute] = {}
+            self.minutes_1h.append(minute)
+            self.minutes_24h.append(minute)
+        if tid not in bucket:
+            self.active_minutes_24h[tid] = self.active_minutes_24h.get(tid, 0) + 1
+        bucket[tid] = bucket.get(tid, 0) + count
+        self.totals_1h[tid] = self.totals_1h.get(tid, 0) + count
+        self.totals_24h[tid] = self.totals_24h.get(tid, 0) + count
+        self.events_1h += count
+        self.events_24h += count
+    
+    def recent(self, minute, tid, minutes):
+        return sum(self.buckets.get(m, {}).get(tid, 0) for m in range(minute - minutes + 1, minute + 1))
+
+class EventTimeIndex:
+    """In-memory per-ship/per-device index of anomalies over the last 24 hours
+
+    Each (ship_id, device_id) pair keeps sparse minute buckets of template ID
+    counts plus running 1h/24h totals that are adjusted as buckets age out,
+    so a lookup costs a few dict operations instead of a ClickHouse query.
+    A template is ``clustered`` when it already occurred ``cluster_threshold``
+    times in the last ``cluster_minutes``, ``recurring`` when it occurred in
+    at least ``recurring_minutes`` distinct minutes of the last 24h, and
+    ``isolated`` otherwise. At most ``max_devices`` pairs are kept (least
+    recently seen are dropped first).
+
+    Checkpoints are incremental: ``snapshot`` keeps plain-data copies of the
+    buckets and only refreshes devices touched since the previous snapshot,
+    and of those only the minutes that were still open then. Closed minutes
+    never change.
+    """
+    
+    def __init__(self, cluster_minutes: int = 10, cluster_threshold: int = 3,
+                 recurring_minutes: int = 3, max_devices: int = 50000, clock=time.time):
+        self.cluster_minutes = cluster_minutes
+        self.cluster_threshold = cluster_threshold
+        self.recurring_minutes = recurring_minutes
+        self.max_devices = max_devices
+        self._clock = clock
+        self._devices: 'OrderedDict[tuple, _DeviceHistory]' = OrderedDict()
+        self._ship_devices: Dict[str, set] = {}
+        self._copies: Dict[tuple, Dict[int, list]] = {}  # (ship, device) -> minute -> [(tid, count)]
+        self._touched: set = set()  # devices changed since the last snapshot
+        self._copied_minute: Optional[int] = None  # minute of the last snapshot
+        self.stats = {"events_indexed": 0, "devices_evicted": 0}
+    
+    def __len__(self):
+        return len(self._devices)
+    
+    def observe(self, ship_id: str, device_id: str, tid: int) -> Dict[str, Any]:
+        """Summarise the history of this event's template, then record the event"""
+        minute = int(self._clock() // 60)
+        key = (ship_id, device_id)
+        history = self._history(key, minute)
+        
+        similar_1h = history.totals_1h.get(tid, 0)
+        similar_24h = history.totals_24h.get(tid, 0)
+        if history.recent(minute, tid, self.cluster_minutes) >= self.cluster_threshold:
+            pattern = "clustered"
+        elif history.active_minutes_24h.get(tid, 0) >= self.recurring_minutes:
+            pattern = "recurring"
+        else:
+            pattern = "isolated_event"
+        summary = {
+            "temporal_pattern": pattern,
+            "similar_events_1h": similar_1h,
+            "similar_events_24h": similar_24h,
+            "device_events_1h": history.events_1h,
+            "device_events_24h": history.events_24h,
+            "related_devices": self._related_devices(ship_id, device_id, tid, minute),
+        }
+        
+        history.add(minute, tid)
+        self.stats["events_indexed"] += 1
+        return summary
+    
+    def _history(self, key, minute) -> _DeviceHistory:
+        self._touched.add(key)
+        history = self._devices.get(key)
+        if history is None:
+            history = self._devices[key] = _DeviceHistory()
+            self._ship_devices.setdefault(key[0], set()).add(key[1])
+            if len(self._devices) > self.max_devices:
+                self._drop(next(iter(self._devices)))
+                self.stats["devices_evicted"] += 1
+        else:
+            self._devices.move_to_end(key)
+            history.expire(minute)
+        return history
+    
+    def _drop(self, key):
+        del self._devices[key]
+        self._touched.add(key)
+        devices = self._ship_devices.get(key[0])
+        if devices is not None:
+            devices.discard(key[1])
+            if not devices:
+                del self._ship_devices[key[0]]
+    
+    def _related_devices(self, ship_id, device_id, tid, minute) -> List[str]:
+        """Other devices on the ship that reported the same template in the last hour"""
+        related = []
+        for other in list(self._ship_devices.get(ship_id, ())):
+            if other == device_id:
+                continue
+            history = self._devices[(ship_id, other)]
+            buckets = len(history.minutes_24h)
+            history.expire(minute)
+            if len(history.minutes_24h) != buckets:
+                self._touched.add((ship_id, other))
+            if not history.minutes_24h:
+                self._drop((ship_id, other))
+            elif history.totals_1h.get(tid):
+                related.append(other)
+        return sorted(related, key=str)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Plain-data copy of the buckets for checkpointing
+
+        The per-device bucket dicts are shared with the index and updated in
+        place by the next call, so write the snapshot out before taking another.
+        """
+        since = self._copied_minute
+        for key in self._touched:
+            history = self._devices.get(key)
+            copy = self._copies.get(key)
+            if history is None:
+                self._copies.pop(key, None)
+            elif copy is None or since is None:
+                self._copies[key] = {m: list(history.buckets[m].items()) for m in history.minutes_24h}
+            else:
+                while copy and next(iter(copy)) not in history.buckets:
+                    del copy[next(iter(copy))]  # aged out, always the oldest minutes
+                for m in history.minutes_24h:
+                    if m >= since:
+                        copy[m] = list(history.buckets[m].items())
+        self._touched.clear()
+        self._copied_minute = int(self._clock() // 60)
+        return {
+            "version": 1,
+            "devices": [[ship_id, device_id, self._copies[(ship_id, device_id)]]
+                        for ship_id, device_id in self._devices],
+        }
+    
+    def checkpoint(self, path: str, snapshot: Optional[Dict[str, Any]] = None):
+        """Atomically write a snapshot (taken now unless given) to ``path``"""
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f'{{"version":{snapshot["version"]},"devices":[')
+            for i, (ship_id, device_id, buckets) in enumerate(snapshot["devices"]):
+                if i:
+                    f.write(',')
+                f.write(json.dumps([ship_id, device_id, list(buckets.items())], separators=(',', ':')))
+            f.write(']}')
+        os.replace(tmp_path, path)
+    
+    def restore(self, snapshot: Dict[str, Any]):
+        """Load buckets from a snapshot, skipping those older than 24h"""
+        minute = int(self._clock() // 60)
+        self._copied_minute = None
+        for ship_id, device_id, buckets in snapshot.get("devices", []):
+            history = self._history((ship_id, device_id), minute)
+            for bucket_minute, counts in (buckets.items() if isinstance(buckets, dict) else buckets):
+                if bucket_minute > minute - 1440:
+                    for tid, count in counts:
+                        history.add(bucket_minute, tid, count)
+            history.expire(minute)
+            if not history.minutes_24h:
+                self._drop((ship_id, device_id))
+    
+    @classmethod
+    def from_checkpoint(cls, path: str, **kwargs) -> 'EventTimeIndex':
+        """Index restored from ``path``; empty if the file is missing or unreadable"""
+        index = cls(**kwargs)
+        try:
+            with open(path) as f:
+                index.restore(json.load(f))
+            logger.info(f"Restored event time index for {len(index)} devices from {path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable event index checkpoint {path}: {e}")
+        return index
+
 class EnrichedAnomalyDetectionService:
     """Enhanced anomaly detection service with Level 1 enrichment support"""
     
     def __init__(self):
         self.nats_client = None
         self.detectors = ContextualAnomalyDetectors()
+        self.llm_client = LLMClient.from_env()
+        self.llm_batcher = LLMAnalysisBatcher(
+            self._llm_analyze_group,
+            window=float(os.getenv('LLM_BATCH_WINDOW_SECONDS', '0.5')),
+            max_batch=int(os.getenv('LLM_BATCH_MAX_EVENTS', '50'))
+        )
+        self.max_inflight_events = int(os.getenv('MAX_INFLIGHT_EVENTS', '256'))
+        self.event_index_path = os.getenv('EVENT_INDEX_PATH', '/app/data/event_index.json')
+        self.event_index = EventTimeIndex.from_checkpoint(self.event_index_path)
+        self._inflight_events = None
+        self._checkpoint_lock = None
         self.health_status = {
             "healthy": False,
             "nats_connected": False,
@@ -151,8 +454,25 @@ class EnrichedAnomalyDetectionService:
             return {
                 "events_processed": self.health_status["enriched_events_processed"],
                 "anomalies_detected": self.health_status["anomalies_detected"],
-                "detection_rate": self.health_status["anomalies_detected"] / max(self.health_status["enriched_events_processed"], 1)
+                "detection_rate": self.health_status["anomalies_detected"] / max(self.health_status["enriched_events_processed"], 1),
+                "llm_client": self.llm_client.snapshot(),
+                "llm_batching": self.llm_batcher.stats,
+                "event_index": {**self.event_index.stats, "devices": len(self.event_index)}
             }
+
+        @self.app.post("/api/generate")
+        async def generate(request: Dict[str, Any]):
+            """Ollama-compatible generate endpoint backed by the shared LLM client
+
+            Lets the Benthos LLM branch share this service's cache, in-flight
+            coalescing and circuit breaker instead of calling Ollama directly.
+            Returns 503 when the LLM is unavailable so the caller falls back.
+            """
+            try:
+                response = await self.llm_client.generate(request.get('prompt', ''), model=request.get('model'))
+            except LLMUnavailable as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            return {"model": request.get('model') or self.llm_client.model, "response": response, "done": True}
     
     async def connect_nats(self):
         """Connect to NATS and subscribe to enriched data"""
@@ -164,7 +484,7 @@ class EnrichedAnomalyDetectionService:
             # Subscribe to enriched anomaly events from benthos enrichment
             await self.nats_client.subscribe(
                 "anomaly.detected.enriched",
-                cb=self._handle_enriched_event,
+                cb=self._dispatch_enriched_event,
                 queue="enhanced_anomaly_detection"
             )
             
@@ -173,6 +493,19 @@ class EnrichedAnomalyDetectionService:
             logger.error(f"Failed to connect to NATS: {e}")
             self.health_status["nats_connected"] = False
     
+    async def _dispatch_enriched_event(self, msg):
+        """Handle each event in its own task so events can share an LLM batch
+
+        NATS runs a subscription's callbacks one at a time; waiting here for
+        a free slot once ``max_inflight_events`` are being processed pushes
+        back on the subscription instead of queueing unbounded tasks.
+        """
+        if self._inflight_events is None:
+            self._inflight_events = asyncio.Semaphore(self.max_inflight_events)
+        await self._inflight_events.acquire()
+        task = asyncio.ensure_future(self._handle_enriched_event(msg))
+        task.add_done_callback(lambda _: self._inflight_events.release())
+    
     async def _handle_enriched_event(self, msg):
         """Process enriched anomaly events for context-aware anomaly detection with LLM integration"""
         try:
@@ -236,72 +569,66 @@ class EnrichedAnomalyDetectionService:
     async def _perform_enhanced_analysis_with_llm(self, event_data):
         """Perform advanced anomaly analysis using LLM/Ollama for context and accuracy"""
         try:
-            # Prepare prompt for LLM analysis
-            analysis_prompt = f"""
-            Analyze this maritime anomaly event and provide enhanced context:
-            
-            Anomaly Details:
-            - Tracking ID: {event_data.get('tracking_id')}
-            - Ship: {event_data.get('ship_id')}
-            - Original Score: {event_data.get('anomaly_score')}
-            - Log Message: {event_data.get('log_message', 'N/A')}
-            
-            Enrichment Context:
-            - Maritime Status: {event_data.get('enrichment_context', {}).get('maritime_context', {}).get('operational_status')}
-            - Device Context: {event_data.get('enrichment_context', {}).get('device_context', {})}
-            - AI Analysis: {event_data.get('enrichment_context', {}).get('ai_analysis', {})}
-            
-            Provide:
-            1. Enhanced anomaly score (0.0-1.0)
-            2. Risk assessment (low/medium/high/critical)
-            3. System impact analysis
-            4. Operational recommendations
-            5. Urgency level
-            """
-            
-            # Try LLM/Ollama integration
-            try:
-                import requests
-                
-                llm_response = requests.post(
-                    "http://ollama:11434/api/generate",
-                    json={
-                        "model": "llama2",
-                        "prompt": analysis_prompt,
-                        "stream": False
-                    },
-                    timeout=10
-                )
-                
-                if llm_response.status_code == 200:
-                    llm_data = llm_response.json()
-                    analysis_text = llm_data.get('response', '')
-                    
-                    # Parse LLM response (simplified parsing)
-                    enhanced_score = self._extract_score_from_llm_response(analysis_text, event_data.get('anomaly_score', 0.5))
-                    risk_level = self._extract_risk_from_llm_response(analysis_text)
-                    recommendations = self._extract_recommendations_from_llm_response(analysis_text)
-                    
-                    return {
-                        "llm_analysis": analysis_text,
-                        "enhanced_score": enhanced_score,
-                        "risk_assessment": risk_level,
-                        "recommendations": recommendations,
-                        "system_impact": self._assess_system_impact(event_data, enhanced_score),
-                        "urgency": self._determine_urgency(enhanced_score, risk_level),
-                        "confidence": 0.9,
-                        "analysis_method": "llm_enhanced"
-                    }
-                    
-            except Exception as llm_error:
-                logger.warning(f"LLM analysis failed, using rule-based fallback: {llm_error}")
-            
-            # Fallback to enhanced rule-based analysis
+            analysis_text = await self.llm_batcher.submit(event_data)
+        except LLMUnavailable as llm_error:
+            logger.warning(f"LLM analysis unavailable, using rule-based fallback: {llm_error}")
             return self._rule_based_enhanced_analysis(event_data)
-            
         except Exception as e:
             logger.error(f"Enhanced analysis error: {e}")
             return self._rule_based_enhanced_analysis(event_data)
+        
+        # Parse LLM response (simplified parsing). Events batched together share
+        # the response; each score is scaled from the event's own original score.
+        enhanced_score = self._extract_score_from_llm_response(analysis_text, event_data.get('anomaly_score', 0.5))
+        risk_level = self._extract_risk_from_llm_response(analysis_text)
+        recommendations = self._extract_recommendations_from_llm_response(analysis_text)
+        
+        return {
+            "llm_analysis": analysis_text,
+            "enhanced_score": enhanced_score,
+            "risk_assessment": risk_level,
+            "recommendations": recommendations,
+            "system_impact": self._assess_system_impact(event_data, enhanced_score),
+            "urgency": self._determine_urgency(enhanced_score, risk_level),
+            "confidence": 0.9,
+            "analysis_method": "llm_enhanced"
+        }
+    
+    async def _llm_analyze_group(self, events):
+        """Send one LLM prompt for a micro-batch of similar events and return the response text"""
+        event_data = events[0]
+        scores = [e.get('anomaly_score', 0.5) for e in events]
+        maritime_status = event_data.get('enrichment_context', {}).get('maritime_context', {}).get('operational_status')
+        
+        # Per-event IDs are left out of the prompt, and the cache key ignores
+        # the batch size and scores, so the same situation on the same device
+        # keeps hitting the LLM client's cache.
+        analysis_prompt = f"""
+        Analyze this maritime anomaly event and provide enhanced context:
+        
+        Anomaly Details:
+        - Ship: {event_data.get('ship_id')}
+        - Device: {event_data.get('device_id', 'N/A')}
+        - Occurrences in this burst: {len(events)}
+        - Original Score: {max(scores)} (range {min(scores)}-{max(scores)})
+        - Log Message: {event_data.get('log_message', 'N/A')}
+        
+        Enrichment Context:
+        - Maritime Status: {maritime_status}
+        - Device Context: {event_data.get('enrichment_context', {}).get('device_context', {})}
+        - AI Analysis: {event_data.get('enrichment_context', {}).get('ai_analysis', {})}
+        
+        Provide:
+        1. Enhanced anomaly score (0.0-1.0)
+        2. Risk assessment (low/medium/high/critical)
+        3. System impact analysis
+        4. Operational recommendations
+        5. Urgency level
+        """
+        
+        ship_id, device_id, fingerprint = LLMAnalysisBatcher.group_key(event_data)
+        cache_key = f"{ship_id}|{device_id}|{fingerprint:016x}|{maritime_status}"
+        return await self.llm_client.generate(analysis_prompt, cache_key=cache_key)
     
     def _rule_based_enhanced_analysis(self, event_data):
         """Fallback enhanced analysis using sophisticated rules"""
@@ -344,22 +671,27 @@ class EnrichedAnomalyDetectionService:
         }
     
     async def _group_anomalies_with_context(self, event_data):
-        """Group and aggregate anomalies by time/source/history with LLM context"""
+        """Group and aggregate anomalies by time/source/history using the in-memory event index"""
         try:
             ship_id = event_data.get('ship_id')
             device_id = event_data.get('device_id')
+            tid = message_fingerprint(event_data.get('log_message') or event_data.get('metric_name') or '')
+            history = self.event_index.observe(ship_id, device_id, tid)
             
-            # Simplified grouping analysis (would integrate with time-series DB in production)
             grouping_data = {
-                "temporal_pattern": "isolated_event",  # Could be: recurring, clustered, isolated
+                "temporal_pattern": history["temporal_pattern"],  # recurring, clustered or isolated_event
                 "source_correlation": {
                     "ship_id": ship_id,
                     "device_id": device_id,
-                    "related_devices": []  # Would query device registry for related systems
+                    "related_devices": history["related_devices"]
                 },
                 "historical_patterns": {
-                    "similar_events_24h": 0,  # Would query ClickHouse
-                    "pattern_type": "new_anomaly"
+                    "similar_events_1h": history["similar_events_1h"],
+                    "similar_events_24h": history["similar_events_24h"],
+                    "device_events_1h": history["device_events_1h"],
+                    "device_events_24h": history["device_events_24h"],
+                    "message_template_id": f"{tid:016x}",
+                    "pattern_type": "known_anomaly" if history["similar_events_24h"] else "new_anomaly"
                 },
                 "aggregation_confidence": 0.8
             }
@@ -370,6 +702,23 @@ class EnrichedAnomalyDetectionService:
             logger.error(f"Grouping analysis error: {e}")
             return {"error": "grouping_failed"}
     
+    async def checkpoint_event_index(self):
+        """Write the event index to disk without blocking the event loop
+
+        Only buckets changed since the last checkpoint are copied on the loop;
+        serialising and writing the file run in the executor. The lock keeps
+        the next snapshot from updating those copies while a write reads them.
+        """
+        if self._checkpoint_lock is None:
+            self._checkpoint_lock = asyncio.Lock()
+        async with self._checkpoint_lock:
+            try:
+                snapshot = self.event_index.snapshot()
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.event_index.checkpoint, self.event_index_path, snapshot)
+            except Exception as e:
+                logger.warning(f"Failed to checkpoint event index to {self.event_index_path}: {e}")
+    
     def _extract_score_from_llm_response(self, response_text, original_score):
         """Extract enhanced score from LLM response"""
         # Simplified extraction (would use more sophisticated NLP in production)
@@ -635,6 +984,7 @@ class EnrichedAnomalyDetectionService:
                 # Keep service running
                 while True:
                     await asyncio.sleep(60)  # Heartbeat every minute
+                    await self.checkpoint_event_index()
                     logger.debug(f"Service heartbeat - Events: {self.health_status['enriched_events_processed']}, "
                                f"Anomalies: {self.health_status['anomalies_detected']}")
             else:
@@ -654,5 +1004,11 @@ async def startup_event():
     """Start the anomaly detection service"""
     asyncio.create_task(service.start_service())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Checkpoint the event index and release the LLM client's HTTP connections"""
+    await service.checkpoint_event_index()
+    await service.llm_client.close()
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=9082)
\ No newline at end of file
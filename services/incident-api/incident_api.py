@@ -20,17 +20,23 @@ import logging
 import json
 import uuid
 import os
+import time
+import base64
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 import uvicorn
 import nats
 from clickhouse_driver import Client as ClickHouseClient
-import requests
+from clickhouse_driver.errors import ServerException, TypeMismatchError
+
+from log_templates import LogTemplateMiner
+from registry_client import DeviceRegistryClient
 
 # Configure logging
 logging.basicConfig(
@@ -79,6 +85,263 @@ class IncidentSummary(BaseModel):
     critical_incidents: int
     recent_incidents: List[Incident]
 
+INCIDENT_COLUMNS = (
+    'incident_id', 'event_type', 'incident_type', 'incident_severity',
+    'ship_id', 'service', 'status', 'acknowledged', 'created_at', 'updated_at',
+    'correlation_id', 'processing_timestamp', 'metric_name', 'metric_value',
+    'anomaly_score', 'detector_name', 'correlated_events', 'timeline',
+    'suggested_runbooks', 'metadata', 'log_template_id', 'log_template'
+)
+
+# Columns returned by the read endpoints, and the JSON-encoded ones among them
+INCIDENT_SELECT_COLUMNS = (
+    'incident_id', 'event_type', 'incident_type', 'incident_severity',
+    'ship_id', 'service', 'status', 'acknowledged', 'created_at', 'updated_at',
+    'correlation_id', 'metric_name', 'metric_value', 'anomaly_score',
+    'detector_name', 'correlated_events', 'timeline', 'suggested_runbooks', 'metadata',
+    'log_template_id', 'log_template'
+)
+INCIDENT_JSON_COLUMNS = {'correlated_events': list, 'timeline': list, 'metadata': dict}
+
+def encode_cursor(incident: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just past the given incident"""
+    created_at = incident['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, incident['incident_id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        created_at, incident_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(incident_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# ClickHouse error codes for values the server refuses to store (parse, type
+# and range errors); other server errors are not caused by individual rows
+ROW_DATA_ERROR_CODES = {6, 26, 27, 38, 41, 53, 69, 70, 72, 117, 321}
+
+class IncidentBatchWriter:
+    """Buffered, columnar ClickHouse writer for incident rows
+
+    Rows are queued on a bounded asyncio queue and flushed as one columnar
+    INSERT once ``batch_size`` rows are waiting or ``flush_interval`` seconds
+    have passed. ``submit`` blocks while the queue is full, which pushes back
+    on the NATS subscription instead of growing memory. Inserts run on a
+    dedicated thread with their own connection so the event loop never blocks.
+
+    Connection failures retry the whole batch. A batch rejected because of
+    its data is split in halves until the offending rows are isolated, so
+    only those rows are dropped.
+    """
+    
+    def __init__(self, client_factory, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_queue: int = 10000, max_retries: int = 3):
+        self.client_factory = client_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="incident-writer")
+        self._client = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[tuple] = []  # rows taken off the queue but not yet flushing
+        self._inflight: Optional[asyncio.Future] = None
+        self.stats = {
+            "rows_written": 0,
+            "rows_dropped": 0,
+            "rows_rejected": 0,
+            "batches_written": 0,
+            "flush_failures": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "avg_flush_seconds": 0.0,
+            "last_batch_size": 0
+        }
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+    
+    async def submit(self, row: tuple):
+        """Queue one incident row, waiting if the buffer is full"""
+        self.start()
+        await self.queue.put(row)
+    
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, "queue_depth": self.queue.qsize(), "queue_capacity": self.queue.maxsize}
+    
+    async def close(self):
+        """Flush everything still buffered and stop the writer"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight is not None:
+            await self._inflight
+            self._inflight = None
+        pending, self._pending = self._pending, []
+        await self._flush(pending)
+        while not self.queue.empty():
+            await self._flush(self._drain(self.batch_size))
+        self._executor.shutdown(wait=True)
+    
+    def _drain(self, limit: int) -> List[tuple]:
+        rows = []
+        while len(rows) < limit and not self.queue.empty():
+            rows.append(self.queue.get_nowait())
+        return rows
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for the first row, then collect until the batch is full or the interval ends
+            batch = self._pending = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                batch.extend(self._drain(self.batch_size - len(batch)))
+                if len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Shielded so close() can cancel the loop without abandoning a half-done insert
+            self._inflight = asyncio.ensure_future(self._flush(batch))
+            self._pending = []
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+    
+    def _insert(self, columns: List[list]):
+        if self._client is None:
+            self._client = self.client_factory()
+        self._client.execute(
+            f"INSERT INTO logs.incidents ({', '.join(INCIDENT_COLUMNS)}) VALUES",
+            columns,
+            columnar=True
+        )
+    
+    @staticmethod
+    def _is_row_error(error: Exception) -> bool:
+        """True when the failure was caused by the rows themselves"""
+        if isinstance(error, ServerException):
+            return error.code in ROW_DATA_ERROR_CODES
+        return isinstance(error, (TypeMismatchError, TypeError, ValueError, OverflowError))
+    
+    async def _insert_isolating(self, rows: List[tuple]) -> int:
+        """Insert a rejected batch by halves, dropping only rows that fail alone
+
+        Returns the number of rows written.
+        """
+        loop = asyncio.get_running_loop()
+        middle = len(rows) // 2
+        written = 0
+        for part in (rows[:middle], rows[middle:]):
+            try:
+                await loop.run_in_executor(self._executor, self._insert, [list(column) for column in zip(*part)])
+                written += len(part)
+            except Exception as e:
+                self._client = None
+                if self._is_row_error(e) and len(part) > 1:
+                    written += await self._insert_isolating(part)
+                elif self._is_row_error(e):
+                    self.stats["rows_rejected"] += 1
+                    logger.error(f"Dropping incident row rejected by ClickHouse ({part[0][0]}): {e}")
+                else:
+                    logger.error(f"Insert failed while isolating rejected incident rows, dropping {len(part)}: {e}")
+        return written
+    
+    async def _flush(self, batch: List[tuple]):
+        if not batch:
+            return
+        columns = [list(column) for column in zip(*batch)]
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        written = len(batch)
+        
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await loop.run_in_executor(self._executor, self._insert, columns)
+                break
+            except Exception as e:
+                self.stats["flush_failures"] += 1
+                self._client = None  # reconnect on the next attempt
+                if self._is_row_error(e):
+                    # Retrying the same rows cannot succeed; find the bad ones instead
+                    logger.error(f"Incident batch of {len(batch)} rows rejected, isolating bad rows: {e}")
+                    written = await self._insert_isolating(batch) if len(batch) > 1 else 0
+                    if len(batch) == 1:
+                        self.stats["rows_rejected"] += 1
+                    self.stats["rows_dropped"] += len(batch) - written
+                    if not written:
+                        return
+                    break
+                logger.error(f"Incident batch insert failed (attempt {attempt}/{self.max_retries}, {len(batch)} rows): {e}")
+                if attempt == self.max_retries:
+                    self.stats["rows_dropped"] += len(batch)
+                    return
+                await asyncio.sleep(min(2 ** attempt * 0.1, 5.0))
+        
+        elapsed = time.monotonic() - started
+        stats = self.stats
+        stats["rows_written"] += written
+        stats["batches_written"] += 1
+        stats["last_batch_size"] = len(batch)
+        stats["last_flush_seconds"] = elapsed
+        stats["max_flush_seconds"] = max(stats["max_flush_seconds"], elapsed)
+        stats["avg_flush_seconds"] += (elapsed - stats["avg_flush_seconds"]) / stats["batches_written"]
+        logger.info(f"Flushed {written} incidents to ClickHouse in {elapsed * 1000:.1f}ms")
+
+class SummaryCache:
+    """Single-value TTL cache with stampede protection
+
+    The value is recomputed at most once per ``ttl`` seconds; callers that
+    arrive while a reload is running await the same in-flight load instead
+    of issuing their own query. If a reload fails the previous value keeps
+    being served, and the error is only raised when nothing is cached yet.
+    """
+
+    def __init__(self, loader: Callable[[], Any], ttl: float = 5.0):
+        self.loader = loader  # blocking callable, run on the default executor
+        self.ttl = ttl
+        self._value: Any = None
+        self._loaded_at: Optional[float] = None
+        self._inflight: Optional[asyncio.Future] = None
+        self.stats = {"hits": 0, "misses": 0, "load_failures": 0}
+
+    async def get(self) -> Any:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            self.stats["hits"] += 1
+            return self._value
+        self.stats["misses"] += 1
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load())
+        try:
+            return await asyncio.shield(self._inflight)
+        except Exception:
+            if self._loaded_at is None:
+                raise
+            return self._value
+
+    async def _load(self) -> Any:
+        try:
+            value = await asyncio.get_running_loop().run_in_executor(None, self.loader)
+            self._value, self._loaded_at = value, time.monotonic()
+            return value
+        except Exception:
+            self.stats["load_failures"] += 1
+            raise
+        finally:
+            self._inflight = None
+
 class IncidentAPIService:
     """Main incident API service"""
     
@@ -92,12 +355,22 @@ class IncidentAPIService:
         
         logger.info(f"Connecting to ClickHouse at {ch_host}:{ch_port} with user: {ch_user}")
         
-        self.clickhouse_client = ClickHouseClient(
-            host=ch_host,
-            port=ch_port,
-            user=ch_user,
-            password=ch_password,
-            database=ch_database
+        clickhouse_settings = dict(host=ch_host, port=ch_port, user=ch_user, password=ch_password, database=ch_database)
+        self.clickhouse_client = ClickHouseClient(**clickhouse_settings)
+        # clickhouse_driver clients are not thread-safe; the summary cache loads on an
+        # executor thread, so it gets a connection of its own
+        self.summary_client = ClickHouseClient(**clickhouse_settings)
+        self.incident_writer = IncidentBatchWriter(
+            lambda: ClickHouseClient(**clickhouse_settings),
+            batch_size=int(os.getenv('INCIDENT_BATCH_SIZE', '500')),
+            flush_interval=float(os.getenv('INCIDENT_FLUSH_INTERVAL_SECONDS', '1.0')),
+            max_queue=int(os.getenv('INCIDENT_QUEUE_SIZE', '10000'))
+        )
+        self.log_templates = LogTemplateMiner()
+        self.registry_client = DeviceRegistryClient.from_env()
+        self.summary_cache = SummaryCache(
+            self.get_summary,
+            ttl=float(os.getenv('INCIDENT_SUMMARY_TTL_SECONDS', '5'))
         )
         self.nats_client = None
         self.health_status = {"healthy": False, "clickhouse_connected": False, "nats_connected": False}
@@ -115,12 +388,14 @@ class IncidentAPIService:
             async def incident_handler(msg):
                 try:
                     incident_data = json.loads(msg.data.decode())
+                    # Blocks while the writer queue is full, applying backpressure to this subscription
                     await self.store_incident(incident_data)
-                    logger.info(f"Stored incident: {incident_data.get('incident_id', 'unknown')}")
+                    logger.debug(f"Queued incident: {incident_data.get('incident_id', 'unknown')}")
                 except Exception as e:
                     logger.error(f"Error processing incident event: {e}")
             
             await self.nats_client.subscribe("incidents.created", cb=incident_handler)
+            await self.registry_client.subscribe_invalidations(self.nats_client)
             logger.info("Connected to NATS and subscribed to incidents.created")
             self.health_status["nats_connected"] = True
                 
@@ -155,37 +430,31 @@ class IncidentAPIService:
         elif incident_data.get('metadata', {}).get('source_host'):
             hostname = incident_data['metadata']['source_host']
         
-        logger.info(f"🔍 HOSTNAME EXTRACTION - Found hostname: {hostname} from incident data")
+        logger.debug(f"🔍 HOSTNAME EXTRACTION - Found hostname: {hostname} from incident data")
         
         if hostname:
-            try:
-                # Call device registry service
-                response = requests.get(f"http://device-registry:8080/lookup/{hostname}", timeout=5)
-                if response.status_code == 200:
-                    registry_data = response.json()
-                    if registry_data.get('success') and registry_data.get('mapping', {}).get('ship_id'):
-                        resolved_ship_id = registry_data['mapping']['ship_id']
-                        logger.info(f"Resolved ship_id from device registry: {hostname} -> {resolved_ship_id}")
-                        return resolved_ship_id
-                else:
-                    logger.debug(f"Device registry lookup failed for hostname {hostname}: {response.status_code}")
-            except Exception as e:
-                logger.debug(f"Device registry lookup error for {hostname}: {e}")
+            # Cached, non-blocking lookup against device-registry:8080 (or DEVICE_REGISTRY_URL),
+            # shared with the other services (see services/shared/registry_client.py)
+            mapping = await self.registry_client.lookup_hostname(hostname)
+            if mapping and mapping.get('ship_id'):
+                logger.debug(f"Resolved ship_id from device registry: {hostname} -> {mapping['ship_id']}")
+                return mapping['ship_id']
+            logger.debug(f"Device registry has no mapping for hostname {hostname}")
         
         # If device registry lookup failed, check if we have a valid ship_id already
         ship_id = incident_data.get('ship_id')
         if ship_id and ship_id != "" and not ship_id.startswith("unknown"):
-            logger.info(f"Using existing ship_id (device registry lookup failed): {ship_id}")
+            logger.debug(f"Using existing ship_id (device registry lookup failed): {ship_id}")
             return ship_id
         
         # Fallback to hostname-based derivation (consistent with Benthos)
         if hostname:
             if "-" in hostname:
                 derived_ship_id = hostname.split("-")[0] + "-ship"
-                logger.info(f"Derived ship_id from hostname: {hostname} -> {derived_ship_id}")
+                logger.debug(f"Derived ship_id from hostname: {hostname} -> {derived_ship_id}")
                 return derived_ship_id
             else:
-                logger.info(f"Using hostname as ship_id: {hostname}")
+                logger.debug(f"Using hostname as ship_id: {hostname}")
                 return hostname
         
         # Ultimate fallback
@@ -193,34 +462,34 @@ class IncidentAPIService:
         return "unknown-ship"
     
     async def store_incident(self, incident_data: Dict[str, Any]):
-        """Store incident in ClickHouse with enhanced metadata handling"""
+        """Normalise an incident and queue it for the batched ClickHouse writer"""
         try:
             # CRITICAL DEBUG: Log raw incident data for tracing missing fields
-            logger.info(f"🔍 INCIDENT DATA TRACE - Raw input data:")
-            logger.info(f"  Original keys: {list(incident_data.keys())}")
-            logger.info(f"  ship_id from input: {incident_data.get('ship_id', 'NOT_PROVIDED')}")
-            logger.info(f"  host from input: {incident_data.get('host', 'NOT_PROVIDED')}")
-            logger.info(f"  hostname from input: {incident_data.get('hostname', 'NOT_PROVIDED')}")
-            logger.info(f"  service from input: {incident_data.get('service', 'NOT_PROVIDED')}")
-            logger.info(f"  metric_name from input: {incident_data.get('metric_name', 'NOT_PROVIDED')}")
-            logger.info(f"  metric_value from input: {incident_data.get('metric_value', 'NOT_PROVIDED')}")
-            logger.info(f"  labels from input: {incident_data.get('labels', 'NOT_PROVIDED')}")
+            logger.debug(f"🔍 INCIDENT DATA TRACE - Raw input data:")
+            logger.debug(f"  Original keys: {list(incident_data.keys())}")
+            logger.debug(f"  ship_id from input: {incident_data.get('ship_id', 'NOT_PROVIDED')}")
+            logger.debug(f"  host from input: {incident_data.get('host', 'NOT_PROVIDED')}")
+            logger.debug(f"  hostname from input: {incident_data.get('hostname', 'NOT_PROVIDED')}")
+            logger.debug(f"  service from input: {incident_data.get('service', 'NOT_PROVIDED')}")
+            logger.debug(f"  metric_name from input: {incident_data.get('metric_name', 'NOT_PROVIDED')}")
+            logger.debug(f"  metric_value from input: {incident_data.get('metric_value', 'NOT_PROVIDED')}")
+            logger.debug(f"  labels from input: {incident_data.get('labels', 'NOT_PROVIDED')}")
             if 'metadata' in incident_data and incident_data['metadata']:
                 metadata = incident_data['metadata']
                 if isinstance(metadata, dict):
-                    logger.info(f"  metadata keys: {list(metadata.keys())}")
+                    logger.debug(f"  metadata keys: {list(metadata.keys())}")
                     # Log key metadata values for debugging
                     for key in ['host', 'hostname', 'source_host', 'service', 'application', 'metric_name', 'metric_value']:
                         if key in metadata:
-                            logger.info(f"    metadata.{key}: {metadata[key]}")
+                            logger.debug(f"    metadata.{key}: {metadata[key]}")
                 else:
-                    logger.info(f"  metadata is not dict: {type(metadata)}")
+                    logger.debug(f"  metadata is not dict: {type(metadata)}")
             else:
-                logger.info(f"  metadata: NOT_PROVIDED")
+                logger.debug(f"  metadata: NOT_PROVIDED")
             
             # Resolve ship_id using device registry integration
             resolved_ship_id = await self.resolve_ship_id(incident_data)
-            logger.info(f"🔍 SHIP_ID RESOLUTION - Input: {incident_data.get('ship_id', 'None')}, Resolved: {resolved_ship_id}")
+            logger.debug(f"🔍 SHIP_ID RESOLUTION - Input: {incident_data.get('ship_id', 'None')}, Resolved: {resolved_ship_id}")
             
             # Convert timeline and correlated_events to JSON strings
             timeline_json = json.dumps(incident_data.get('timeline', []))
@@ -229,7 +498,7 @@ class IncidentAPIService:
             
             # CRITICAL FIX: Enhanced metric value extraction and validation
             original_metric_value = incident_data.get('metric_value', 0.0)
-            logger.info(f"🔍 METRIC VALUE - Original: {original_metric_value} (type: {type(original_metric_value)})")
+            logger.debug(f"🔍 METRIC VALUE - Original: {original_metric_value} (type: {type(original_metric_value)})")
             
             metric_value = original_metric_value
             
@@ -240,7 +509,7 @@ class IncidentAPIService:
                 if isinstance(metadata, dict) and metadata.get('metric_value'):
                     try:
                         metric_value = float(metadata['metric_value'])
-                        logger.info(f"🔍 METRIC VALUE - Found in metadata: {metric_value}")
+                        logger.debug(f"🔍 METRIC VALUE - Found in metadata: {metric_value}")
                     except (ValueError, TypeError):
                         pass
                 
@@ -253,7 +522,7 @@ class IncidentAPIService:
                         if match:
                             try:
                                 metric_value = float(match.group(1))
-                                logger.info(f"🔍 METRIC VALUE - Extracted from message: {metric_value}")
+                                logger.debug(f"🔍 METRIC VALUE - Extracted from message: {metric_value}")
                             except ValueError:
                                 pass
                     # Look for other numeric patterns in messages
@@ -272,7 +541,7 @@ class IncidentAPIService:
                             if match and metric_value == 0:
                                 try:
                                     metric_value = float(match.group(1))
-                                    logger.info(f"🔍 METRIC VALUE - Extracted from message pattern: {metric_value}")
+                                    logger.debug(f"🔍 METRIC VALUE - Extracted from message pattern: {metric_value}")
                                     break
                                 except ValueError:
                                     continue
@@ -281,7 +550,7 @@ class IncidentAPIService:
                 if not isinstance(metric_value, (int, float)):
                     try:
                         metric_value = float(metric_value) if metric_value else 0.0
-                        logger.info(f"🔍 METRIC VALUE - Converted to float: {metric_value}")
+                        logger.debug(f"🔍 METRIC VALUE - Converted to float: {metric_value}")
                     except (ValueError, TypeError):
                         metric_value = 0.0
                         logger.warning(f"🔍 METRIC VALUE - Could not parse, using 0.0")
@@ -290,7 +559,7 @@ class IncidentAPIService:
             if not isinstance(anomaly_score, (int, float)):
                 try:
                     anomaly_score = float(anomaly_score) if anomaly_score else 0.0
-                    logger.info(f"🔍 ANOMALY SCORE - Converted to float: {anomaly_score}")
+                    logger.debug(f"🔍 ANOMALY SCORE - Converted to float: {anomaly_score}")
                 except (ValueError, TypeError):
                     anomaly_score = 0.0
                     logger.warning(f"🔍 ANOMALY SCORE - Could not parse, using 0.0")
@@ -305,20 +574,20 @@ class IncidentAPIService:
                 if isinstance(metadata, dict):
                     if metadata.get('service'):
                         service_name = metadata['service']
-                        logger.info(f"🔍 SERVICE - Found in metadata: {service_name}")
+                        logger.debug(f"🔍 SERVICE - Found in metadata: {service_name}")
                     elif metadata.get('application'):
                         service_name = metadata['application']
-                        logger.info(f"🔍 SERVICE - Found as application in metadata: {service_name}")
+                        logger.debug(f"🔍 SERVICE - Found as application in metadata: {service_name}")
                 
                 # Check labels for service/job information  
                 labels = incident_data.get('labels', {})
                 if isinstance(labels, dict) and (not service_name or service_name == 'unknown_service'):
                     if labels.get('job'):
                         service_name = labels['job']
-                        logger.info(f"🔍 SERVICE - Found as job in labels: {service_name}")
+                        logger.debug(f"🔍 SERVICE - Found as job in labels: {service_name}")
                     elif labels.get('service'):
                         service_name = labels['service']
-                        logger.info(f"🔍 SERVICE - Found in labels: {service_name}")
+                        logger.debug(f"🔍 SERVICE - Found in labels: {service_name}")
                 
                 # Try to extract from detector name or source
                 if not service_name or service_name == 'unknown_service':
@@ -334,23 +603,23 @@ class IncidentAPIService:
             if not service_name or service_name == '':
                 service_name = 'unknown_service'
             
-            logger.info(f"🔍 SERVICE RESOLUTION - Input: {incident_data.get('service', 'None')}, Final: {service_name}")
+            logger.debug(f"🔍 SERVICE RESOLUTION - Input: {incident_data.get('service', 'None')}, Final: {service_name}")
                 
             # CRITICAL FIX: Better incident type mapping
             incident_type = incident_data.get('incident_type', 'single_anomaly')
             if not incident_type or incident_type == '':
                 incident_type = 'single_anomaly'
-            logger.info(f"🔍 INCIDENT TYPE - Input: {incident_data.get('incident_type', 'None')}, Final: {incident_type}")
+            logger.debug(f"🔍 INCIDENT TYPE - Input: {incident_data.get('incident_type', 'None')}, Final: {incident_type}")
                 
             # CRITICAL FIX: Proper severity handling
             incident_severity = incident_data.get('incident_severity', 'medium')
             if incident_severity in ['info', 'debug']:
                 incident_severity = 'low'  # Map info/debug to low severity
-            logger.info(f"🔍 SEVERITY MAPPING - Input: {incident_data.get('incident_severity', 'None')}, Final: {incident_severity}")
+            logger.debug(f"🔍 SEVERITY MAPPING - Input: {incident_data.get('incident_severity', 'None')}, Final: {incident_severity}")
                 
             # CRITICAL DEBUG: Enhanced metric name extraction process
             original_metric_name = incident_data.get('metric_name', 'unknown_metric')
-            logger.info(f"🔍 METRIC NAME EXTRACTION - Input: {original_metric_name}")
+            logger.debug(f"🔍 METRIC NAME EXTRACTION - Input: {original_metric_name}")
             
             # Try to extract metric name from different possible locations
             extracted_metric_name = original_metric_name
@@ -359,14 +628,14 @@ class IncidentAPIService:
                 metadata = incident_data.get('metadata', {})
                 if isinstance(metadata, dict) and metadata.get('metric_name'):
                     extracted_metric_name = metadata['metric_name']
-                    logger.info(f"🔍 METRIC NAME - Found in metadata: {extracted_metric_name}")
+                    logger.debug(f"🔍 METRIC NAME - Found in metadata: {extracted_metric_name}")
                 
                 # Try extracting from labels
                 if extracted_metric_name == 'unknown_metric':
                     labels = incident_data.get('labels', {})
                     if isinstance(labels, dict) and labels.get('metric_name'):
                         extracted_metric_name = labels['metric_name']
-                        logger.info(f"🔍 METRIC NAME - Found in labels: {extracted_metric_name}")
+                        logger.debug(f"🔍 METRIC NAME - Found in labels: {extracted_metric_name}")
                 
                 # Try extracting from message content
                 if extracted_metric_name == 'unknown_metric':
@@ -376,7 +645,7 @@ class IncidentAPIService:
                         match = re.search(r'metric_name=([^\s]+)', message)
                         if match:
                             extracted_metric_name = match.group(1)
-                            logger.info(f"🔍 METRIC NAME - Extracted from message: {extracted_metric_name}")
+                            logger.debug(f"🔍 METRIC NAME - Extracted from message: {extracted_metric_name}")
                 
                 # Try inferring from anomaly type or detector name
                 if extracted_metric_name == 'unknown_metric':
@@ -385,36 +654,28 @@ class IncidentAPIService:
                     
                     if 'log' in anomaly_type.lower() or 'log' in detector_name.lower():
                         extracted_metric_name = 'log_anomaly'
-                        logger.info(f"🔍 METRIC NAME - Inferred from anomaly type: {extracted_metric_name}")
+                        logger.debug(f"🔍 METRIC NAME - Inferred from anomaly type: {extracted_metric_name}")
                     elif 'cpu' in message.lower():
                         extracted_metric_name = 'cpu_usage'
-                        logger.info(f"🔍 METRIC NAME - Inferred from message (CPU): {extracted_metric_name}")
+                        logger.debug(f"🔍 METRIC NAME - Inferred from message (CPU): {extracted_metric_name}")
                     elif 'memory' in message.lower():
                         extracted_metric_name = 'memory_usage'
-                        logger.info(f"🔍 METRIC NAME - Inferred from message (Memory): {extracted_metric_name}")
+                        logger.debug(f"🔍 METRIC NAME - Inferred from message (Memory): {extracted_metric_name}")
                     elif 'network' in detector_name.lower():
                         extracted_metric_name = 'network_metric'
-                        logger.info(f"🔍 METRIC NAME - Inferred from detector (Network): {extracted_metric_name}")
+                        logger.debug(f"🔍 METRIC NAME - Inferred from detector (Network): {extracted_metric_name}")
                     else:
                         # Try to extract from the service name or context
                         service = incident_data.get('service', 'unknown_service')
                         if service != 'unknown_service':
                             extracted_metric_name = f'{service}_metric'
-                            logger.info(f"🔍 METRIC NAME - Derived from service: {extracted_metric_name}")
-            
-            logger.info(f"🔍 FINAL METRIC NAME: {extracted_metric_name}")
+                            logger.debug(f"🔍 METRIC NAME - Derived from service: {extracted_metric_name}")
             
-            # Insert incident into ClickHouse
-            query = """
-            INSERT INTO logs.incidents (
-                incident_id, event_type, incident_type, incident_severity,
-                ship_id, service, status, acknowledged, created_at, updated_at,
-                correlation_id, processing_timestamp, metric_name, metric_value,
-                anomaly_score, detector_name, correlated_events, timeline,
-                suggested_runbooks, metadata
-            ) VALUES
-            """
+            logger.debug(f"🔍 FINAL METRIC NAME: {extracted_metric_name}")
             
+            # Row in INCIDENT_COLUMNS order for the batched writer
+            log_template_id, log_template = self._log_template(incident_data)
+
             values = (
                 incident_data.get('incident_id', str(uuid.uuid4())),
                 incident_data.get('event_type', 'incident'),
@@ -435,89 +696,109 @@ class IncidentAPIService:
                 correlated_events_json,
                 timeline_json,
                 incident_data.get('suggested_runbooks', ['generic_investigation']),
-                metadata_json
+                metadata_json,
+                log_template_id,
+                log_template
             )
             
-            self.clickhouse_client.execute(query, [values])
-            logger.info(f"✅ STORED INCIDENT {values[0]}:")
-            logger.info(f"  🏷️  Ship ID: {resolved_ship_id}")
-            logger.info(f"  🏢  Service: {service_name}")  
-            logger.info(f"  📊  Metric: {extracted_metric_name} = {metric_value}")
-            logger.info(f"  📈  Anomaly Score: {anomaly_score}")
-            logger.info(f"  ⚠️  Type: {incident_type}, Severity: {incident_severity}")
-            logger.info(f"🔍 INCIDENT STORAGE COMPLETE - All field extractions logged above")
+            await self.incident_writer.submit(values)
+            logger.debug(f"Queued incident {values[0]}: ship={resolved_ship_id}, service={service_name}, "
+                         f"metric={extracted_metric_name}={metric_value}, score={anomaly_score}, "
+                         f"type={incident_type}, severity={incident_severity}")
             
         except Exception as e:
-            logger.error(f"Error storing incident in ClickHouse: {e}")
+            logger.error(f"Error queueing incident for ClickHouse: {e}")
             logger.error(f"Incident data causing error: {incident_data}")
             raise
     
-    def get_incidents(self, limit: int = 50, status: Optional[str] = None, ship_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Retrieve incidents from ClickHouse"""
+    def _log_template(self, incident_data: Dict[str, Any]) -> Tuple[int, str]:
+        """Template ID and text for the incident's log message, or (0, '') for metric incidents
+
+        IDs assigned upstream (anomaly detection, correlation) are kept so the
+        same error groups together across services.
+        """
+        if incident_data.get('log_template_id'):
+            return int(incident_data['log_template_id']), incident_data.get('log_template', '')
+        message = incident_data.get('log_message') or incident_data.get('message')
+        if not message:
+            for event in incident_data.get('correlated_events') or []:
+                if isinstance(event, dict) and event.get('log_message'):
+                    message = event['log_message']
+                    break
+        if not isinstance(message, str) or not message:
+            return 0, ''
+        template = self.log_templates.add(message)
+        return template.template_id, template.template
+
+    def get_incidents(self, limit: int = 50, status: Optional[str] = None, ship_id: Optional[str] = None,
+                      cursor: Optional[Tuple[datetime, str]] = None,
+                      fields: Optional[List[str]] = None, client=None) -> List[Dict[str, Any]]:
+        """Retrieve a page of incidents from ClickHouse, newest first
+
+        Pages are keyed on (created_at, incident_id), the table's sort key, so
+        fetching the next page is a range read rather than an OFFSET scan.
+        Only the requested ``fields`` are selected and JSON columns are decoded
+        only when they are part of the projection. ``client`` overrides the
+        request-path connection (used by the summary loader thread).
+        """
+        columns = self._projection(fields)
         try:
-            query = """
-            SELECT incident_id, event_type, incident_type, incident_severity,
-                   ship_id, service, status, acknowledged, created_at, updated_at,
-                   correlation_id, metric_name, metric_value, anomaly_score,
-                   detector_name, correlated_events, timeline, suggested_runbooks, metadata
-            FROM logs.incidents
-            WHERE 1=1
-            """
-            
-            params = []
+            query = f"SELECT {', '.join(columns)} FROM logs.incidents WHERE 1=1"
+
+            params: Dict[str, Any] = {'limit': limit}
             if status:
-                query += " AND status = %s"
-                params.append(status)
+                query += " AND status = %(status)s"
+                params['status'] = status
             if ship_id:
-                query += " AND ship_id = %s"
-                params.append(ship_id)
-                
-            query += " ORDER BY created_at DESC LIMIT %s"
-            params.append(limit)
-            
-            results = self.clickhouse_client.execute(query, params)
-            
-            incidents = []
-            for row in results:
-                incident = {
-                    'incident_id': row[0],
-                    'event_type': row[1],
-                    'incident_type': row[2],
-                    'incident_severity': row[3],
-                    'ship_id': row[4],
-                    'service': row[5],
-                    'status': row[6],
-                    'acknowledged': row[7],
-                    'created_at': row[8],
-                    'updated_at': row[9],
-                    'correlation_id': row[10],
-                    'metric_name': row[11],
-                    'metric_value': row[12],
-                    'anomaly_score': row[13],
-                    'detector_name': row[14],
-                    'correlated_events': json.loads(row[15]) if row[15] else [],
-                    'timeline': json.loads(row[16]) if row[16] else [],
-                    'suggested_runbooks': row[17],
-                    'metadata': json.loads(row[18]) if row[18] else {}
-                }
-                incidents.append(incident)
-            
-            return incidents
-            
+                query += " AND ship_id = %(ship_id)s"
+                params['ship_id'] = ship_id
+            if cursor:
+                query += " AND (created_at, incident_id) < (%(cursor_created_at)s, %(cursor_incident_id)s)"
+                params['cursor_created_at'], params['cursor_incident_id'] = cursor
+
+            query += " ORDER BY created_at DESC, incident_id DESC LIMIT %(limit)s"
+
+            results = (client or self.clickhouse_client).execute(query, params)
+            return [self._row_to_incident(columns, row) for row in results]
+
         except Exception as e:
             logger.error(f"Error retrieving incidents: {e}")
             return []
-    
-    def get_incident_by_id(self, incident_id: str) -> Optional[Dict[str, Any]]:
-        """Get specific incident by ID"""
+
+    def get_incident_by_id(self, incident_id: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Get specific incident by ID via the incident_id skip index"""
+        columns = self._projection(fields)
         try:
-            incidents = self.get_incidents(limit=1)
-            filtered = [i for i in incidents if i['incident_id'] == incident_id]
-            return filtered[0] if filtered else None
+            results = self.clickhouse_client.execute(
+                f"SELECT {', '.join(columns)} FROM logs.incidents "
+                "WHERE incident_id = %(incident_id)s ORDER BY updated_at DESC LIMIT 1",
+                {'incident_id': incident_id}
+            )
+            return self._row_to_incident(columns, results[0]) if results else None
         except Exception as e:
             logger.error(f"Error getting incident {incident_id}: {e}")
             return None
-    
+
+    @staticmethod
+    def _projection(fields: Optional[List[str]]) -> List[str]:
+        """Validate requested fields and return the columns to select"""
+        if not fields:
+            return list(INCIDENT_SELECT_COLUMNS)
+        unknown = [f for f in fields if f not in INCIDENT_SELECT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown incident fields: {', '.join(unknown)}")
+        # Paging needs the sort key, so it is always included
+        return ['incident_id', 'created_at'] + [f for f in INCIDENT_SELECT_COLUMNS
+                                                if f in fields and f not in ('incident_id', 'created_at')]
+
+    @staticmethod
+    def _row_to_incident(columns: List[str], row: tuple) -> Dict[str, Any]:
+        incident = dict(zip(columns, row))
+        for column, empty in INCIDENT_JSON_COLUMNS.items():
+            if column in incident:
+                incident[column] = json.loads(incident[column]) if incident[column] else empty()
+        return incident
+
     def update_incident(self, incident_id: str, update_data: IncidentUpdate) -> bool:
         """Update incident in ClickHouse"""
         try:
@@ -540,30 +821,32 @@ class IncidentAPIService:
             return False
     
     def get_summary(self) -> Dict[str, Any]:
-        """Get incident summary statistics"""
+        """Get incident summary statistics
+
+        All counts come from a single countIf pass over logs.incidents.
+        Raises on ClickHouse errors so the summary cache can keep serving the
+        last good value. Runs on an executor thread, so it only touches
+        ``summary_client``, never the connection used by request handlers.
+        """
+        counts = self.summary_client.execute("""
+            SELECT count(),
+                   countIf(status = 'open'),
+                   countIf(incident_severity = 'critical')
+            FROM logs.incidents
+        """)
+        total_incidents, open_incidents, critical_incidents = counts[0] if counts else (0, 0, 0)
+
+        return {
+            'total_incidents': total_incidents,
+            'open_incidents': open_incidents,
+            'critical_incidents': critical_incidents,
+            'recent_incidents': self.get_incidents(limit=10, client=self.summary_client)
+        }
+
+    async def get_cached_summary(self) -> Dict[str, Any]:
+        """Summary served from the short-TTL cache"""
         try:
-            # Get total incidents
-            total_result = self.clickhouse_client.execute("SELECT count() FROM logs.incidents")
-            total_incidents = total_result[0][0] if total_result else 0
-            
-            # Get open incidents
-            open_result = self.clickhouse_client.execute("SELECT count() FROM logs.incidents WHERE status = 'open'")
-            open_incidents = open_result[0][0] if open_result else 0
-            
-            # Get critical incidents
-            critical_result = self.clickhouse_client.execute("SELECT count() FROM logs.incidents WHERE incident_severity = 'critical'")
-            critical_incidents = critical_result[0][0] if critical_result else 0
-            
-            # Get recent incidents
-            recent_incidents = self.get_incidents(limit=10)
-            
-            return {
-                'total_incidents': total_incidents,
-                'open_incidents': open_incidents,
-                'critical_incidents': critical_incidents,
-                'recent_incidents': recent_incidents
-            }
-            
+            return await self.summary_cache.get()
         except Exception as e:
             logger.error(f"Error getting summary: {e}")
             return {
@@ -591,9 +874,11 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # Shutdown
+    # Shutdown: stop consuming, then flush whatever is still buffered
     if service.nats_client:
         await service.nats_client.close()
+    await service.incident_writer.close()
+    await service.registry_client.close()
 
 # FastAPI app
 app = FastAPI(
@@ -626,20 +911,48 @@ async def health():
     """Health check endpoint"""
     return service.health_status
 
+@app.get("/metrics")
+async def metrics():
+    """Writer queue and flush metrics for monitoring"""
+    return {
+        "incident_writer": service.incident_writer.metrics(),
+        "summary_cache": service.summary_cache.stats,
+        "registry_cache": service.registry_client.snapshot()
+    }
+
 @app.get("/incidents", response_model=List[Dict[str, Any]])
 async def get_incidents(
-    limit: int = 50,
+    response: Response,
+    limit: int = Query(50, ge=1, le=1000),
     status: Optional[str] = None,
-    ship_id: Optional[str] = None
+    ship_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Get incidents with optional filtering"""
-    incidents = service.get_incidents(limit=limit, status=status, ship_id=ship_id)
+    """Get incidents with optional filtering
+
+    Pass the ``X-Next-Cursor`` response header back as ``cursor`` to fetch the
+    next page; ``fields`` is a comma-separated list of columns to return.
+    """
+    try:
+        page_after = decode_cursor(cursor) if cursor else None
+        field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        incidents = service.get_incidents(limit=limit, status=status, ship_id=ship_id,
+                                          cursor=page_after, fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(incidents) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(incidents[-1])
     return incidents
 
 @app.get("/incidents/{incident_id}", response_model=Dict[str, Any])
-async def get_incident(incident_id: str):
+async def get_incident(incident_id: str, fields: Optional[str] = None):
     """Get specific incident by ID"""
-    incident = service.get_incident_by_id(incident_id)
+    try:
+        field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+        incident = service.get_incident_by_id(incident_id, fields=field_list)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
     return incident
@@ -655,7 +968,7 @@ async def update_incident(incident_id: str, update_data: IncidentUpdate):
 @app.get("/summary", response_model=Dict[str, Any])
 async def get_summary():
     """Get incident summary statistics"""
-    return service.get_summary()
+    return await service.get_cached_summary()
 
 @app.post("/incidents/test")
 async def create_test_incident():
@@ -15,6 +15,7 @@ Features:
 import asyncio
 import logging
 import json
+import os
 import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
@@ -29,6 +30,8 @@ import nats
 from clickhouse_driver import Client as ClickHouseClient
 import requests
 
+from llm_client import LLMClient, LLMUnavailable
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -70,6 +73,9 @@ class IncidentTranslator:
         self.clickhouse_client = None
         self.nats_client = None
         
+        # Optional LLM narrative for "what happened"; templates are used when disabled or unavailable
+        self.llm_client = LLMClient.from_env() if os.getenv('INCIDENT_EXPLANATION_LLM_ENABLED', 'false').lower() == 'true' else None
+        
         # Load translation templates
         self.templates = self._load_templates()
         
@@ -130,6 +136,10 @@ class IncidentTranslator:
             # Format the explanation using template and actual data
             explanation = self._format_explanation(template, metrics, incident_data)
             
+            llm_narrative = await self._generate_llm_narrative(incident_data, explanation)
+            if llm_narrative:
+                explanation['what_happened'] = llm_narrative
+            
             # Get historical context
             historical_context = await self._get_historical_context(
                 incident_type, 
@@ -147,11 +157,11 @@ class IncidentTranslator:
                 plain_language_summary=explanation['summary'],
                 what_happened=explanation['what_happened'],
                 why_it_matters=explanation['why_matters'],
-                historical_context=explanation['historical_context'],
+                historical_context=historical_context,
                 recommended_actions=explanation['actions'],
                 predicted_timeline=predictive_insights['timeline'],
                 confidence_level=predictive_insights['confidence'],
-                maritime_context=explanation.get('maritime_context')
+                maritime_context={"maritime_specific": explanation.get('maritime_context', False)}
             )
             
         except Exception as e:
@@ -187,6 +197,27 @@ class IncidentTranslator:
         
         return formatted
     
+    async def _generate_llm_narrative(self, incident_data: Dict[str, Any], explanation: Dict[str, Any]) -> Optional[str]:
+        """Ask the LLM to reword the templated explanation for the crew; None when disabled or unavailable"""
+        if self.llm_client is None:
+            return None
+        
+        # Incident and ship IDs are left out so the same situation hits the prompt cache
+        metric_names = sorted({e.get('metric_name', 'unknown') for e in incident_data.get('correlated_events', [])})
+        prompt = (
+            "Explain this ship system incident to non-technical crew in two or three plain sentences.\n"
+            f"Incident type: {incident_data.get('incident_type', 'single_anomaly')}\n"
+            f"Severity: {incident_data.get('incident_severity', 'info')}\n"
+            f"Affected metrics: {', '.join(metric_names) or 'unknown'}\n"
+            f"Technical description: {explanation['what_happened']}"
+        )
+        try:
+            text = await self.llm_client.generate(prompt)
+        except LLMUnavailable as e:
+            logger.warning(f"LLM narrative unavailable, using template text: {e}")
+            return None
+        return text.strip() or None
+    
     async def _get_historical_context(self, incident_type: str, ship_id: str) -> str:
         """Query ClickHouse for enhanced historical incident patterns with predictive analysis"""
         try:
@@ -401,6 +432,12 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Startup error: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the LLM client's HTTP connections"""
+    if translator.llm_client is not None:
+        await translator.llm_client.close()
+
 @app.post("/explain-incident", response_model=IncidentExplanation)
 async def explain_incident(incident_data: Dict[str, Any]):
     """Convert technical incident data to user-friendly explanation"""
@@ -527,7 +564,10 @@ async def get_dashboard():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    health = {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    if translator.llm_client is not None:
+        health["llm_client"] = translator.llm_client.snapshot()
+    return health
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8087)
\ No newline at end of file
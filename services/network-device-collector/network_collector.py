@@ -20,18 +20,20 @@ Features:
 """
 
 import asyncio
+import ipaddress
 import json
 import logging
 import time
 import yaml
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 
 import nats
 from pysnmp.hlapi.asyncio import *
 from pysnmp.proto.rfc1902 import Counter64, Gauge32, Integer32
+from pysnmp.proto.rfc1905 import EndOfMibView
 from prometheus_client import start_http_server, Gauge, Counter, Histogram
 import aiohttp
 import networkx as nx
@@ -147,6 +149,216 @@ class MIBRegistry:
     IF_IN_ERRORS = "1.3.6.1.2.1.2.2.1.14"
     IF_OUT_ERRORS = "1.3.6.1.2.1.2.2.1.20"
     IF_SPEED = "1.3.6.1.2.1.2.2.1.5"
+    IF_DESCR = "1.3.6.1.2.1.2.2.1.2"
+    IF_IN_DISCARDS = "1.3.6.1.2.1.2.2.1.13"
+    IF_OUT_DISCARDS = "1.3.6.1.2.1.2.2.1.19"
+
+    # ifAdminStatus / ifOperStatus enumerations (IF-MIB)
+    IF_STATUS = {1: "up", 2: "down", 3: "testing", 4: "unknown",
+                 5: "dormant", 6: "notPresent", 7: "lowerLayerDown"}
+
+    # ifTable columns fetched together in one GETBULK walk
+    IF_TABLE_COLUMNS = (IF_DESCR, IF_SPEED, IF_ADMIN_STATUS, IF_OPER_STATUS,
+                        IF_IN_OCTETS, IF_OUT_OCTETS, IF_IN_PACKETS, IF_OUT_PACKETS,
+                        IF_IN_ERRORS, IF_OUT_ERRORS, IF_IN_DISCARDS, IF_OUT_DISCARDS)
+
+
+class SnmpSession:
+    """Shared SNMP engine for discovery sweeps and metric polling
+
+    A single SnmpEngine (one transport dispatcher and UDP socket) serves every
+    request. Discovery probes fan out across hosts under a semaphore, and the
+    community a device answered to is remembered so later probes need one
+    request. Communities are tried in configured order unless
+    ``parallel_probe`` is set.
+    """
+
+    def __init__(self, communities: List[str], timeout: float = 5, retries: int = 3,
+                 max_concurrency: int = 256, max_repetitions: int = 10, parallel_probe: bool = False):
+        self.communities = list(communities)
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self.max_repetitions = max_repetitions
+        self.parallel_probe = parallel_probe
+        self.engine = SnmpEngine()
+        self.context = ContextData()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.community_cache: Dict[str, str] = {}
+        self._auth: Dict[str, CommunityData] = {}
+        self.stats = {
+            'requests': 0,
+            'no_response': 0,
+            'errors': 0,
+            'probes': 0,
+            'cached_community_hits': 0
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SnmpSession":
+        discovery = config.get('discovery', {})
+        monitoring = config.get('monitoring', {})
+        return cls(
+            communities=discovery.get('snmp_communities', ['public']),
+            timeout=discovery.get('timeout', 5),
+            retries=discovery.get('retries', 3),
+            max_concurrency=discovery.get('max_concurrency', 256),
+            max_repetitions=monitoring.get('bulk_max_repetitions', 10),
+            parallel_probe=discovery.get('parallel_community_probe', False)
+        )
+
+    def _auth_data(self, community: str) -> CommunityData:
+        auth = self._auth.get(community)
+        if auth is None:
+            auth = self._auth[community] = CommunityData(community)
+        return auth
+
+    async def _request(self, command, ip_address: str, community: str, *args):
+        """Send one request; returns the response var-binds or None"""
+        self.stats['requests'] += 1
+        try:
+            errorIndication, errorStatus, errorIndex, varBinds = await command(
+                self.engine,
+                self._auth_data(community),
+                UdpTransportTarget((ip_address, 161), timeout=self.timeout, retries=self.retries),
+                self.context,
+                *args,
+                lookupMib=False
+            )
+        except Exception as e:
+            logger.debug(f"SNMP request to {ip_address} failed: {e}")
+            self.stats['errors'] += 1
+            return None
+
+        if errorIndication:
+            self.stats['no_response'] += 1
+            return None
+        if errorStatus:
+            self.stats['errors'] += 1
+            return None
+        return varBinds
+
+    async def get(self, ip_address: str, community: str, *oids: str) -> Optional[List[Tuple[Any, Any]]]:
+        """GET scalar OIDs, returning (oid, value) pairs or None"""
+        return await self._request(getCmd, ip_address, community,
+                                   *[ObjectType(ObjectIdentity(oid)) for oid in oids])
+
+    async def bulk_walk(self, ip_address: str, community: str,
+                        *column_oids: str) -> Optional[Dict[str, Dict[Tuple[int, ...], Any]]]:
+        """Walk table columns side by side with GETBULK
+
+        Returns {column_oid: {row_index: value}}, or None if any request fails.
+        Every response carries up to max_repetitions rows of every column still
+        being walked, so an ifTable needs a handful of round trips instead of
+        one GETNEXT per cell.
+        """
+        bases = {oid: tuple(int(part) for part in oid.split('.')) for oid in column_oids}
+        table: Dict[str, Dict[Tuple[int, ...], Any]] = {oid: {} for oid in column_oids}
+        cursor = dict(bases)
+
+        while cursor:
+            active = list(cursor)
+            varBindTable = await self._request(
+                bulkCmd, ip_address, community, 0, self.max_repetitions,
+                *[ObjectType(ObjectIdentity(cursor[oid])) for oid in active]
+            )
+            if varBindTable is None:
+                return None
+
+            finished = set()
+            advanced = False
+            for row in varBindTable:
+                for column, (name, value) in zip(active, row):
+                    if column in finished:
+                        continue
+                    base = bases[column]
+                    name = tuple(name)
+                    if isinstance(value, EndOfMibView) or name[:len(base)] != base:
+                        finished.add(column)
+                        continue
+                    table[column][name[len(base):]] = value
+                    if name > cursor[column]:
+                        cursor[column] = name
+                        advanced = True
+
+            for column in finished:
+                del cursor[column]
+            if not advanced:
+                break
+
+        return table
+
+    async def probe(self, ip_address: str) -> Optional[Tuple[str, Any]]:
+        """Find a community the host answers to; returns (community, sysDescr)
+
+        The cached community is tried alone first, then the others in
+        configured order, stopping at the first that answers. With
+        ``parallel_probe`` they are all sent at once instead, so an
+        unresponsive host costs a single timeout window rather than one per
+        community, at the price of offering every community to every host.
+        """
+        self.stats['probes'] += 1
+        cached = self.community_cache.get(ip_address)
+        if cached is not None:
+            varBinds = await self.get(ip_address, cached, MIBRegistry.OID_SYSTEM_DESCR)
+            if varBinds:
+                self.stats['cached_community_hits'] += 1
+                return cached, varBinds[0][1]
+            self.community_cache.pop(ip_address, None)
+
+        candidates = [community for community in self.communities if community != cached]
+        if self.parallel_probe:
+            responses = await asyncio.gather(
+                *[self.get(ip_address, community, MIBRegistry.OID_SYSTEM_DESCR) for community in candidates]
+            )
+            answered = [(community, varBinds) for community, varBinds in zip(candidates, responses) if varBinds]
+        else:
+            answered = []
+            for community in candidates:
+                varBinds = await self.get(ip_address, community, MIBRegistry.OID_SYSTEM_DESCR)
+                if varBinds:
+                    answered.append((community, varBinds))
+                    break
+        if answered:
+            community, varBinds = answered[0]
+            self.community_cache[ip_address] = community
+            return community, varBinds[0][1]
+        return None
+
+    async def sweep(self, ip_addresses: Iterable[str],
+                    on_found: Callable[[str, str, Any], Awaitable[None]]) -> int:
+        """Probe hosts concurrently, at most max_concurrency at a time
+
+        on_found(ip, community, sysDescr) runs inside the probing task so
+        follow-up queries for one device overlap with the rest of the sweep.
+        Returns the number of responding hosts.
+        """
+        found = 0
+        tasks = set()
+
+        async def probe_one(ip_address: str):
+            nonlocal found
+            try:
+                result = await self.probe(ip_address)
+                if result:
+                    found += 1
+                    await on_found(ip_address, *result)
+            except Exception as e:
+                logger.debug(f"Error probing {ip_address}: {e}")
+                self.stats['errors'] += 1
+            finally:
+                self.semaphore.release()
+
+        for ip_address in ip_addresses:
+            await self.semaphore.acquire()
+            task = asyncio.create_task(probe_one(ip_address))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+        return found
+
 
 
 class NetworkDeviceCollector:
@@ -157,6 +369,10 @@ class NetworkDeviceCollector:
         self.devices: Dict[str, NetworkDevice] = {}
         self.network_topology = nx.Graph()
         self.nats_client = None
+        self.snmp = SnmpSession.from_config(self.config)
+        # (device ip, ifIndex) -> (monotonic time, in octets, out octets) from the previous poll
+        self.interface_counters: Dict[Tuple[str, int], Tuple[float, int, int]] = {}
+        self.last_sweep: Dict[str, Any] = {}
         
         # Prometheus metrics
         self.device_count = Gauge('network_devices_total', 'Total number of network devices', ['type', 'vendor'])
@@ -167,6 +383,7 @@ class NetworkDeviceCollector:
         self.device_memory = Gauge('network_device_memory_percent', 'Device memory utilization', ['device', 'type'])
         self.collection_duration = Histogram('network_collection_duration_seconds', 'Collection duration')
         self.collection_errors = Counter('network_collection_errors_total', 'Collection errors', ['error_type'])
+        self.sweep_duration = Gauge('network_discovery_sweep_seconds', 'Duration of the last discovery sweep')
         
     def _load_config(self, path: str) -> Dict[str, Any]:
         """Load configuration from YAML file"""
@@ -185,10 +402,13 @@ class NetworkDeviceCollector:
                 'snmp_communities': ['public', 'private'],
                 'scan_interval': 300,
                 'timeout': 5,
-                'retries': 3
+                'retries': 3,
+                'max_concurrency': 256,
+                'parallel_community_probe': False
             },
             'monitoring': {
                 'polling_interval': 30,
+                'bulk_max_repetitions': 10,
                 'interface_monitoring': True,
                 'health_monitoring': True,
                 'topology_discovery': True
@@ -243,10 +463,13 @@ class NetworkDeviceCollector:
         
         while True:
             try:
+                started = time.monotonic()
                 with self.collection_duration.time():
                     await self._discover_devices()
                 
-                await asyncio.sleep(self.config['discovery']['scan_interval'])
+                # Keep a fixed cadence: the next sweep starts scan_interval after this one started
+                scan_interval = self.config['discovery']['scan_interval']
+                await asyncio.sleep(max(0.0, scan_interval - (time.monotonic() - started)))
             except Exception as e:
                 logger.error(f"Error in discovery loop: {e}")
                 self.collection_errors.labels(error_type='discovery').inc()
@@ -256,8 +479,23 @@ class NetworkDeviceCollector:
         """Discover network devices via SNMP"""
         logger.info("Starting device discovery")
         
-        for ip_range in self.config['discovery']['ip_ranges']:
-            await self._scan_ip_range(ip_range)
+        started = time.monotonic()
+        hosts = list(self._iter_discovery_hosts())
+        responding = await self.snmp.sweep(hosts, self._identify_device)
+        duration = time.monotonic() - started
+        
+        self.last_sweep = {
+            'hosts_probed': len(hosts),
+            'devices_responding': responding,
+            'duration_seconds': round(duration, 2),
+            'max_concurrency': self.snmp.max_concurrency
+        }
+        self.sweep_duration.set(duration)
+        logger.info(f"Discovery sweep probed {len(hosts)} hosts in {duration:.1f}s, "
+                    f"{responding} responded")
+        if duration > self.config['discovery']['scan_interval']:
+            logger.warning("Discovery sweep took longer than scan_interval; "
+                           "consider raising discovery.max_concurrency")
         
         # Update device counts
         self._update_device_metrics()
@@ -265,45 +503,22 @@ class NetworkDeviceCollector:
         # Publish discovery results
         await self._publish_discovery_results()
     
-    async def _scan_ip_range(self, ip_range: str):
-        """Scan IP range for SNMP-enabled devices"""
-        import ipaddress
-        
-        try:
-            network = ipaddress.ip_network(ip_range, strict=False)
+    def _iter_discovery_hosts(self) -> Iterator[str]:
+        """Yield every host address of every configured range once"""
+        seen = set()
+        for ip_range in self.config['discovery']['ip_ranges']:
+            try:
+                network = ipaddress.ip_network(ip_range, strict=False)
+            except ValueError as e:
+                logger.error(f"Error scanning IP range {ip_range}: {e}")
+                self.collection_errors.labels(error_type='ip_scan').inc()
+                continue
             
             for ip in network.hosts():
                 ip_str = str(ip)
-                await self._probe_device(ip_str)
-                
-        except Exception as e:
-            logger.error(f"Error scanning IP range {ip_range}: {e}")
-            self.collection_errors.labels(error_type='ip_scan').inc()
-    
-    async def _probe_device(self, ip_address: str):
-        """Probe a single device for SNMP availability"""
-        for community in self.config['discovery']['snmp_communities']:
-            try:
-                # Try to get system description
-                iterator = getCmd(
-                    SnmpEngine(),
-                    CommunityData(community),
-                    UdpTransportTarget((ip_address, 161)),
-                    ContextData(),
-                    ObjectType(ObjectIdentity(MIBRegistry.OID_SYSTEM_DESCR))
-                )
-                
-                errorIndication, errorStatus, errorIndex, varBinds = await iterator
-                
-                if errorIndication or errorStatus:
-                    continue
-                    
-                # Device responded to SNMP
-                await self._identify_device(ip_address, community, varBinds[0][1])
-                break
-                
-            except Exception as e:
-                continue  # Try next community
+                if ip_str not in seen:
+                    seen.add(ip_str)
+                    yield ip_str
     
     async def _identify_device(self, ip_address: str, community: str, system_descr):
         """Identify device type and vendor from system description"""
@@ -363,18 +578,10 @@ class NetworkDeviceCollector:
         
         try:
             # Get system name and uptime
-            iterator = getCmd(
-                SnmpEngine(),
-                CommunityData(community),
-                UdpTransportTarget((ip_address, 161)),
-                ContextData(),
-                ObjectType(ObjectIdentity(MIBRegistry.OID_SYSTEM_NAME)),
-                ObjectType(ObjectIdentity(MIBRegistry.OID_SYSTEM_UPTIME))
-            )
+            varBinds = await self.snmp.get(ip_address, community,
+                                           MIBRegistry.OID_SYSTEM_NAME, MIBRegistry.OID_SYSTEM_UPTIME)
             
-            errorIndication, errorStatus, errorIndex, varBinds = await iterator
-            
-            if not errorIndication and not errorStatus:
+            if varBinds:
                 info['hostname'] = str(varBinds[0][1])
                 info['uptime'] = int(varBinds[1][1])
             
@@ -415,26 +622,19 @@ class NetworkDeviceCollector:
     async def _collect_interface_metrics(self, device: NetworkDevice):
         """Collect interface metrics from a device"""
         try:
-            # Walk interface table
-            iterator = nextCmd(
-                SnmpEngine(),
-                CommunityData(device.snmp_community),
-                UdpTransportTarget((device.ip_address, 161)),
-                ContextData(),
-                ObjectType(ObjectIdentity(MIBRegistry.OID_IF_TABLE)),
-                lexicographicMode=False
-            )
+            # Fetch all ifTable columns with GETBULK
+            table = await self.snmp.bulk_walk(device.ip_address, device.snmp_community,
+                                              *MIBRegistry.IF_TABLE_COLUMNS)
+            if table is None:
+                self.collection_errors.labels(error_type='interface_metrics').inc()
+                return
             
-            interfaces = []
+            interfaces = self._build_interface_metrics(device, table, time.monotonic())
             
-            async for errorIndication, errorStatus, errorIndex, varBinds in iterator:
-                if errorIndication or errorStatus:
-                    break
-                
-                for varBind in varBinds:
-                    oid, value = varBind
-                    # Process interface metrics
-                    # This would need more detailed implementation for full interface metrics
+            for interface in interfaces:
+                self.interface_utilization.labels(device=device.ip_address,
+                                                  interface=interface.interface_name).set(
+                    interface.utilization_percent)
             
             # Publish interface metrics
             if interfaces:
@@ -444,6 +644,53 @@ class NetworkDeviceCollector:
             logger.error(f"Error collecting interface metrics from {device.ip_address}: {e}")
             self.collection_errors.labels(error_type='interface_metrics').inc()
     
+    def _build_interface_metrics(self, device: NetworkDevice, table: Dict[str, Dict[Tuple[int, ...], Any]],
+                                 now: float) -> List[InterfaceMetrics]:
+        """Turn walked ifTable columns into InterfaceMetrics rows"""
+        def column(oid: str, index: Tuple[int, ...], default=0):
+            value = table[oid].get(index)
+            return default if value is None else value
+        
+        indexes = sorted(set().union(*(rows.keys() for rows in table.values())))
+        timestamp = datetime.now().isoformat()
+        interfaces = []
+        
+        for index in indexes:
+            if_index = index[-1]
+            in_octets = int(column(MIBRegistry.IF_IN_OCTETS, index))
+            out_octets = int(column(MIBRegistry.IF_OUT_OCTETS, index))
+            speed_bps = int(column(MIBRegistry.IF_SPEED, index))
+            
+            utilization = 0.0
+            previous = self.interface_counters.get((device.ip_address, if_index))
+            self.interface_counters[(device.ip_address, if_index)] = (now, in_octets, out_octets)
+            if previous and speed_bps > 0 and now > previous[0]:
+                # Counter32 octet counters wrap at 2**32
+                in_delta = (in_octets - previous[1]) % 2 ** 32
+                out_delta = (out_octets - previous[2]) % 2 ** 32
+                bits_per_second = max(in_delta, out_delta) * 8 / (now - previous[0])
+                utilization = min(100.0, bits_per_second / speed_bps * 100)
+            
+            interfaces.append(InterfaceMetrics(
+                interface_name=str(column(MIBRegistry.IF_DESCR, index, f"if{if_index}")),
+                interface_index=if_index,
+                admin_status=MIBRegistry.IF_STATUS.get(int(column(MIBRegistry.IF_ADMIN_STATUS, index)), "unknown"),
+                oper_status=MIBRegistry.IF_STATUS.get(int(column(MIBRegistry.IF_OPER_STATUS, index)), "unknown"),
+                in_octets=in_octets,
+                out_octets=out_octets,
+                in_packets=int(column(MIBRegistry.IF_IN_PACKETS, index)),
+                out_packets=int(column(MIBRegistry.IF_OUT_PACKETS, index)),
+                in_errors=int(column(MIBRegistry.IF_IN_ERRORS, index)),
+                out_errors=int(column(MIBRegistry.IF_OUT_ERRORS, index)),
+                in_discards=int(column(MIBRegistry.IF_IN_DISCARDS, index)),
+                out_discards=int(column(MIBRegistry.IF_OUT_DISCARDS, index)),
+                speed_bps=speed_bps,
+                utilization_percent=round(utilization, 2),
+                timestamp=timestamp
+            ))
+        
+        return interfaces
+    
     async def _collect_health_metrics(self, device: NetworkDevice):
         """Collect health metrics from a device"""
         try:
@@ -482,18 +729,10 @@ class NetworkDeviceCollector:
     async def _collect_cisco_health(self, device: NetworkDevice, health_metrics: DeviceHealthMetrics):
         """Collect Cisco-specific health metrics"""
         try:
-            iterator = getCmd(
-                SnmpEngine(),
-                CommunityData(device.snmp_community),
-                UdpTransportTarget((device.ip_address, 161)),
-                ContextData(),
-                ObjectType(ObjectIdentity(MIBRegistry.CISCO_CPU_UTIL)),
-                ObjectType(ObjectIdentity(MIBRegistry.CISCO_MEMORY_UTIL))
-            )
-            
-            errorIndication, errorStatus, errorIndex, varBinds = await iterator
+            varBinds = await self.snmp.get(device.ip_address, device.snmp_community,
+                                           MIBRegistry.CISCO_CPU_UTIL, MIBRegistry.CISCO_MEMORY_UTIL)
             
-            if not errorIndication and not errorStatus:
+            if varBinds:
                 health_metrics.cpu_utilization_percent = float(varBinds[0][1])
                 health_metrics.memory_utilization_percent = float(varBinds[1][1])
                 
@@ -566,6 +805,7 @@ class NetworkDeviceCollector:
                 "timestamp": datetime.now().isoformat(),
                 "total_devices": len(self.devices),
                 "devices": [asdict(device) for device in self.devices.values()],
+                "sweep": {**self.last_sweep, "snmp": dict(self.snmp.stats)},
                 "maritime_context": {
                     "location": "ship_network",
                     "collection_method": "snmp_discovery"
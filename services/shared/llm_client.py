@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+AIOps NAAS - Shared Async LLM Client
+
+Non-blocking Ollama client shared by the services that ask the LLM for
+analysis. It never blocks the event loop and never lets a slow model back
+up the NATS consumers that call it:
+
+- at most ``max_concurrency`` generations run at once, and at most
+  ``max_queue`` more wait for a slot; beyond that ``generate`` fails fast
+- results are cached for ``cache_ttl`` seconds under a hash of the model and
+  the whitespace-normalised prompt (or a caller supplied ``cache_key``)
+- identical prompts that are already in flight share one request
+- a circuit breaker stops calling Ollama after ``failure_threshold``
+  consecutive failures and lets one trial request through after
+  ``reset_timeout`` seconds
+
+Every failure mode raises ``LLMUnavailable``, so callers keep a single
+``except LLMUnavailable`` branch that switches to their rule-based analysis.
+
+This module only depends on httpx and is copied into each service image
+from services/shared.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not produce an answer; use the rule-based fallback"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial request"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._trial_running or self._failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+        self._trial_running = False
+
+    def release(self):
+        """Free the half-open trial slot of a request that ended without an outcome"""
+        self._trial_running = False
+
+
+class LLMClient:
+    """Async Ollama ``/api/generate`` client with caching, coalescing and a breaker"""
+
+    def __init__(self, base_url: str = "http://ollama:11434", model: str = "llama2",
+                 timeout: float = 10.0, max_concurrency: int = 4, max_queue: int = 32,
+                 cache_ttl: float = 300.0, cache_size: int = 1000,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, clock)
+        self._transport = transport
+        self._clock = clock
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._cache: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "coalesced": 0,
+            "llm_calls": 0,
+            "llm_failures": 0,
+            "rejected_saturated": 0,
+            "rejected_circuit_open": 0,
+        }
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'LLMClient':
+        """Build a client from the OLLAMA_URL / LLM_* environment variables"""
+        config = dict(
+            base_url=os.getenv('OLLAMA_URL', 'http://ollama:11434'),
+            model=os.getenv('LLM_MODEL', 'llama2'),
+            timeout=float(os.getenv('LLM_TIMEOUT_SECONDS', '10')),
+            max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '4')),
+            max_queue=int(os.getenv('LLM_MAX_QUEUE', '32')),
+            cache_ttl=float(os.getenv('LLM_CACHE_TTL_SECONDS', '300')),
+            cache_size=int(os.getenv('LLM_CACHE_SIZE', '1000')),
+            failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+            reset_timeout=float(os.getenv('LLM_BREAKER_RESET_SECONDS', '30')),
+        )
+        config.update(overrides)
+        return cls(**config)
+
+    @property
+    def pending(self) -> int:
+        """Distinct generations currently running or waiting for a slot"""
+        return len(self._inflight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus the current breaker, queue and cache state"""
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "cache_entries": len(self._cache),
+            "circuit_state": self.breaker.state,
+        }
+
+    @staticmethod
+    def prompt_key(model: str, prompt: str) -> str:
+        normalised = ' '.join(prompt.split())
+        return hashlib.blake2b(f"{model}\0{normalised}".encode(), digest_size=16).hexdigest()
+
+    async def generate(self, prompt: str, model: Optional[str] = None,
+                       cache_key: Optional[str] = None, **options) -> str:
+        """Return the model's response text for ``prompt``
+
+        Raises ``LLMUnavailable`` when the queue is full, the breaker is
+        open, or the request fails.
+        """
+        self.stats["requests"] += 1
+        model = model or self.model
+        key = cache_key or self.prompt_key(model, prompt)
+
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        if self.pending >= self.max_concurrency + self.max_queue:
+            self.stats["rejected_saturated"] += 1
+            raise LLMUnavailable(f"LLM queue saturated ({self.pending} pending)")
+
+        future = asyncio.ensure_future(self._generate(key, model, prompt, options))
+        self._inflight[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return await asyncio.shield(future)
+
+    def _finish(self, key: str, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        # Every waiter may have been cancelled; retrieve the error so asyncio
+        # does not log it as never retrieved
+        if not future.cancelled():
+            future.exception()
+
+    async def _generate(self, key: str, model: str, prompt: str, options: Dict[str, Any]) -> str:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            # Checked once a slot is free so queued requests see a breaker
+            # that opened while they waited
+            if not self.breaker.allow():
+                self.stats["rejected_circuit_open"] += 1
+                raise LLMUnavailable("LLM circuit breaker open")
+            self.stats["llm_calls"] += 1
+            try:
+                text = await self._post(model, prompt, options)
+            except Exception as e:
+                self.stats["llm_failures"] += 1
+                self.breaker.record_failure()
+                raise LLMUnavailable(f"LLM request failed: {e}") from e
+            except BaseException:
+                # Cancelled mid-request: nothing learned about the backend, but a
+                # held trial slot would keep the breaker from ever closing again
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+        self._cache_put(key, text)
+        return text
+
+    async def _post(self, model: str, prompt: str, options: Dict[str, Any]) -> str:
+        if self._http is None:
+            self._http = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout,
+                                           transport=self._transport)
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+        response = await self._http.post("/api/generate", json=payload)
+        response.raise_for_status()
+        return response.json().get('response', '')
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, text = entry
+        if expires_at <= self._clock():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return text
+
+    def _cache_put(self, key: str, text: str):
+        self._cache[key] = (self._clock() + self.cache_ttl, text)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+AIOps NAAS - Streaming Log Template Miner
+
+Drain-style online template mining shared by the log-processing services.
+Each message is masked (timestamps, ids, addresses and numbers become
+placeholders), routed through a fixed-depth prefix tree keyed on token count
+and leading tokens, and merged into the most similar template in the leaf
+or started as a new one.
+
+Masked lines are cached, so repeats of a known message cost one regex pass
+and one dict lookup. A template's ID is the 64-bit hash of its route (the
+token count plus the leading routing tokens, computed from the line alone),
+so every miner, in any process and after a restart, gives a cluster the same
+ID whichever of its lines arrives first, and generalisation (a token becoming
+``<*>``) never changes it. A second, dissimilar template on the same route
+gets the hash of the route plus the masked line that created it, which does
+depend on arrival order; services that receive a ``log_template_id`` from
+upstream keep it rather than mining the message again.
+
+The number of live templates is capped; the least recently used one is
+evicted together with its now-empty prefix-tree branch.
+
+This module only depends on the standard library and is copied into each
+service image from services/shared; source checkouts put services/shared on
+PYTHONPATH (tests/conftest.py does so for the test suite).
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+WILDCARD = "<*>"
+
+# Applied in order over the whole line; earlier rules win over later ones
+_MASKS = (
+    (r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?', '<TS>'),
+    (r'\d{4}-\d{2}-\d{2}', '<DATE>'),
+    (r'\d{2}:\d{2}:\d{2}(?:[.,]\d+)?', '<TIME>'),
+    (r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}', '<UUID>'),
+    (r'(?:[0-9a-fA-F]{2}:){5}[0-9a-fA-F]{2}', '<MAC>'),
+    (r'(?:\d{1,3}\.){3}\d{1,3}(?::\d{1,5})?', '<IP>'),
+    (r'0x[0-9a-fA-F]+', '<HEX>'),
+    (r'(?:(?<!\w)[-+])?\d+(?:\.\d+)?', '<NUM>'),
+)
+_MASK_PATTERN = re.compile('|'.join(f'({pattern})' for pattern, _ in _MASKS))
+_MASK_TOKENS = tuple(token for _, token in _MASKS)
+
+
+def _mask_match(match: 're.Match') -> str:
+    return _MASK_TOKENS[match.lastindex - 1]
+
+
+def mask(message: str) -> str:
+    """Replace variable fields in ``message`` with typed placeholders"""
+    return _MASK_PATTERN.sub(_mask_match, message)
+
+
+def template_id(template: str) -> int:
+    """Stable unsigned 64-bit ID for a template string"""
+    return int.from_bytes(hashlib.blake2b(template.encode(), digest_size=8).digest(), 'big')
+
+
+class LogTemplate:
+    """A mined template and the number of messages it has absorbed"""
+
+    __slots__ = ('tokens', 'template', 'template_id', 'size', 'path')
+
+    def __init__(self, tokens: List[str], template_id: int):
+        self.tokens = tokens
+        self.size = 0
+        self.template = ' '.join(tokens)
+        # Fixed at creation: later generalisation changes the text, not the ID
+        self.template_id = template_id
+        # (container, key) pairs from the root down to the owning leaf; None once evicted
+        self.path: Optional[List[Tuple[Dict, Any]]] = None
+
+    def similarity(self, tokens: List[str]):
+        """Fraction of matching tokens and number of wildcards (Drain's seqDist)"""
+        same = wildcards = 0
+        for template_token, token in zip(self.tokens, tokens):
+            if template_token == WILDCARD:
+                wildcards += 1
+            elif template_token == token:
+                same += 1
+        return same / len(tokens), wildcards
+
+    def merge(self, tokens: List[str]) -> bool:
+        """Generalise positions that differ; returns True if the template changed"""
+        changed = False
+        for i, (template_token, token) in enumerate(zip(self.tokens, tokens)):
+            if template_token != token and template_token != WILDCARD:
+                self.tokens[i] = WILDCARD
+                changed = True
+        if changed:
+            self.template = ' '.join(self.tokens)
+        return changed
+
+    def __repr__(self) -> str:
+        return f"LogTemplate({self.template_id:016x}, {self.template!r}, size={self.size})"
+
+
+class _Node:
+    __slots__ = ('children', 'templates')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.templates: List[LogTemplate] = []
+
+
+class LogTemplateMiner:
+    """Online Drain template miner with a cache of already-seen masked lines
+
+    ``depth`` counts the token-length level and the leaf, so ``depth - 2``
+    leading tokens are used for routing. Tokens containing digits never
+    become routing keys (they go to the wildcard child), and once a node
+    has ``max_children`` children further tokens share the wildcard child.
+    At most ``max_templates`` templates are kept, least recently used first
+    out.
+    """
+
+    def __init__(self, depth: int = 4, similarity_threshold: float = 0.4,
+                 max_children: int = 100, cache_size: int = 100000, max_templates: int = 20000):
+        if depth < 3:
+            raise ValueError("depth must be at least 3")
+        self.prefix_depth = depth - 2
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.cache_size = cache_size
+        self.max_templates = max_templates
+        self._root: Dict[int, _Node] = {}
+        self._cache: 'OrderedDict[str, LogTemplate]' = OrderedDict()
+        self._templates: 'OrderedDict[LogTemplate, None]' = OrderedDict()
+        self.stats = {"messages": 0, "cache_hits": 0, "templates_created": 0, "templates_changed": 0,
+                      "templates_evicted": 0}
+
+    @property
+    def templates(self) -> List[LogTemplate]:
+        return list(self._templates)
+
+    def add(self, message: str) -> LogTemplate:
+        """Mine ``message`` and return the template it belongs to"""
+        self.stats["messages"] += 1
+        masked = mask(message.strip())
+        cached = self._cache.get(masked)
+        if cached is not None and cached.path is not None:
+            self._cache.move_to_end(masked)
+            self._templates.move_to_end(cached)
+            self.stats["cache_hits"] += 1
+            cached.size += 1
+            return cached
+
+        tokens = masked.split()
+        path: List[Tuple[Dict, Any]] = []
+        leaf = self._leaf(tokens, create=True, path=path)
+        template = self._best_match(leaf.templates, tokens)
+        if template is None:
+            template = LogTemplate(tokens, self._new_template_id(leaf, tokens, masked))
+            template.path = path
+            leaf.templates.append(template)
+            self._templates[template] = None
+            self.stats["templates_created"] += 1
+            if len(self._templates) > self.max_templates:
+                self._evict()
+        else:
+            self._templates.move_to_end(template)
+            if template.merge(tokens):
+                self.stats["templates_changed"] += 1
+        template.size += 1
+
+        self._cache[masked] = template
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return template
+
+    def _route(self, tokens: List[str]) -> str:
+        """Token count and routing keys of ``tokens``, independent of what the tree has seen"""
+        keys = (WILDCARD if any(c.isdigit() for c in token) else token for token in tokens[:self.prefix_depth])
+        return ' '.join((str(len(tokens)), *keys))
+
+    def _new_template_id(self, leaf: _Node, tokens: List[str], masked: str) -> int:
+        route = self._route(tokens)
+        new_id = template_id(route)
+        if any(template.template_id == new_id for template in leaf.templates):
+            # A dissimilar template on the same route already holds the route's ID
+            new_id = template_id(f"{route}\n{masked}")
+        return new_id
+
+    def _evict(self):
+        """Drop the least recently used template and prune its empty branch"""
+        template, _ = self._templates.popitem(last=False)
+        path, template.path = template.path, None
+        container, key = path[-1]
+        container[key].templates.remove(template)
+        for container, key in reversed(path):
+            node = container[key]
+            if node.templates or node.children:
+                break
+            del container[key]
+        self.stats["templates_evicted"] += 1
+
+    def match(self, message: str) -> Optional[LogTemplate]:
+        """Return the existing template for ``message`` without learning from it"""
+        masked = mask(message.strip())
+        cached = self._cache.get(masked)
+        if cached is not None and cached.path is not None:
+            return cached
+        tokens = masked.split()
+        leaf = self._leaf(tokens, create=False)
+        return self._best_match(leaf.templates, tokens) if leaf is not None else None
+
+    def _leaf(self, tokens: List[str], create: bool,
+              path: Optional[List[Tuple[Dict, Any]]] = None) -> Optional[_Node]:
+        node = self._root.get(len(tokens))
+        if node is None:
+            if not create:
+                return None
+            node = self._root[len(tokens)] = _Node()
+        if path is not None:
+            path.append((self._root, len(tokens)))
+        for token in tokens[:self.prefix_depth]:
+            key = WILDCARD if any(c.isdigit() for c in token) else token
+            child = node.children.get(key)
+            if child is None:
+                if not create:
+                    child = node.children.get(WILDCARD)
+                    if child is None:
+                        return None
+                else:
+                    if len(node.children) >= self.max_children:
+                        key = WILDCARD
+                    child = node.children.setdefault(key, _Node())
+            if path is not None:
+                path.append((node.children, key))
+            node = child
+        return node
+
+    def _best_match(self, templates: List[LogTemplate], tokens: List[str]) -> Optional[LogTemplate]:
+        if not tokens:
+            return templates[0] if templates else None
+        best, best_score = None, (-1.0, -1)
+        for template in templates:
+            score = template.similarity(tokens)
+            if score > best_score:
+                best, best_score = template, score
+        if best is not None and best_score[0] >= self.similarity_threshold:
+            return best
+        return None
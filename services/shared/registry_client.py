@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+AIOps NAAS - Shared Device Registry Client
+
+Cached async client for hostname -> ship_id/device_id lookups against the
+device-registry service, shared by every service that resolves hosts:
+
+- found mappings are cached for ``ttl`` seconds and unknown hosts (404) or
+  failed lookups for the shorter ``negative_ttl``, in one LRU bounded to
+  ``cache_size`` hostnames, so an unregistered host costs one request per
+  ``negative_ttl`` instead of one per message
+- concurrent lookups of the same hostname share one request
+- ``lookup_hostnames`` resolves all cache misses with ``POST /lookup/bulk``
+- the registry publishes the identifiers of every registered device on
+  ``device_registry.updated``; ``subscribe_invalidations`` drops those
+  entries so (re-)registrations are picked up immediately
+
+This module only depends on httpx and is copied into each service image
+from services/shared.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_SUBJECT = "device_registry.updated"
+
+# Hostnames that never resolve and are not worth a request
+_UNRESOLVABLE = frozenset(('', 'unknown', 'localhost'))
+
+
+class DeviceRegistryClient:
+    """Client for querying the Device Registry service for ship_id/device_id mappings"""
+
+    def __init__(self, base_url: str = "http://device-registry:8080", timeout: float = 5.0,
+                 cache_size: int = 50000, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 bulk_size: int = 500, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.bulk_size = bulk_size
+        self.session = httpx.AsyncClient(base_url=self.base_url, timeout=timeout, transport=transport)
+        self._clock = clock
+        self._cache: 'OrderedDict[str, tuple]' = OrderedDict()  # hostname -> (expires_at, mapping or None)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "lookups": 0,
+            "cache_hits": 0,
+            "negative_hits": 0,
+            "coalesced": 0,
+            "requests": 0,
+            "bulk_requests": 0,
+            "errors": 0,
+            "invalidations": 0,
+        }
+
+    @classmethod
+    def from_env(cls, **overrides) -> 'DeviceRegistryClient':
+        """Build a client from the DEVICE_REGISTRY_URL / REGISTRY_* environment variables"""
+        config = dict(
+            base_url=os.getenv('DEVICE_REGISTRY_URL', 'http://device-registry:8080'),
+            timeout=float(os.getenv('REGISTRY_TIMEOUT_SECONDS', '5')),
+            cache_size=int(os.getenv('REGISTRY_CACHE_SIZE', '50000')),
+            ttl=float(os.getenv('REGISTRY_CACHE_TTL_SECONDS', '300')),
+            negative_ttl=float(os.getenv('REGISTRY_NEGATIVE_TTL_SECONDS', '30')),
+        )
+        config.update(overrides)
+        return cls(**config)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "cache_entries": len(self._cache), "inflight": len(self._inflight)}
+
+    async def lookup_hostname(self, hostname: str) -> Optional[Dict[str, Any]]:
+        """Lookup ship_id and device info by hostname or IP address with caching"""
+        if not hostname or hostname in _UNRESOLVABLE:
+            return None
+        self.stats["lookups"] += 1
+
+        hit, mapping = self._cache_get(hostname)
+        if hit:
+            return mapping
+
+        future = self._inflight.get(hostname)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = self._start([hostname])[hostname]
+        return await asyncio.shield(future)
+
+    async def lookup_hostnames(self, hostnames: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Resolve many hostnames, fetching every cache miss in bulk requests"""
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        misses: List[str] = []
+        for hostname in dict.fromkeys(hostnames):
+            if not hostname or hostname in _UNRESOLVABLE:
+                results[hostname] = None
+                continue
+            self.stats["lookups"] += 1
+            hit, mapping = self._cache_get(hostname)
+            if hit:
+                results[hostname] = mapping
+            elif hostname in self._inflight:
+                self.stats["coalesced"] += 1
+                waiting[hostname] = self._inflight[hostname]
+            else:
+                misses.append(hostname)
+
+        if misses:
+            waiting.update(self._start(misses))
+        for hostname, future in waiting.items():
+            results[hostname] = await asyncio.shield(future)
+        return results
+
+    def _start(self, hostnames: List[str]) -> Dict[str, asyncio.Future]:
+        """Register in-flight futures for ``hostnames`` and fetch them in the background"""
+        loop = asyncio.get_running_loop()
+        futures = {hostname: loop.create_future() for hostname in hostnames}
+        self._inflight.update(futures)
+        if len(hostnames) == 1:
+            asyncio.ensure_future(self._resolve(futures, self._fetch_one(hostnames[0])))
+        else:
+            for i in range(0, len(hostnames), self.bulk_size):
+                chunk = hostnames[i:i + self.bulk_size]
+                asyncio.ensure_future(self._resolve({h: futures[h] for h in chunk}, self._fetch_bulk(chunk)))
+        return futures
+
+    async def _resolve(self, futures: Dict[str, asyncio.Future], fetch):
+        try:
+            mappings = await fetch
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Registry lookup error for {', '.join(list(futures)[:5])}: {e}")
+            mappings = {}
+        for hostname, future in futures.items():
+            mapping = mappings.get(hostname)
+            # Cache only if nothing invalidated the hostname while the request was out
+            if self._inflight.get(hostname) is future:
+                del self._inflight[hostname]
+                self._cache_put(hostname, mapping)
+            if not future.done():
+                future.set_result(mapping)
+
+    async def _fetch_one(self, hostname: str) -> Dict[str, Dict[str, Any]]:
+        self.stats["requests"] += 1
+        response = await self.session.get(f"/lookup/{hostname}")
+        if response.status_code == 404:
+            logger.debug(f"Hostname {hostname} not found in registry")
+            return {}
+        response.raise_for_status()
+        mapping = response.json().get('mapping')
+        return {hostname: mapping} if mapping else {}
+
+    async def _fetch_bulk(self, hostnames: List[str]) -> Dict[str, Dict[str, Any]]:
+        self.stats["bulk_requests"] += 1
+        response = await self.session.post("/lookup/bulk", json={"hostnames": hostnames})
+        response.raise_for_status()
+        return response.json().get('mappings', {})
+
+    def _cache_get(self, hostname: str):
+        """Return (hit, mapping); a hit with mapping None is a cached miss"""
+        entry = self._cache.get(hostname)
+        if entry is None:
+            return False, None
+        expires_at, mapping = entry
+        if expires_at <= self._clock():
+            del self._cache[hostname]
+            return False, None
+        self._cache.move_to_end(hostname)
+        self.stats["cache_hits" if mapping is not None else "negative_hits"] += 1
+        return True, mapping
+
+    def _cache_put(self, hostname: str, mapping: Optional[Dict[str, Any]]):
+        ttl = self.ttl if mapping is not None else self.negative_ttl
+        self._cache[hostname] = (self._clock() + ttl, mapping)
+        self._cache.move_to_end(hostname)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, hostnames: Optional[Iterable[str]] = None):
+        """Drop cached entries for ``hostnames``, or the whole cache if None"""
+        self.stats["invalidations"] += 1
+        if hostnames is None:
+            self._cache.clear()
+            self._inflight.clear()
+            return
+        for hostname in hostnames:
+            self._cache.pop(hostname, None)
+            self._inflight.pop(hostname, None)
+
+    async def subscribe_invalidations(self, nats_client, subject: str = INVALIDATION_SUBJECT):
+        """Invalidate entries named in registry update events published on NATS"""
+        async def handler(msg):
+            try:
+                hostnames = json.loads(msg.data.decode()).get('hostnames')
+            except (ValueError, AttributeError):
+                hostnames = None
+            self.invalidate(hostnames)
+            logger.debug(f"Registry cache invalidated for {hostnames if hostnames is not None else 'all hostnames'}")
+
+        await nats_client.subscribe(subject, cb=handler)
+
+    async def health_check(self) -> bool:
+        """Check if Device Registry service is healthy"""
+        try:
+            response = await self.session.get("/health")
+            return response.status_code == 200
+        except Exception:
+            return False
+
+    async def close(self):
+        await self.session.aclose()
@@ -12,6 +12,8 @@ from collections import defaultdict
 import json
 import hashlib
 
+from log_templates import LogTemplateMiner
+
 from .incident_analyzer import IncidentTimeline, RootCauseAnalysis, RootCauseCategory
 
 
@@ -22,6 +24,7 @@ class PatternType(Enum):
     ROOT_CAUSE = "root_cause"  # Root cause patterns
     REMEDIATION = "remediation"  # Remediation effectiveness patterns
     ENVIRONMENTAL = "environmental"  # Environmental factor patterns
+    LOG_TEMPLATE = "log_template"  # Recurring error log templates
 
 
 class LearningType(Enum):
@@ -72,6 +75,7 @@ class PatternRecognizer:
         self.min_pattern_confidence = min_pattern_confidence
         self.known_patterns: Dict[str, IncidentPattern] = {}
         self.learning_history: List[LearningPattern] = []
+        self.log_templates = LogTemplateMiner()
     
     def analyze_incidents(self, incidents_data: List[Dict[str, Any]]) -> List[IncidentPattern]:
         """Analyze multiple incidents to identify patterns"""
@@ -93,6 +97,9 @@ class PatternRecognizer:
         # Analyze environmental patterns
         patterns.extend(self._analyze_environmental_patterns(incidents_data))
         
+        # Analyze recurring log templates
+        patterns.extend(self._analyze_log_template_patterns(incidents_data))
+        
         # Filter patterns by minimum frequency and confidence
         filtered_patterns = [
             p for p in patterns 
@@ -360,6 +367,44 @@ class PatternRecognizer:
         
         return patterns
     
+    def _analyze_log_template_patterns(self, incidents_data: List[Dict[str, Any]]) -> List[IncidentPattern]:
+        """Analyze incidents that share the same mined log template"""
+        patterns = []
+        
+        # Group incidents by the templates of their log messages (each template counted once per incident)
+        template_incidents = defaultdict(list)
+        for incident in incidents_data:
+            if not incident.get("start_time"):
+                continue
+            messages = list(incident.get("log_messages", []))
+            if incident.get("log_message"):
+                messages.append(incident["log_message"])
+            templates = {id(t): t for t in (self.log_templates.add(m) for m in messages if isinstance(m, str) and m)}
+            for template in templates.values():
+                template_incidents[template].append(incident)
+        
+        # Find recurring error templates
+        for template, tpl_incidents in template_incidents.items():
+            if len(tpl_incidents) >= self.min_pattern_frequency:
+                pattern = IncidentPattern(
+                    pattern_id=f"log_template_{template.template_id:016x}",
+                    pattern_type=PatternType.LOG_TEMPLATE,
+                    description=f"Recurring log pattern across incidents: {template.template}",
+                    frequency=len(tpl_incidents),
+                    confidence=min(len(tpl_incidents) / 5.0, 1.0),
+                    first_seen=min(datetime.fromisoformat(inc["start_time"]) for inc in tpl_incidents),
+                    last_seen=max(datetime.fromisoformat(inc["start_time"]) for inc in tpl_incidents),
+                    affected_systems={system for inc in tpl_incidents for system in inc.get("affected_systems", [])},
+                    metadata={
+                        "log_template": template.template,
+                        "log_template_id": template.template_id,
+                        "incidents": [inc.get("incident_id") for inc in tpl_incidents]
+                    }
+                )
+                patterns.append(pattern)
+        
+        return patterns
+    
     def extract_learning_insights(self, patterns: List[IncidentPattern], 
                                  remediation_history: Optional[Dict[str, Any]] = None) -> List[LearningPattern]:
         """Extract learning insights from identified patterns"""
@@ -492,6 +537,21 @@ class PatternRecognizer:
                 )
                 learnings.append(learning)
         
+        elif pattern.pattern_type == PatternType.LOG_TEMPLATE:
+            # The same error recurring across incidents is a candidate for a dedicated runbook
+            learning = LearningPattern(
+                learning_id=f"learning_{pattern.pattern_id}",
+                learning_type=LearningType.NEW_SCENARIO,
+                source_pattern=pattern.pattern_id,
+                description=f"Log pattern recurs across {pattern.frequency} incidents: {pattern.metadata['log_template']}",
+                confidence=pattern.confidence,
+                recommendation="Add a detection rule and runbook keyed on this log template",
+                impact_assessment="Could shorten diagnosis for repeat incidents of this error",
+                implementation_priority="high" if pattern.frequency > 10 else "medium",
+                metadata={"log_template_id": pattern.metadata["log_template_id"]}
+            )
+            learnings.append(learning)
+        
         elif pattern.pattern_type == PatternType.ENVIRONMENTAL:
             # Environmental patterns suggest monitoring improvements
             factor = pattern.metadata.get("environmental_factor")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the non-blocking backend clients of the anomaly detection service
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/anomaly-detection'))
+
+from anomaly_service import VictoriaMetricsClient, ClickHouseClient, DeviceRegistryClient
+
+
+def mock_session(client, handler):
+    client.session = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_query_instant_parses_vector():
+    def handler(request):
+        assert request.url.path == "/api/v1/query"
+        assert request.url.params["query"] == "up"
+        return httpx.Response(200, json={
+            "status": "success",
+            "data": {"result": [{"metric": {"instance": "a"}, "value": [1700000000, "42.5"]}]}
+        })
+
+    client = VictoriaMetricsClient()
+    mock_session(client, handler)
+
+    assert await client.query_instant("up") == [{'metric': {'instance': 'a'}, 'value': 42.5, 'timestamp': 1700000000}]
+
+
+@pytest.mark.asyncio
+async def test_query_instant_swallows_backend_errors():
+    client = VictoriaMetricsClient()
+    mock_session(client, lambda request: httpx.Response(503))
+
+    assert await client.query_instant("up") == []
+    assert await client.health_check() is False
+
+
+@pytest.mark.asyncio
+async def test_registry_lookup_is_cached():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"mapping": {"ship_id": "ship-01", "device_id": "dev-1"}})
+
+    client = DeviceRegistryClient()
+    mock_session(client, handler)
+
+    assert (await client.lookup_hostname("bridge-01"))['ship_id'] == "ship-01"
+    assert (await client.lookup_hostname("bridge-01"))['device_id'] == "dev-1"
+    assert calls == ["/lookup/bridge-01"]
+
+
+@pytest.mark.asyncio
+async def test_clickhouse_queries_do_not_block_event_loop():
+    class SlowDriver:
+        def execute(self, query, params=None):
+            time.sleep(0.2)
+            return [(1,)]
+
+    client = ClickHouseClient(max_workers=2, health_timeout=0.05)
+    client._client = lambda: SlowDriver()
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    assert await client.health_check() is False  # times out instead of stalling the loop
+    task.cancel()
+    client.close()
+
+    assert ticks >= 3
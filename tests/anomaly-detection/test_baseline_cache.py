@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the historical baseline cache in the anomaly detection service
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/anomaly-detection'))
+
+from anomaly_service import BaselineCache
+
+
+class FakeLoader:
+    """Async loader that counts calls and can be made slow or failing"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self, key):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("clickhouse down")
+        return {'p95': 80.0 + self.calls, 'p99': 95.0, 'sample_count': 10}
+
+
+@pytest.mark.asyncio
+async def test_fresh_entries_are_served_from_memory():
+    loader = FakeLoader()
+    cache = BaselineCache(loader, refresh_interval=60, max_age=600)
+
+    first = await cache.get("cpu_usage")
+    second = await cache.get("cpu_usage")
+
+    assert first is second
+    assert loader.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    loader = FakeLoader(delay=0.05)
+    cache = BaselineCache(loader)
+
+    results = await asyncio.gather(*(cache.get("memory_usage") for _ in range(10)))
+
+    assert loader.calls == 1
+    assert all(r == results[0] for r in results)
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_served_while_refreshing():
+    loader = FakeLoader(delay=0.05)
+    cache = BaselineCache(loader, refresh_interval=0, max_age=600)
+
+    first = await cache.get("disk_usage")
+    stale = await cache.get("disk_usage")  # returns immediately, refresh runs in background
+    assert stale == first
+    await asyncio.sleep(0.1)
+
+    assert loader.calls == 2
+    assert (await cache.get("disk_usage"))['p95'] == 82.0
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_last_good_value_until_max_age():
+    loader = FakeLoader()
+    cache = BaselineCache(loader, refresh_interval=0, max_age=600)
+    good = await cache.get("cpu_usage")
+
+    loader.fail = True
+    assert await cache.get("cpu_usage") == good
+    await asyncio.sleep(0.01)
+    assert cache.stats()['refresh_failures'] == 1
+
+    cache.max_age = 0
+    assert await cache.get("cpu_usage") == {}
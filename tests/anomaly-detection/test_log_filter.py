@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the precompiled log filter used by the logs.anomalous consumer
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/anomaly-detection'))
+
+from anomaly_service import AnomalyDetectionService, LogFilter, DEFAULT_LOG_FILTER_RULES
+
+RULES_FILE = os.path.join(os.path.dirname(__file__), '../../configs/log-filter-rules.yaml')
+
+
+def test_shipped_rules_file_matches_builtin_rules():
+    from_file = LogFilter.from_file(RULES_FILE)
+    builtin = LogFilter(DEFAULT_LOG_FILTER_RULES)
+    assert list(from_file.rule_hits) == list(builtin.rule_hits)
+    assert from_file.message_pattern.pattern == builtin.message_pattern.pattern
+
+
+def test_missing_rules_file_falls_back_to_builtin_rules(tmp_path):
+    log_filter = LogFilter.from_file(str(tmp_path / "missing.yaml"))
+    assert len(log_filter.rule_hits) == len(DEFAULT_LOG_FILTER_RULES)
+
+
+@pytest.mark.parametrize("level,severity,message,expected", [
+    ("INFO", "low", "Disk failure on sda", "non_critical_level"),
+    ("INFO", "high", "Disk failure on sda", None),
+    ("ERROR", "high", "Metric: cpu_usage = 93", "metric_report"),
+    ("ERROR", "high", "periodic HEALTH CHECK failed", "health_check"),
+    ("WARNING", "medium", "heartbeat missed from gps", "heartbeat"),
+    ("ERROR", "high", "Database connection refused", None),
+])
+def test_builtin_rules(level, severity, message, expected):
+    assert LogFilter(DEFAULT_LOG_FILTER_RULES).match(level, severity, message) == expected
+
+
+def test_conditional_pattern_rules_and_hit_counters():
+    log_filter = LogFilter([
+        {'name': 'debug_noise', 'levels': ['DEBUG']},
+        {'name': 'ntp_warning', 'levels': ['WARNING'], 'pattern': r'ntp drift \d+ms'},
+        {'name': 'keepalive', 'pattern': 'keepalive'},
+    ])
+
+    assert log_filter.match("WARNING", "medium", "NTP drift 12ms") == "ntp_warning"
+    assert log_filter.match("ERROR", "high", "NTP drift 12ms") is None
+    assert log_filter.match("ERROR", "high", "keepalive lost") == "keepalive"
+    assert log_filter.match("debug", "low", "anything") == "debug_noise"
+
+    stats = log_filter.stats()
+    assert stats['evaluated'] == 4 and stats['dropped'] == 3 and stats['passed'] == 1
+    assert stats['rule_hits'] == {'debug_noise': 1, 'ntp_warning': 1, 'keepalive': 1}
+
+
+def test_first_rule_in_file_order_wins():
+    log_filter = LogFilter([
+        {'name': 'vendor_noise', 'pattern': 'acme'},
+        {'name': 'critical_heartbeat', 'severities': ['critical'], 'pattern': 'heartbeat'},
+        {'name': 'heartbeat', 'pattern': 'heartbeat'},
+        {'name': 'info', 'levels': ['INFO']},
+    ])
+
+    # "heartbeat" is the leftmost match, but the earlier rule matches too
+    assert log_filter.match("INFO", "low", "heartbeat from acme sensor") == "vendor_noise"
+    assert log_filter.match("INFO", "critical", "heartbeat from gps") == "critical_heartbeat"
+    assert log_filter.match("INFO", "low", "heartbeat from gps") == "heartbeat"
+    assert log_filter.match("INFO", "low", "link up") == "info"
+    assert log_filter.stats()['rule_hits'] == {'vendor_noise': 1, 'critical_heartbeat': 1, 'heartbeat': 1, 'info': 1}
+
+
+@pytest.mark.parametrize("rules", [
+    [{'name': 'empty'}],
+    [{'name': 'a', 'pattern': 'x'}, {'name': 'a', 'pattern': 'y'}],
+    [{'name': 'backreference', 'pattern': r'(\w+) \1'}],
+    [{'name': 'named_group', 'pattern': r'(?P<word>\w+) repeated'}],
+    [{'name': 'group_conditional', 'levels': ['INFO'], 'pattern': r'(<)?\w+(?(1)>)'}],
+])
+def test_invalid_rules_are_rejected(rules):
+    with pytest.raises(ValueError):
+        LogFilter(rules)
+
+
+class FakeMsg:
+    def __init__(self, payload):
+        self.data = json.dumps(payload).encode()
+
+
+@pytest.mark.asyncio
+async def test_process_anomalous_log_filters_before_publishing(capsys):
+    service = AnomalyDetectionService()
+    service.log_filter = LogFilter(DEFAULT_LOG_FILTER_RULES)
+    published = []
+
+    async def publish(event):
+        published.append(event)
+    service.publish_anomaly = publish
+
+    async def ship_id(log_data):
+        return "dhruv-ship"
+    service._extract_ship_id = ship_id
+    service._extract_device_id = ship_id
+
+    await service.process_anomalous_log(FakeMsg({"level": "INFO", "anomaly_severity": "low", "message": "boot"}))
+    await service.process_anomalous_log(FakeMsg({"level": "ERROR", "message": "Heartbeat received"}))
+    await service.process_anomalous_log(FakeMsg({"level": "ERROR", "message": "Disk failure on sda"}))
+
+    assert [e.metadata["log_message"] for e in published] == ["Disk failure on sda"]
+    assert service.log_filter.stats()['rule_hits']['non_critical_level'] == 1
+    assert service.log_filter.stats()['rule_hits']['heartbeat'] == 1
+    assert capsys.readouterr().out == ""
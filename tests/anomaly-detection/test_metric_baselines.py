@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Unit tests for reading metric baselines from the hourly rollup
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/anomaly-detection'))
+
+from anomaly_service import ClickHouseClient
+
+
+class ScriptedClickHouse(ClickHouseClient):
+    """ClickHouseClient whose queries return canned rollup and raw-scan rows"""
+
+    def __init__(self, rollup_rows, raw_rows):
+        super().__init__(max_workers=1)
+        self.rollup_rows = rollup_rows
+        self.raw_rows = raw_rows
+        self.queries = []
+
+    async def execute(self, query, params=None, timeout=None):
+        table = "rollup" if "metric_baselines_hourly" in query else "raw"
+        self.queries.append(table)
+        return self.rollup_rows if table == "rollup" else self.raw_rows
+
+
+@pytest.mark.asyncio
+async def test_rollup_rows_are_used_when_populated():
+    client = ScriptedClickHouse([(50.0, [48.0, 80.0, 95.0], 120)], [])
+
+    baseline = await client.query_metric_baselines("cpu_usage")
+
+    assert baseline == {'avg': 50.0, 'median': 48.0, 'p95': 80.0, 'p99': 95.0, 'sample_count': 120}
+    assert client.queries == ["rollup"]
+
+
+@pytest.mark.parametrize("rollup_rows", [[], [(None, [], 0)], [(None, None, None)]])
+@pytest.mark.asyncio
+async def test_empty_rollup_falls_back_to_raw_scan(rollup_rows):
+    client = ScriptedClickHouse(rollup_rows, [(40.0, 38.0, 70.0, 90.0, 3000)])
+
+    baseline = await client.query_metric_baselines("cpu_usage")
+
+    assert baseline['p95'] == 70.0 and baseline['sample_count'] == 3000
+    assert client.queries == ["rollup", "raw"]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the concurrent per-tick query fan-out of the anomaly detection service
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/anomaly-detection'))
+
+from anomaly_service import AnomalyDetectionService, MetricQuery, samples_by_timestamp
+
+
+class FakeVictoriaMetrics:
+    def __init__(self, delay, series):
+        self.delay = delay
+        self.series = series
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.range_calls = []
+
+    async def query_instant(self, query):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        return [{'metric': {'instance': f'host-{i}'}, 'value': 99.0, 'timestamp': 0} for i in range(self.series)]
+
+    async def query_range(self, query, start, end, step):
+        self.range_calls.append((query, start, end, step))
+        first = int(start // step + 1) * step
+        return [
+            {'metric': {'instance': f'host-{i}'}, 'values': [(ts, 10.0 + i) for ts in range(int(first), int(end) + 1, int(step))]}
+            for i in range(self.series)
+        ]
+
+
+class FakeClickHouse:
+    def __init__(self):
+        self.calls = []
+
+    async def get_correlation_patterns(self, anomaly):
+        self.calls.append(('correlation', anomaly['metric_name']))
+        await asyncio.sleep(0.01)
+        return [{'message': 'previous spike'}]
+
+    async def get_incident_resolution_history(self, anomaly_type):
+        self.calls.append(('resolution', anomaly_type))
+        await asyncio.sleep(0.01)
+        return []
+
+
+@pytest.fixture
+def service():
+    svc = AnomalyDetectionService()
+    svc.metric_queries = [MetricQuery(name=f"cpu_usage_{i}", query=f"q{i}", threshold=0.5) for i in range(6)]
+    svc.vm_client = FakeVictoriaMetrics(delay=0.1, series=5)
+    svc.clickhouse_client = FakeClickHouse()
+    svc.published = []
+
+    async def no_baselines(name):
+        return {}
+
+    async def publish(event):
+        svc.published.append(event)
+
+    svc.baseline_cache.get = no_baselines
+    svc.publish_anomaly = publish
+    return svc
+
+
+@pytest.mark.asyncio
+async def test_queries_run_concurrently_under_limit(service):
+    service.query_semaphore = asyncio.Semaphore(3)
+
+    await service.process_metrics()
+
+    assert service.vm_client.max_in_flight == 3
+    # Six 100ms queries with three at a time take two rounds, not six
+    assert service.tick_stats["last_duration_seconds"] < 0.45
+    assert set(service.tick_stats["query_durations_seconds"]) == {q.name for q in service.metric_queries}
+
+
+@pytest.mark.asyncio
+async def test_enrichment_is_coalesced_per_metric(service):
+    # Fill the windows, then spike every series so all of them fire in the same tick
+    service.vm_client.delay = 0
+    for metric_query in service.metric_queries:
+        for _ in range(10):
+            service.detectors.update_and_detect_batch(
+                metric_query.name, [{'instance': f'host-{i}'} for i in range(5)], [10.0] * 5
+            )
+
+    await service.process_metrics()
+
+    assert len(service.published) == 30
+    assert len(service.clickhouse_client.calls) == 12  # one of each lookup per metric
+    assert service.tick_stats["enrichment_requests"] == 60
+    assert service.tick_stats["enrichment_calls"] == 12
+    assert service.published[0].metadata["correlation_patterns_count"] == 1
+
+
+def test_samples_by_timestamp_orders_columns():
+    series = [
+        {'metric': {'instance': 'a'}, 'values': [(20, 2.0), (10, 1.0)]},
+        {'metric': {'instance': 'b'}, 'values': [(20, 5.0)]},
+    ]
+    columns = samples_by_timestamp(series)
+
+    assert [[r['value'] for r in column] for column in columns] == [[1.0], [2.0, 5.0]]
+    assert columns[1][1] == {'metric': {'instance': 'b'}, 'value': 5.0, 'timestamp': 20}
+
+
+@pytest.mark.asyncio
+async def test_warm_up_fills_windows_with_one_request_per_query(service):
+    service.query_step = 10.0
+
+    await service.warm_up_detectors()
+
+    assert len(service.vm_client.range_calls) == len(service.metric_queries)
+    matrix = service.detectors.series_matrices["cpu_usage_0"]
+    assert len(matrix) == 5
+    assert matrix.count[list(matrix.rows.values())].tolist() == [service.detectors.window_size] * 5
+    assert service.published == []
+
+
+@pytest.mark.asyncio
+async def test_steady_state_fetches_only_the_delta(service):
+    service.query_step = 10.0
+    metric_query = service.metric_queries[0]
+
+    last_seen = time.time() - 25
+    service.last_sample_time[metric_query.name] = last_seen
+    columns = await service._fetch_new_samples(metric_query)
+    _, start, _, _ = service.vm_client.range_calls[-1]
+
+    assert start == last_seen + 10
+    assert 1 <= len(columns) <= 3
+    assert service.last_sample_time[metric_query.name] == columns[-1][0]['timestamp']
+
+    # Nothing new is due until another step has elapsed
+    service.last_sample_time[metric_query.name] = time.time()
+    calls = len(service.vm_client.range_calls)
+    assert await service._fetch_new_samples(metric_query) == []
+    assert len(service.vm_client.range_calls) == calls
+    assert service.tick_stats["skipped_queries"] == 1
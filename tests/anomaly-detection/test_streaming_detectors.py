@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the incremental detectors in the anomaly detection service
+"""
+
+import os
+import sys
+import random
+import statistics
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/anomaly-detection'))
+
+from anomaly_service import SortedWindow, SimpleAnomalyDetectors, SeriesWindowMatrix, series_key
+
+
+class TestSortedWindow:
+    """Order statistics must match a full recomputation over the window"""
+
+    def test_median_and_mad_match_window(self):
+        rng = random.Random(42)
+        window = SortedWindow()
+        samples = []
+
+        for _ in range(300):
+            value = round(rng.gauss(50, 10), 1)  # rounding produces duplicate values
+            window.add(value)
+            samples.append(value)
+            if len(samples) > 7:
+                window.remove(samples[-8])
+
+            current = samples[-7:]
+            assert len(window) == len(current)
+            median = statistics.median(current)
+            assert window.median() == pytest.approx(median)
+            assert window.mad(median) == pytest.approx(statistics.median([abs(x - median) for x in current]))
+
+
+class TestSeriesWindowMatrix:
+    """Running state must match a full recomputation over each window"""
+
+    @pytest.mark.parametrize("window_size", [1, 2, 7, 50])
+    def test_statistics_match_window(self, window_size):
+        rng = random.Random(42)
+        matrix = SeriesWindowMatrix(window_size)
+        samples = []
+
+        for _ in range(300):
+            value = round(rng.gauss(50, 10), 1)
+            matrix.score_and_update(["s"], np.array([value]), threshold=100.0)
+            samples.append(value)
+            window = samples[-window_size:]
+
+            assert matrix.count[0] == len(window)
+            assert matrix.mean[0] == pytest.approx(statistics.mean(window))
+            if len(window) > 1:
+                assert matrix.m2[0] / (len(window) - 1) == pytest.approx(statistics.variance(window),
+                                                                         rel=1e-6, abs=1e-9)
+            assert np.nanmean(matrix.recent[0]) == pytest.approx(statistics.mean(samples[-10:]))
+
+    def test_ewma_is_persistent(self):
+        matrix = SeriesWindowMatrix(window_size=10, ewma_alpha=0.5)
+        for value in (10.0, 20.0, 30.0):
+            matrix.score_and_update(["s"], np.array([value]), threshold=100.0)
+        assert matrix.ewma[0] == pytest.approx(22.5)
+
+    @pytest.mark.parametrize("window_size", [3, 12, 50])
+    def test_sorted_windows_match_partitioned_median(self, window_size):
+        rng = random.Random(3)
+        partitioned = SeriesWindowMatrix(window_size, max_series=8, initial_rows=2)
+        ordered = SeriesWindowMatrix(window_size, max_series=8, initial_rows=2, order_stats_min_window=1)
+        assert partitioned.sorted_windows is None
+
+        for tick in range(120):
+            # Rotating key sets exercise row growth, LRU reuse and partially filled windows
+            keys = [f"host-{(tick // 40 + i) % 12}" for i in range(8)]
+            values = np.array([round(rng.gauss(60, 5), 1) if rng.random() > 0.05 else 99.0 for _ in keys])
+            expected = partitioned.score_and_update(keys, values, threshold=85.0)
+            scores = ordered.score_and_update(keys, values, threshold=85.0)
+            for name, score in expected.items():
+                np.testing.assert_allclose(scores[name], score, atol=1e-9, err_msg=f"{tick} {name}")
+
+        for key, row in ordered.rows.items():
+            assert len(ordered.sorted_windows[row]) == ordered.count[row]
+
+
+class TestSimpleAnomalyDetectors:
+    """Detector scores on top of the incremental state"""
+
+    def test_no_scores_without_history(self):
+        detectors = SimpleAnomalyDetectors()
+        scores = detectors.update_and_detect("cpu_usage", 50.0)
+        assert scores == {'zscore': 0.0, 'ewma': 0.0, 'mad': 0.0, 'threshold': 0.0}
+
+    def test_spike_is_detected(self):
+        detectors = SimpleAnomalyDetectors()
+        rng = random.Random(7)
+        for _ in range(50):
+            detectors.update_and_detect("cpu_usage", 40.0 + rng.uniform(-2, 2))
+
+        scores = detectors.update_and_detect("cpu_usage", 99.0)
+        assert scores['zscore'] == 1.0
+        assert scores['mad'] == 1.0
+        assert scores['ewma'] > 0.5
+        assert scores['threshold'] > 0.9
+
+    def test_large_window(self):
+        detectors = SimpleAnomalyDetectors(window_size=5000)
+        for i in range(6000):
+            detectors.update_and_detect("memory_usage", float(i % 100))
+        matrix = detectors.series_matrices["memory_usage"]
+        assert matrix.count[0] == 5000
+        assert len(matrix.sorted_windows[0]) == 5000
+        assert detectors.update_and_detect("memory_usage", 49.5)['mad'] == 0.0  # window median
+
+    def test_series_are_keyed_by_labels(self):
+        detectors = SimpleAnomalyDetectors()
+        for _ in range(20):
+            detectors.update_and_detect("disk_usage", 10.0, {"instance": "a", "mountpoint": "/"})
+            detectors.update_and_detect("disk_usage", 80.0, {"mountpoint": "/", "instance": "b"})
+
+        assert series_key("disk_usage", {"mountpoint": "/", "instance": "a"}) == 'disk_usage{instance="a",mountpoint="/"}'
+        matrix = detectors.series_matrices["disk_usage"]
+        assert set(matrix.rows) == {
+            'disk_usage{instance="a",mountpoint="/"}',
+            'disk_usage{instance="b",mountpoint="/"}',
+        }
+        assert matrix.mean[matrix.rows['disk_usage{instance="a",mountpoint="/"}']] == 10.0
+
+    def test_max_series_evicts_least_recently_used(self):
+        detectors = SimpleAnomalyDetectors(max_series=2)
+        detectors.update_and_detect("cpu_usage", 1.0, {"host": "a"})
+        detectors.update_and_detect("cpu_usage", 1.0, {"host": "b"})
+        detectors.update_and_detect("cpu_usage", 1.0, {"host": "a"})
+        detectors.update_and_detect("cpu_usage", 1.0, {"host": "c"})
+
+        assert list(detectors.series_matrices["cpu_usage"].rows) == ['cpu_usage{host="a"}', 'cpu_usage{host="c"}']
+        assert detectors.evicted_series == 1
+
+    def test_idle_series_expire(self):
+        detectors = SimpleAnomalyDetectors(series_ttl=60)
+        detectors.update_and_detect("cpu_usage", 1.0, {"host": "a"})
+        detectors.update_and_detect("cpu_usage", 1.0, {"host": "b"})
+        matrix = detectors.series_matrices["cpu_usage"]
+        matrix.last_seen[matrix.rows['cpu_usage{host="a"}']] -= 120
+
+        assert detectors.evict_idle_series() == 1
+        assert list(matrix.rows) == ['cpu_usage{host="b"}']
+        assert detectors.tracked_series == 1
+
+
+class TestBatchDetection:
+    """The scalar entry point is a view over the vectorized batch path"""
+
+    def test_scalar_and_batch_share_state(self):
+        rng = random.Random(3)
+        scalar = SimpleAnomalyDetectors(window_size=12)
+        batch = SimpleAnomalyDetectors(window_size=12)
+        labels = [{"instance": f"host-{i}"} for i in range(20)]
+
+        for tick in range(60):
+            values = [round(rng.gauss(60 + i, 5), 1) if rng.random() > 0.05 else 99.0 for i in range(len(labels))]
+            batch_scores = batch.update_and_detect_batch("cpu_usage", labels, values)
+            for i, (series_labels, value) in enumerate(zip(labels, values)):
+                expected = scalar.update_and_detect("cpu_usage", value, series_labels)
+                for name, score in expected.items():
+                    assert batch_scores[name][i] == pytest.approx(score, abs=1e-9), (tick, i, name)
+
+        assert list(scalar.series_matrices) == ["cpu_usage"]
+        assert scalar.tracked_series == batch.tracked_series == 20
+
+    def test_new_series_join_existing_batch(self):
+        detectors = SimpleAnomalyDetectors()
+        for _ in range(15):
+            detectors.update_and_detect_batch("memory_usage", [{"host": "a"}], [50.0])
+        scores = detectors.update_and_detect_batch("memory_usage", [{"host": "a"}, {"host": "b"}], [95.0, 95.0])
+
+        assert scores['threshold'][0] == scores['threshold'][1] > 0
+        assert detectors.series_matrices["memory_usage"].count.tolist()[:2] == [16, 1]
+
+    def test_matrix_rows_are_reused_after_eviction(self):
+        matrix = SeriesWindowMatrix(window_size=10, max_series=4, initial_rows=2)
+        for i in range(10):
+            matrix.score_and_update([f"s{i}"], np.array([float(i)]), threshold=100.0)
+
+        assert len(matrix) == 4
+        assert matrix.capacity == 4
+        assert matrix.evicted_series == 6
+        assert list(matrix.rows) == ["s6", "s7", "s8", "s9"]
+        assert sorted(matrix.mean[list(matrix.rows.values())]) == [6.0, 7.0, 8.0, 9.0]
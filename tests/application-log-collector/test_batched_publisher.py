@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Unit tests for batched NDJSON publishing of application logs
+"""
+
+import os
+import sys
+import json
+import re
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/application-log-collector'))
+
+from app_log_collector import ApplicationLogCollector, BatchedLogPublisher, StandardizedLogEntry
+
+
+class FakeNats:
+    def __init__(self):
+        self.is_closed = False
+        self.published = []
+
+    async def publish(self, subject, payload):
+        self.published.append((subject, payload))
+
+    def messages(self, subject):
+        return [payload for s, payload in self.published if s == subject]
+
+
+def make_publisher(**options):
+    publisher = BatchedLogPublisher(**options)
+    publisher.nats_client = FakeNats()
+    return publisher, publisher.nats_client
+
+
+def record(n, level="INFO", application="nav", trace_id=None):
+    entry = {"timestamp": "2024-01-01T00:00:00", "level": level, "message": f"line {n}", "application": application}
+    if trace_id:
+        entry["trace_id"] = trace_id
+    return entry
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_one_ndjson_message_and_one_flow_event():
+    publisher, nats_client = make_publisher(max_batch_lines=3, flush_interval=60)
+
+    await publisher.publish(record(0, trace_id="t-1"))
+    await publisher.publish(record(1, level="ERROR"))
+    assert nats_client.published == []
+    await publisher.publish(record(2, application="engine"))
+
+    [batch] = nats_client.messages("logs.applications")
+    assert [json.loads(line)["message"] for line in batch.split(b"\n")] == ["line 0", "line 1", "line 2"]
+    [flow] = nats_client.messages("data.flow.application_logs")
+    flow = json.loads(flow)
+    assert flow["data_size"] == len(batch) + 1
+    assert flow["metadata"] == {
+        "log_count": 3,
+        "levels": {"INFO": 2, "ERROR": 1},
+        "applications": {"nav": 2, "engine": 1},
+        "trace_ids": ["t-1"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushes_after_interval():
+    publisher, nats_client = make_publisher(max_batch_lines=100, flush_interval=0.01)
+
+    for n in range(5):
+        await publisher.publish(record(n))
+    assert nats_client.published == []
+
+    await asyncio.sleep(0.05)
+    [batch] = nats_client.messages("logs.applications")
+    assert batch.count(b"\n") == 4
+    assert publisher.stats["batches"] == 1
+
+
+@pytest.mark.asyncio
+async def test_byte_threshold_flushes():
+    publisher, nats_client = make_publisher(max_batch_lines=1000, max_batch_bytes=200, flush_interval=60)
+
+    for n in range(10):
+        await publisher.publish(record(n))
+
+    assert len(nats_client.messages("logs.applications")) == 3
+    assert all(len(batch) <= 200 + 100 for batch in nats_client.messages("logs.applications"))
+
+
+@pytest.mark.asyncio
+async def test_disconnected_batches_are_counted_and_close_flushes():
+    publisher = BatchedLogPublisher(max_batch_lines=2, flush_interval=60)
+    await publisher.publish(record(0))
+    await publisher.publish(record(1))
+    assert publisher.stats["dropped_disconnected"] == 2
+
+    publisher.nats_client = FakeNats()
+    await publisher.publish(record(2))
+    await publisher.close()
+    assert len(publisher.nats_client.messages("logs.applications")) == 1
+    assert publisher.snapshot()["buffered_records"] == 0
+
+
+@pytest.mark.asyncio
+async def test_collector_envelope_omits_unset_fields_and_duplicate_raw_log():
+    collector = ApplicationLogCollector()
+    collector.publisher = BatchedLogPublisher(max_batch_lines=1)
+    collector.publisher.nats_client = nats_client = FakeNats()
+
+    entry = StandardizedLogEntry(timestamp=datetime(2024, 1, 1), level="INFO", message="plain line",
+                                 source="tcp_application", host="10.0.0.5", service="unknown",
+                                 application="tcp-app", thread="main", raw_log="plain line")
+    await collector.forward_log_to_pipeline(entry)
+    await collector.process_tcp_log("2024-01-01 12:00:00,123 ERROR [main] c.e.Nav: GPS lost", "10.0.0.5")
+
+    first, second = [json.loads(m) for m in nats_client.messages("logs.applications")]
+    assert first["thread"] == "main"
+    assert "raw_log" not in first and "trace_id" not in first
+    assert second["message"] == "GPS lost"
+    assert second["raw_log"] == "2024-01-01 12:00:00,123 ERROR [main] c.e.Nav: GPS lost"
+
+
+@pytest.mark.asyncio
+async def test_published_timestamps_are_utc_with_z_suffix():
+    collector = ApplicationLogCollector()
+    collector.publisher = BatchedLogPublisher(max_batch_lines=1)
+    collector.publisher.nats_client = nats_client = FakeNats()
+
+    entry = StandardizedLogEntry(timestamp=datetime(2024, 1, 1, 14, 30, tzinfo=timezone.utc).astimezone(),
+                                 level="INFO", message="m", source="tcp_application", host="h",
+                                 service="s", application="a")
+    await collector.forward_log_to_pipeline(entry)
+    await collector.process_tcp_log("plain line", "10.0.0.5")
+
+    first, second = [json.loads(m) for m in nats_client.messages("logs.applications")]
+    # Vector's app_logs_for_logs remap parses "%Y-%m-%dT%H:%M:%S%.fZ"
+    assert first["timestamp"] == "2024-01-01T14:30:00.000Z"
+    assert re.fullmatch(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z", second["timestamp"])
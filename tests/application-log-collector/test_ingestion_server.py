@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the asyncio TCP/UDP log ingestion server
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/application-log-collector'))
+
+from app_log_collector import ApplicationLogCollector, LineFramer, LogIngestionServer
+
+
+def test_newline_framing_across_reads():
+    framer = LineFramer()
+
+    assert framer.feed(b'first\nsec') == [b'first']
+    assert framer.feed(b'ond\n\nthird') == [b'second', b'']
+    assert framer.flush() == [b'third']
+
+
+def test_octet_counted_frames_mixed_with_newlines():
+    framer = LineFramer(octet_counting=True)
+
+    frames = framer.feed(b'11 <34>1 hello{"a": 1}\n2')
+    frames += framer.feed(b'0 multi\nline message')
+    frames += framer.feed(b'!!plain text\n')
+
+    assert frames == [b'<34>1 hello', b'{"a": 1}', b'multi\nline message!!', b'plain text']
+
+
+def test_oversized_lines_are_skipped():
+    framer = LineFramer(octet_counting=True, max_line_bytes=8)
+
+    frames = framer.feed(b'short\n' + b'x' * 20)
+    frames += framer.feed(b'yyy\nok\n12 ')
+    frames += framer.feed(b'abcdefghijkl4 fine')
+
+    assert frames == [b'short', b'ok', b'fine']
+    assert framer.oversized == 2
+
+
+class Recorder:
+    def __init__(self, release=None):
+        self.lines = []
+        self.release = release
+
+    async def __call__(self, line, client_ip, transport):
+        if self.release is not None:
+            await self.release.wait()
+        self.lines.append((line, transport))
+
+
+async def wait_for(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_tcp_and_udp_lines_reach_handler():
+    handler = Recorder()
+    server = LogIngestionServer(handler, host='127.0.0.1', tcp_port=0, udp_port=0, workers=2)
+    await server.start()
+    try:
+        _, writer = await asyncio.open_connection('127.0.0.1', server.tcp_port)
+        writer.write(b'{"message": "one"}\n{"message": "two"}\nthree')
+        await writer.drain()
+        writer.close()
+
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=('127.0.0.1', server.udp_port))
+        transport.sendto(b'udp line\n')
+        transport.close()
+
+        await wait_for(lambda: len(handler.lines) == 4)
+        assert sorted(handler.lines) == [('three', 'tcp'), ('udp line', 'udp'),
+                                         ('{"message": "one"}', 'tcp'), ('{"message": "two"}', 'tcp')]
+        assert server.stats['connections_total'] == 1
+        assert server.stats['udp_datagrams'] == 1
+    finally:
+        await server.stop()
+    assert not server.running
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure_without_losing_tcp_lines():
+    release = asyncio.Event()
+    handler = Recorder(release)
+    server = LogIngestionServer(handler, host='127.0.0.1', tcp_port=0, udp_port=None, queue_size=5, workers=1)
+    await server.start()
+    try:
+        _, writer = await asyncio.open_connection('127.0.0.1', server.tcp_port)
+        writer.write(b''.join(b'line %d\n' % i for i in range(100)))
+        await writer.drain()
+
+        await wait_for(lambda: server.stats['backpressure_waits'] > 0)
+        assert server.queue.qsize() <= 5
+        assert server.stats['lines_received'] < 100
+
+        release.set()
+        await wait_for(lambda: len(handler.lines) == 100)
+        assert [line for line, _ in handler.lines] == [f'line {i}' for i in range(100)]
+        writer.close()
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_udp_datagrams_dropped_when_queue_full():
+    release = asyncio.Event()
+    server = LogIngestionServer(Recorder(release), host='127.0.0.1', tcp_port=None, udp_port=0,
+                                queue_size=2, workers=1)
+    await server.start()
+    try:
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=('127.0.0.1', server.udp_port))
+        for i in range(10):
+            transport.sendto(b'datagram %d' % i)
+        transport.close()
+
+        await wait_for(lambda: server.stats['udp_datagrams'] == 10)
+        assert server.stats['udp_dropped'] >= 7
+        assert server.queue.qsize() == 2
+    finally:
+        release.set()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_collector_tags_lines_with_transport():
+    collector = ApplicationLogCollector()
+    forwarded = []
+
+    async def forward(entry):
+        forwarded.append(entry)
+
+    collector.forward_log_to_pipeline = forward
+    await collector.process_tcp_log('{"level": "warn", "message": "disk low"}', '10.0.0.5', 'udp')
+
+    assert forwarded[0].source == 'udp_application'
+    assert forwarded[0].level == 'WARN'
+    assert forwarded[0].metadata == {'source_ip': '10.0.0.5', 'ingestion_method': 'udp', 'log_format': 'json'}
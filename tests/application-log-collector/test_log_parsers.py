@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the multi-format log parser registry
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/application-log-collector'))
+
+from app_log_collector import ApplicationLogCollector, LogParserRegistry
+
+
+@pytest.mark.parametrize("line, expected", [
+    ('{"level": "warn", "message": "disk low", "logger": "io"}',
+     {"format": "json", "level": "warn", "message": "disk low", "logger": "io"}),
+    ('2024-01-01 12:00:00,123 ERROR [main] c.e.Nav: GPS lost',
+     {"format": "logback", "level": "ERROR", "thread": "main", "logger": "c.e.Nav", "message": "GPS lost"}),
+    ('2024-01-01 12:00:00.123 [pool-1] INFO  c.e.Nav - GPS ok',
+     {"format": "logback_default", "level": "INFO", "thread": "pool-1", "logger": "c.e.Nav", "message": "GPS ok"}),
+    ('2024-01-01 12:00:00,123 - nav.gps - WARNING - weak signal',
+     {"format": "python", "level": "WARNING", "logger": "nav.gps", "message": "weak signal"}),
+    ('2024-01-01T12:00:00.123Z info: started',
+     {"format": "winston", "level": "info", "message": "started"}),
+    ('level=warn msg="disk \\"sda\\" slow" dev=sda',
+     {"format": "logfmt", "level": "warn", "message": 'disk "sda" slow', "fields": {"dev": "sda"}}),
+    ('hello = world', {"format": "plain", "message": "hello = world"}),
+])
+def test_formats_are_detected(line, expected):
+    parsed = LogParserRegistry().parse(line)
+
+    assert {key: parsed[key] for key in expected} == expected
+
+
+def test_syslog_formats():
+    registry = LogParserRegistry()
+
+    rfc5424 = registry.parse('<165>1 2003-10-11T22:14:15.003Z bridge-01 nav 123 ID47 '
+                             '[meta seq="1"] course changed')
+    rfc3164 = registry.parse("<34>Oct 11 22:14:15 engine-01 su[230]: 'su root' failed")
+
+    assert rfc5424["format"] == "syslog_rfc5424"
+    assert (rfc5424["host"], rfc5424["application"], rfc5424["level"]) == ("bridge-01", "nav", "INFO")
+    assert rfc5424["fields"] == {"facility": 20, "procid": "123", "msgid": "ID47", "structured_data": '[meta seq="1"]'}
+    assert rfc5424["message"] == "course changed"
+    assert rfc3164["format"] == "syslog_rfc3164"
+    assert (rfc3164["host"], rfc3164["level"], rfc3164["message"]) == ("engine-01", "FATAL", "'su root' failed")
+
+
+def test_detected_format_is_cached_per_source():
+    registry = LogParserRegistry()
+
+    for n in range(5):
+        registry.parse(f'2024-01-01T12:00:00.123Z info: event {n}', source="tcp:10.0.0.5")
+    registry.parse('{"message": "switched"}', source="tcp:10.0.0.5")
+
+    assert registry.stats == {"cache_hits": 4, "detections": 2, "unparsed": 0}
+    assert registry.source_formats() == {"tcp:10.0.0.5": "json"}
+
+
+def test_source_cache_is_bounded():
+    registry = LogParserRegistry(cache_size=2)
+
+    for source in ("a", "b", "c"):
+        registry.parse('{"message": "x"}', source=source)
+
+    assert list(registry.source_formats()) == ["b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_collector_keeps_parsed_logger_thread_and_fields():
+    collector = ApplicationLogCollector()
+    forwarded = []
+
+    async def forward(entry):
+        forwarded.append(entry)
+
+    collector.forward_log_to_pipeline = forward
+    await collector.process_tcp_log('2024-01-01 12:00:00,123 ERROR [main] c.e.Nav: GPS lost', '10.0.0.5')
+    await collector.process_tcp_log('<13>Oct 11 22:14:15 engine-01 pump[7]: pressure low', '10.0.0.6', 'udp')
+
+    java, syslog = forwarded
+    assert (java.logger_name, java.thread, java.level, java.message) == ("c.e.Nav", "main", "ERROR", "GPS lost")
+    assert java.metadata["log_format"] == "logback"
+    assert (syslog.host, syslog.application, syslog.level) == ("engine-01", "pump", "INFO")
+    assert syslog.metadata["procid"] == "7"
+    assert syslog.metadata["source_ip"] == "10.0.0.6"
+
+
+def test_plain_lines_do_not_replace_cached_format():
+    registry = LogParserRegistry()
+
+    registry.parse('free text first', source="udp:10.0.0.7")
+    assert registry.parse('level=info msg=ok', source="udp:10.0.0.7")["format"] == "logfmt"
+    registry.parse('more free text', source="udp:10.0.0.7")
+
+    assert registry.source_formats() == {"udp:10.0.0.7": "logfmt"}
+
+
+def test_json_with_trailing_garbage_is_not_json():
+    registry = LogParserRegistry()
+
+    assert registry.parse('{"message": "ok"} trailing')["format"] == "plain"
+    assert registry.parse('{"message": "ok"}')["format"] == "json"
+
+
+def test_logfmt_rejects_long_query_strings_in_linear_time():
+    query = "&".join(f"p{n}=v{n}" for n in range(200))
+    registry = LogParserRegistry()
+
+    start = time.perf_counter()
+    parsed = registry.parse(f"status=200 url=/api/search?{query} took 5ms")
+    assert time.perf_counter() - start < 0.5
+    assert parsed["format"] == "plain"
+    assert registry.parse(f"level=info url=/api/search?{query} took=5ms")["fields"]["url"] == f"/api/search?{query}"
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the streaming NDJSON bulk log endpoint
+"""
+
+import os
+import sys
+import gzip
+import json
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/application-log-collector'))
+
+import app_log_collector
+from app_log_collector import BatchedLogPublisher, BodyDecompressor, UnsupportedEncoding
+
+
+class FakeNats:
+    is_closed = False
+
+    def __init__(self):
+        self.records = []
+
+    async def publish(self, subject, payload):
+        if subject == "logs.applications":
+            self.records.extend(json.loads(line) for line in payload.split(b"\n"))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    publisher = BatchedLogPublisher(max_batch_lines=50, flush_interval=0.001)
+    publisher.nats_client = FakeNats()
+    monkeypatch.setattr(app_log_collector.service, 'publisher', publisher)
+    client = TestClient(app_log_collector.app)
+    client.nats = publisher.nats_client
+    return client
+
+
+def ndjson(count, **overrides):
+    entries = [{"timestamp": "2024-01-01T12:00:00Z", "level": "warn", "message": f"event {n}",
+                "service_name": "nav", "application": "bridge", **overrides} for n in range(count)]
+    return "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+
+
+def test_plain_ndjson_is_published(client):
+    response = client.post("/api/logs/ndjson?batch_id=b-1", content=ndjson(120))
+
+    assert response.status_code == 200
+    result = response.json()["batch_result"]
+    assert (result["processed"], result["errors"], result["batch_id"]) == (120, 0, "b-1")
+    assert len(client.nats.records) == 120
+    first = client.nats.records[0]
+    assert first["level"] == "WARN"
+    assert first["timestamp"] == "2024-01-01T12:00:00Z"
+    assert first["metadata"] == {"ingestion_method": "http_ndjson", "batch_id": "b-1"}
+
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("gzip", gzip.compress),
+    ("deflate", zlib.compress),
+])
+def test_compressed_bodies(client, encoding, compress):
+    response = client.post("/api/logs/ndjson", content=compress(ndjson(500)),
+                           headers={"Content-Encoding": encoding})
+
+    assert response.json()["batch_result"]["processed"] == 500
+
+
+def test_concatenated_gzip_members(client):
+    body = gzip.compress(ndjson(3)) + gzip.compress(ndjson(2, application="engine"))
+
+    response = client.post("/api/logs/ndjson", content=body, headers={"Content-Encoding": "gzip"})
+
+    assert response.json()["batch_result"]["processed"] == 5
+
+
+def test_zstd_body(client):
+    zstandard = pytest.importorskip("zstandard")
+
+    compressor = zstandard.ZstdCompressor()
+    body = compressor.compress(ndjson(10)) + compressor.compress(ndjson(5))
+
+    response = client.post("/api/logs/ndjson", content=body, headers={"Content-Encoding": "zstd"})
+
+    assert response.json()["batch_result"]["processed"] == 15
+
+
+def test_invalid_lines_are_reported_and_skipped(client):
+    body = b"\n".join([
+        b'{"message": "ok", "service_name": "nav", "application": "bridge"}',
+        b'{"message": "no service", "application": "bridge"}',
+        b'not json',
+        b'{"message": 5, "service_name": "nav", "application": "bridge"}',
+        b'',
+        b'{"message": "ok", "service_name": "nav", "application": "bridge", "timestamp": "yesterday"} x',
+        b'{"message": "last", "service_name": "nav", "application": "bridge", "timestamp": "yesterday"}',
+    ])
+
+    result = client.post("/api/logs/ndjson", content=body).json()["batch_result"]
+
+    assert (result["processed"], result["errors"]) == (2, 4)
+    assert [sample["line"] for sample in result["error_samples"]] == [2, 3, 4, 6]
+    assert result["error_samples"][0]["error"] == "service_name must be a string"
+    assert client.nats.records[-1]["timestamp"] != "yesterday"
+
+
+def test_timestamps_are_normalized_to_utc(client):
+    body = b"\n".join([
+        b'{"message": "a", "service_name": "nav", "application": "bridge", "timestamp": "2024-01-01T14:00:00+02:00"}',
+        b'{"message": "b", "service_name": "nav", "application": "bridge", "timestamp": "2024-01-01T12:00:00.5Z"}',
+        b'{"message": "c", "service_name": "nav", "application": "bridge"}',
+    ])
+
+    client.post("/api/logs/ndjson", content=body)
+
+    offset, utc, missing = [record["timestamp"] for record in client.nats.records]
+    assert offset == "2024-01-01T12:00:00.000Z"
+    assert utc == "2024-01-01T12:00:00.5Z"
+    assert missing.endswith("Z") and missing[10] == "T"
+
+
+def test_unsupported_and_corrupt_bodies(client):
+    assert client.post("/api/logs/ndjson", content=b"x", headers={"Content-Encoding": "br"}).status_code == 415
+    assert client.post("/api/logs/ndjson", content=b"not gzip at all",
+                       headers={"Content-Encoding": "gzip"}).status_code == 400
+
+
+def test_decompressor_bounds_each_piece():
+    decompressor = BodyDecompressor("gzip", max_piece=1000)
+    body = gzip.compress(b"a" * 100000)
+
+    pieces = list(decompressor.decompress(body))
+
+    assert max(len(piece) for piece in pieces) <= 1000
+    assert sum(len(piece) for piece in pieces) == 100000
+    with pytest.raises(UnsupportedEncoding):
+        BodyDecompressor("compress")
@@ -0,0 +1,11 @@
+"""
+Shared pytest setup
+
+Service images copy the modules in services/shared next to each service;
+the test suite gets the same imports by putting services/shared on sys.path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'services', 'shared'))
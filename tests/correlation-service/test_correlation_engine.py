@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-memory correlation engine
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/correlation-service'))
+
+from correlation_service import CorrelationEngine, ExpiringIndex
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_event(**overrides):
+    event = {
+        "ship_id": "dhruv-ship",
+        "event_source": "basic_metrics",
+        "metric_name": "disk_usage",
+        "metric_value": 91.0,
+        "anomaly_score": 0.8,
+        "severity": "high",
+        "service": "node-exporter",
+        "host": "dhruv-system-01",
+    }
+    event.update(overrides)
+    return event
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def engine(clock):
+    return CorrelationEngine(clock=clock)
+
+
+def test_expiring_index_drops_entries_after_ttl():
+    index = ExpiringIndex(ttl=10)
+    index.set("a", 1, now=0)
+    index.set("b", 2, now=5)
+    index.set("a", 3, now=8)  # refresh keeps "a" alive past its first deadline
+
+    index.expire(now=12)
+    assert index.get("a", now=12) == 3
+    assert index.get("b", now=12) == 2
+
+    index.expire(now=16)
+    assert index.get("b", now=16) is None
+    assert len(index) == 1
+
+
+def test_expiring_index_caps_entries():
+    index = ExpiringIndex(ttl=60, max_entries=2)
+    for i in range(3):
+        index.set(i, i, now=i)
+    assert len(index) == 2
+    assert index.get(0, now=3) is None
+
+
+def test_expiring_index_stays_bounded_when_hot_keys_are_refreshed():
+    index = ExpiringIndex(ttl=60, max_entries=10)
+    for i in range(10000):
+        index.set(i % 3, i, now=i * 0.001)  # three hot keys, never idle long enough to expire
+
+    assert len(index._entries) == 3
+    assert [index.get(key, now=10) for key in range(3)] == [9999, 9997, 9998]
+
+
+def test_single_anomaly_becomes_incident(engine):
+    incident = engine.process(make_event())
+
+    assert incident["incident_type"] == "single_anomaly"
+    assert incident["incident_severity"] == "high"
+    assert incident["ship_id"] == "dhruv-ship"
+    assert incident["suggested_runbooks"] == ["generic_investigation", "check_system_health"]
+    assert incident["metadata"]["correlated_events_count"] == 1
+
+
+def test_low_priority_events_are_suppressed(engine):
+    assert engine.process(make_event(anomaly_score=0.2)) is None
+    assert engine.process(make_event(anomaly_score=0.4, enrichment_context={"operational_priority": "low"})) is None
+    assert engine.stats["suppressed_low_priority"] == 2
+
+
+def test_repeated_error_is_deduplicated_within_window(engine, clock):
+    first = make_event(event_source="application_logs", metric_name="log_anomaly",
+                       log_message="2025-09-11 13:45:54 ERROR disk full on /var", tracking_id="t1")
+    repeat = dict(first, log_message="2025-09-11 13:47:10 ERROR disk full on /var", tracking_id="t2")
+
+    incident = engine.process(first)
+    assert incident["log_template"] == "<TS> ERROR disk full on /var"
+    clock.now += 60
+    assert engine.process(repeat) is None
+    assert engine.stats["duplicates"] == 1
+
+    clock.now += 1800
+    assert engine.process(dict(repeat, tracking_id="t3")) is not None
+
+
+def test_upstream_template_id_is_kept(engine, clock):
+    event = make_event(event_source="application_logs", metric_name="log_anomaly", tracking_id="t1",
+                       log_message="ERROR disk full on /var",
+                       metadata={"log_template_id": 42, "log_template": "ERROR disk full on <*>"})
+
+    incident = engine.process(event)
+    assert (incident["log_template_id"], incident["log_template"]) == (42, "ERROR disk full on <*>")
+    assert engine.log_templates.stats["messages"] == 0
+
+    clock.now += 60
+    # Same upstream template, different wording: still a duplicate
+    assert engine.process(dict(event, log_message="ERROR disk full on /data", tracking_id="t2")) is None
+    assert engine.stats["duplicates"] == 1
+
+
+def test_same_anomaly_on_another_device_is_not_a_duplicate(engine, clock):
+    assert engine.process(make_event(metric_name="cpu_usage", tracking_id="c1")) is not None
+    clock.now += 30
+    assert engine.process(make_event(metric_name="cpu_usage", tracking_id="c2")) is None
+
+    second_host = engine.process(make_event(metric_name="cpu_usage", host="dhruv-system-02"))
+    registry_device = engine.process(make_event(metric_name="cpu_usage", device_id="nav-switch-1"))
+
+    assert second_host is not None and registry_device is not None
+    assert engine.stats["duplicates"] == 1
+
+
+def test_cpu_and_memory_correlate_into_resource_pressure(engine, clock):
+    engine.process(make_event(metric_name="memory_usage", severity="critical", tracking_id="m1"))
+    clock.now += 30
+    incident = engine.process(make_event(metric_name="cpu_usage", severity="warning", tracking_id="c1"))
+
+    assert incident["incident_type"] == "resource_pressure"
+    assert incident["incident_severity"] == "critical"
+    assert len(incident["correlated_events"]) == 2
+    assert incident["metadata"]["correlation_confidence"] == 0.85
+    assert engine.stats["correlated"] == 1
+
+
+def test_application_log_correlates_with_cpu_metric(engine, clock):
+    engine.process(make_event(metric_name="cpu_usage", tracking_id="c1"))
+    clock.now += 5
+    incident = engine.process(make_event(event_source="application_logs", metric_name="log_anomaly",
+                                         log_message="OutOfMemoryError in worker", tracking_id="a1"))
+
+    assert incident["incident_type"] == "application_system_correlation"
+
+
+def test_correlation_window_expires(engine, clock):
+    engine.process(make_event(metric_name="memory_usage", tracking_id="m1"))
+    clock.now += 601
+    incident = engine.process(make_event(metric_name="cpu_usage", tracking_id="c1"))
+
+    assert incident["incident_type"] == "single_anomaly"
+
+
+def test_repeat_incident_is_suppressed_by_type_and_tracking_id(engine, clock):
+    assert engine.process(make_event(tracking_id="t1", log_message="disk almost full")) is not None
+    # Same tracking id, different error and metric
+    assert engine.process(make_event(tracking_id="t1", metric_name="other_metric",
+                                     log_message="inode table full")) is None
+    clock.now += 10
+    # New tracking id, but same incident type, ship, metric and service
+    assert engine.process(make_event(tracking_id="t2", log_message="disk quota exceeded")) is None
+    assert engine.stats["suppressed_repeat"] == 2
+
+    clock.now += 901
+    assert engine.process(make_event(tracking_id="t3", log_message="disk write failed")) is not None
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Unit tests for sliding-window stage statistics and latency sketches
+"""
+
+import os
+import sys
+import random
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/data-flow-visualization'))
+
+from data_flow_service import DataFlowEvent, DataFlowTracker, LatencySketch, StageWindow, TraceStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_event(stage="Data Ingestion", component="vector", status="completed", latency_ms=10.0):
+    return DataFlowEvent(
+        event_id="evt", tracking_id="trace-1", stage=stage, component=component,
+        timestamp=datetime.now(), status=status, data_size=10, latency_ms=latency_ms,
+    )
+
+
+def test_sketch_quantiles_within_relative_accuracy():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(3, 1) for _ in range(20000))
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+    assert LatencySketch().quantile(0.5) is None
+
+
+def test_sketches_merge_and_subtract():
+    first, second, combined = LatencySketch(), LatencySketch(), LatencySketch()
+    for value in range(1, 101):
+        first.add(value)
+        combined.add(value)
+    for value in range(500, 601):
+        second.add(value)
+        combined.add(value)
+
+    first.merge(second)
+    assert first.count == combined.count
+    assert first.quantile(0.99) == combined.quantile(0.99)
+
+    first.merge(second, sign=-1)
+    assert first.count == 100
+    assert first.quantile(0.99) == pytest.approx(99, rel=0.02)
+
+
+def test_window_rates_and_expiry():
+    clock = FakeClock()
+    window = StageWindow(window_seconds=60, clock=clock)
+    for second in range(10):
+        for _ in range(5):
+            window.record(is_error=(second == 0), latency_ms=100.0)
+        clock.now += 1
+
+    summary = window.summary()
+    assert summary['events'] == 50
+    assert summary['events_per_second'] == pytest.approx(50 / 11)
+    assert summary['error_rate'] == pytest.approx(0.1)
+    assert summary['latency_p50_ms'] == pytest.approx(100, rel=0.01)
+
+    clock.now += 55
+    summary = window.summary()
+    assert summary['events'] == 20
+    assert summary['errors'] == 0
+    assert summary['events_per_second'] == pytest.approx(20 / 60)
+
+    clock.now += 60
+    assert window.summary()['latency_p99_ms'] is None
+    assert window.summary()['events_per_second'] == 0
+
+
+def test_window_latency_tracks_recent_behaviour():
+    clock = FakeClock()
+    window = StageWindow(window_seconds=30, clock=clock)
+    for _ in range(100):
+        window.record(latency_ms=1000.0)
+    clock.now += 31
+    for _ in range(100):
+        window.record(latency_ms=5.0)
+
+    assert window.summary()['latency_p99_ms'] == pytest.approx(5, rel=0.01)
+
+
+def test_pipeline_health_uses_window():
+    clock = FakeClock()
+    tracker = DataFlowTracker(TraceStore(), window_seconds=60, clock=clock)
+    for _ in range(90):
+        tracker.add_flow_event(make_event(status='error'))
+    clock.now += 120
+    for _ in range(10):
+        tracker.add_flow_event(make_event(latency_ms=40.0))
+
+    stage = tracker.get_pipeline_health()['stages']['Data Ingestion']
+
+    assert stage['status'] == 'healthy'
+    assert stage['error_count'] == 90
+    assert stage['throughput_per_minute'] == 10
+    assert stage['latency_p95_ms'] == pytest.approx(40, rel=0.01)
+    assert stage['avg_latency_ms'] == pytest.approx(13)
+
+
+def test_prometheus_exposition():
+    tracker = DataFlowTracker(TraceStore(), window_seconds=60, clock=FakeClock())
+    tracker.add_flow_event(make_event(latency_ms=20.0))
+    tracker.add_flow_event(make_event(stage='Anomaly Detection', component='anomaly-detection', status='error',
+                                      latency_ms=None))
+
+    text = tracker.render_prometheus_metrics()
+
+    assert '# TYPE pipeline_stage_latency_ms summary' in text
+    assert 'pipeline_stage_events_total{stage="Data Ingestion",component="vector"} 1' in text
+    assert 'pipeline_stage_errors_total{stage="Anomaly Detection",component="anomaly-detection"} 1' in text
+    assert 'pipeline_stage_latency_ms{stage="Anomaly Detection",component="anomaly-detection",quantile="0.5"} NaN' in text
+    assert 'pipeline_stage_latency_ms_count{stage="Data Ingestion",component="vector"} 1' in text
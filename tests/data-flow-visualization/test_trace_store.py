@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the bounded trace store behind DataFlowTracker
+"""
+
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/data-flow-visualization'))
+
+from data_flow_service import DataFlowEvent, DataFlowTracker, TraceStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_event(n, tracking_id="trace-1", stage="Data Ingestion", status="completed"):
+    return DataFlowEvent(
+        event_id=f"evt-{n}",
+        tracking_id=tracking_id,
+        stage=stage,
+        component="vector",
+        timestamp=datetime(2024, 1, 1, 12, 0, n % 60),
+        status=status,
+        data_size=100,
+        latency_ms=5.0,
+    )
+
+
+def test_events_are_slotted():
+    event = make_event(1)
+
+    assert not hasattr(event, '__dict__')
+    assert event.to_dict()['metadata'] == {}
+    assert event.to_dict()['timestamp'] == "2024-01-01T12:00:01"
+
+
+def test_tail_returns_last_events_in_order():
+    store = TraceStore(max_events=5)
+    for n in range(8):
+        store.add(make_event(n, tracking_id=f"trace-{n}"))
+
+    assert len(store) == 5
+    assert [e.event_id for e in store.tail(3)] == ["evt-5", "evt-6", "evt-7"]
+    assert [e.event_id for e in store.tail(100)] == [f"evt-{n}" for n in range(3, 8)]
+    assert store.tail(0) == []
+
+
+def test_tail_by_stage():
+    store = TraceStore(max_events_per_stage=2)
+    for n in range(6):
+        store.add(make_event(n, stage="Data Ingestion" if n % 2 else "Data Storage"))
+
+    assert [e.event_id for e in store.tail(10, stage="Data Ingestion")] == ["evt-3", "evt-5"]
+    assert [e.event_id for e in store.tail(1, stage="Data Storage")] == ["evt-4"]
+    assert store.tail(10, stage="Unknown") == []
+
+
+def test_traces_are_bounded_by_count_least_recently_updated_first():
+    store = TraceStore(max_traces=2)
+    store.add(make_event(1, tracking_id="a"))
+    store.add(make_event(2, tracking_id="b"))
+    store.add(make_event(3, tracking_id="a"))
+    store.add(make_event(4, tracking_id="c"))
+
+    assert store.trace_count == 2
+    assert store.trace("b") == []
+    assert [e.event_id for e in store.trace("a")] == ["evt-1", "evt-3"]
+    assert store.stats["traces_evicted"] == 1
+
+
+def test_traces_expire_after_ttl():
+    clock = FakeClock()
+    store = TraceStore(trace_ttl=60, clock=clock)
+    store.add(make_event(1, tracking_id="a"))
+    clock.now += 30
+    store.add(make_event(2, tracking_id="b"))
+
+    clock.now += 31
+    assert store.trace("a") == []
+    assert len(store.trace("b")) == 1
+
+    store.add(make_event(3, tracking_id="c"))
+    assert store.trace_count == 2
+    assert store.stats["traces_expired"] == 1
+
+
+def test_events_per_trace_are_capped():
+    store = TraceStore(max_events_per_trace=3)
+    for n in range(10):
+        store.add(make_event(n))
+
+    assert [e.event_id for e in store.trace("trace-1")] == ["evt-7", "evt-8", "evt-9"]
+
+
+def test_tracker_uses_store_for_lineage_and_health():
+    tracker = DataFlowTracker(TraceStore(max_traces=100))
+    for n in range(3):
+        tracker.add_flow_event(make_event(n, tracking_id="trace-1"))
+    tracker.add_flow_event(make_event(3, tracking_id="trace-2"))
+
+    lineage = tracker.get_data_lineage("trace-1")
+    health = tracker.get_pipeline_health()
+
+    assert len(lineage) == 3
+    assert tracker.get_data_lineage("missing") == []
+    assert [e["event_id"] for e in tracker.get_recent_flows(2)] == ["evt-2", "evt-3"]
+    assert health["total_active_traces"] == 2
+    assert health["total_events_tracked"] == 4
+    assert health["trace_store"]["events_added"] == 4
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the device registry bulk lookup endpoint and invalidation events
+"""
+
+import os
+import json
+import importlib.util
+
+import pytest
+from fastapi.testclient import TestClient
+
+APP_PATH = os.path.join(os.path.dirname(__file__), '../../services/device-registry/app.py')
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Fresh registry module backed by a temporary database"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / "device_registry.db"))
+    spec = importlib.util.spec_from_file_location('device_registry_app', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    module.db.create_ship(module.Ship(ship_id="ship-01", name="MV Test"))
+    module.db.register_device("bridge-01", "10.0.0.5", "ship-01", "server", additional_ip_addresses=["10.0.1.5"])
+    return module
+
+
+def test_bulk_lookup_resolves_known_and_reports_unknown(registry):
+    client = TestClient(registry.app)
+
+    response = client.post("/lookup/bulk", json={"hostnames": ["bridge-01", "10.0.1.5", "ghost-01", "bridge-01"]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["mappings"]) == {"bridge-01", "10.0.1.5"}
+    assert body["mappings"]["bridge-01"]["ship_id"] == "ship-01"
+    assert body["mappings"]["10.0.1.5"]["device_id"] == body["mappings"]["bridge-01"]["device_id"]
+    assert body["not_found"] == ["ghost-01"]
+
+
+def test_bulk_lookup_matches_single_lookup(registry):
+    client = TestClient(registry.app)
+
+    bulk = client.post("/lookup/bulk", json={"hostnames": ["bridge-01", "10.0.0.5"]}).json()["mappings"]
+
+    for hostname in ("bridge-01", "10.0.0.5"):
+        assert bulk[hostname] == client.get(f"/lookup/{hostname}").json()["mapping"]
+
+
+def test_bulk_lookup_rejects_oversized_requests(registry):
+    client = TestClient(registry.app)
+
+    response = client.post("/lookup/bulk", json={"hostnames": [f"host-{i}" for i in range(1001)]})
+
+    assert response.status_code == 422
+
+
+def test_registration_publishes_invalidation(registry):
+    published = []
+
+    class FakeNats:
+        is_closed = False
+
+        async def publish(self, subject, payload):
+            published.append((subject, json.loads(payload)))
+
+    registry.nats_client = FakeNats()
+    client = TestClient(registry.app)
+
+    response = client.post("/devices/register", json={
+        "hostname": "engine-01", "ip_address": "10.0.0.9", "ship_id": "ship-01", "device_type": "plc"
+    })
+
+    assert response.status_code == 200
+    assert published == [(registry.INVALIDATION_SUBJECT, {
+        "hostnames": ["engine-01", "10.0.0.9"],
+        "device_id": response.json()["device_id"],
+        "ship_id": "ship-01",
+    })]
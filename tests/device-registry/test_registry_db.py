@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the pooled SQLite layer and in-memory mapping map of the device registry
+"""
+
+import os
+import sqlite3
+import asyncio
+import importlib.util
+
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(__file__), '../../services/device-registry/app.py')
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Fresh registry module backed by a temporary database"""
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / "device_registry.db"))
+    spec = importlib.util.spec_from_file_location('device_registry_app', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.db.create_ship(module.Ship(ship_id="ship-01", name="MV Test"))
+    yield module
+    module.db.close()
+
+
+def test_connections_use_wal_and_are_reused(registry):
+    with registry.db.get_connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        first = conn
+
+    with registry.db.get_connection() as conn:
+        assert conn is first
+
+
+def test_failed_write_does_not_leak_a_transaction(registry):
+    db = registry.db
+    db.pool.close()
+    db.pool = registry.SQLiteConnectionPool(db.db_path, size=1)
+
+    assert db.register_device("bridge-01", "10.0.0.5", "ship-01", "server") is not None
+    assert db.register_device("bridge-01", "10.0.0.5", "ship-01", "server") is None
+
+    with db.get_connection() as conn:
+        assert not conn.in_transaction
+    assert db.create_ship(registry.Ship(ship_id="ship-02", name="MV Other"))
+
+
+def test_every_identifier_resolves_from_memory(registry):
+    db = registry.db
+    device_id = db.register_device("bridge-01", "10.0.0.5", "ship-01", "server", additional_ip_addresses=["10.0.1.5"])
+
+    for identifier in ("bridge-01", "10.0.0.5", "10.0.1.5"):
+        assert db.mappings[identifier]["device_id"] == device_id
+        assert db.lookup_hostname(identifier)["matched_identifier"] == identifier
+    # Exact matches only: a prefix of a registered IP is not that device
+    assert db.lookup_hostname("10.0.0") is None
+
+
+def test_reregistered_identifier_is_refreshed_on_write(registry):
+    db = registry.db
+    db.register_device("bridge-01", "10.0.0.5", "ship-01", "server")
+    db.create_ship(registry.Ship(ship_id="ship-02", name="MV Other"))
+
+    replacement = db.register_device("bridge-01", "10.0.0.9", "ship-02", "server")
+
+    assert db.lookup_hostname("bridge-01")["device_id"] == replacement
+    assert db.lookup_hostname("bridge-01")["ship_id"] == "ship-02"
+
+
+def test_lookup_reads_through_to_rows_written_elsewhere(registry):
+    other = registry.DeviceRegistryDB(registry.db.db_path, pool_size=1)
+    device_id = other.register_device("engine-01", "10.0.0.7", "ship-01", "plc")
+    other.close()
+
+    assert "engine-01" not in registry.db.mappings
+    assert registry.db.lookup_hostname("engine-01")["device_id"] == device_id
+    assert registry.db.lookup_hostnames(["10.0.0.7", "ghost"]) == {"10.0.0.7": registry.db.mappings["10.0.0.7"]}
+
+
+def test_last_seen_is_batched(registry):
+    db = registry.db
+    db.register_device("bridge-01", "10.0.0.5", "ship-01", "server")
+    with db.get_connection() as conn:
+        before = conn.execute("SELECT last_seen FROM hostname_mappings WHERE hostname = 'bridge-01'").fetchone()[0]
+
+    db.touch(["bridge-01"])
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT last_seen FROM hostname_mappings WHERE hostname = 'bridge-01'").fetchone()[0] == before
+
+    db.flush_last_seen()
+    with db.get_connection() as conn:
+        assert conn.execute("SELECT last_seen FROM hostname_mappings WHERE hostname = 'bridge-01'").fetchone()[0] != before
+
+
+def test_legacy_devices_are_backfilled_as_aliases(registry, tmp_path):
+    path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE ships (ship_id TEXT PRIMARY KEY, name TEXT NOT NULL, fleet_id TEXT, location TEXT,
+                            status TEXT DEFAULT 'active', created_at TIMESTAMP, updated_at TIMESTAMP);
+        CREATE TABLE devices (device_id TEXT PRIMARY KEY, hostname TEXT NOT NULL, ip_address TEXT NOT NULL,
+                              ship_id TEXT NOT NULL, device_type TEXT NOT NULL, vendor TEXT, model TEXT,
+                              location TEXT, capabilities TEXT, created_at TIMESTAMP, updated_at TIMESTAMP);
+        INSERT INTO ships (ship_id, name) VALUES ('ship-01', 'MV Legacy');
+        INSERT INTO devices (device_id, hostname, ip_address, ship_id, device_type)
+        VALUES ('dev_legacy', 'radar-01', '10.0.0.8', 'ship-01', 'radar');
+    """)
+    conn.close()
+
+    db = registry.DeviceRegistryDB(path, pool_size=1)
+
+    assert db.lookup_hostname("radar-01")["device_id"] == "dev_legacy"
+    assert db.lookup_hostname("10.0.0.8")["device_id"] == "dev_legacy"
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_lookup_endpoint_serves_known_hosts_from_memory(registry):
+    registry.db.register_device("bridge-01", "10.0.0.5", "ship-01", "server")
+    registry.db.executor.shutdown()  # any database round trip would now fail
+
+    response = await registry.lookup_hostname("bridge-01", registry.db)
+
+    assert response["mapping"]["ship_id"] == "ship-01"
+    assert "bridge-01" in registry.db._last_seen
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the in-memory event time index behind anomaly grouping
+"""
+
+import os
+import sys
+import importlib.util
+
+import pytest
+
+# Loaded under its own name: services/anomaly-detection also has an anomaly_service module
+if 'enhanced_anomaly_service' not in sys.modules:
+    _spec = importlib.util.spec_from_file_location(
+        'enhanced_anomaly_service',
+        os.path.join(os.path.dirname(__file__), '../../services/enhanced-anomaly-detection/anomaly_service.py'))
+    sys.modules['enhanced_anomaly_service'] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules['enhanced_anomaly_service'])
+enhanced_anomaly_service = sys.modules['enhanced_anomaly_service']
+
+EventTimeIndex = enhanced_anomaly_service.EventTimeIndex
+
+DISK_FULL, FAN_LOW = 0x1111, 0x2222
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, minutes):
+        self.now += minutes * 60
+
+
+def test_first_event_is_isolated_and_new():
+    index = EventTimeIndex(clock=FakeClock())
+
+    summary = index.observe("ship-01", "dev-1", DISK_FULL)
+
+    assert summary == {
+        "temporal_pattern": "isolated_event",
+        "similar_events_1h": 0,
+        "similar_events_24h": 0,
+        "device_events_1h": 0,
+        "device_events_24h": 0,
+        "related_devices": [],
+    }
+
+
+def test_burst_within_minutes_is_clustered():
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    for _ in range(3):
+        index.observe("ship-01", "dev-1", DISK_FULL)
+        clock.advance(1)
+
+    summary = index.observe("ship-01", "dev-1", DISK_FULL)
+
+    assert summary["temporal_pattern"] == "clustered"
+    assert summary["similar_events_1h"] == 3
+
+
+def test_spread_out_repeats_are_recurring():
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    for _ in range(3):
+        index.observe("ship-01", "dev-1", DISK_FULL)
+        clock.advance(120)
+
+    summary = index.observe("ship-01", "dev-1", DISK_FULL)
+
+    assert summary["temporal_pattern"] == "recurring"
+    assert summary["similar_events_1h"] == 0
+    assert summary["similar_events_24h"] == 3
+
+
+def test_windows_expire_old_buckets():
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    index.observe("ship-01", "dev-1", DISK_FULL)
+    index.observe("ship-01", "dev-1", FAN_LOW)
+
+    clock.advance(61)
+    summary = index.observe("ship-01", "dev-1", DISK_FULL)
+    assert (summary["similar_events_1h"], summary["similar_events_24h"]) == (0, 1)
+    assert (summary["device_events_1h"], summary["device_events_24h"]) == (0, 2)
+
+    clock.advance(24 * 60)
+    summary = index.observe("ship-01", "dev-1", DISK_FULL)
+    assert summary["similar_events_24h"] == 0
+    assert summary["device_events_24h"] == 0
+
+
+def test_related_devices_share_template_on_same_ship():
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    index.observe("ship-01", "dev-2", DISK_FULL)
+    index.observe("ship-01", "dev-3", FAN_LOW)
+    index.observe("ship-02", "dev-4", DISK_FULL)
+
+    assert index.observe("ship-01", "dev-1", DISK_FULL)["related_devices"] == ["dev-2"]
+
+    clock.advance(61)
+    assert index.observe("ship-01", "dev-1", DISK_FULL)["related_devices"] == []
+
+
+def test_least_recently_seen_devices_are_evicted():
+    index = EventTimeIndex(max_devices=2, clock=FakeClock())
+    for device in ("dev-1", "dev-2", "dev-1", "dev-3"):
+        index.observe("ship-01", device, DISK_FULL)
+
+    assert len(index) == 2
+    assert index.stats["devices_evicted"] == 1
+    assert index.observe("ship-01", "dev-2", DISK_FULL)["similar_events_24h"] == 0
+
+
+def test_checkpoint_round_trip(tmp_path):
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    for minutes in (0, 30, 90):
+        index.observe("ship-01", "dev-1", DISK_FULL)
+        clock.advance(minutes)
+    path = str(tmp_path / "data" / "event_index.json")
+    index.checkpoint(path)
+
+    restored = EventTimeIndex.from_checkpoint(path, clock=clock)
+
+    assert restored.snapshot() == index.snapshot()
+    assert restored.observe("ship-01", "dev-1", DISK_FULL) == index.observe("ship-01", "dev-1", DISK_FULL)
+
+
+def test_snapshots_only_copy_changed_buckets():
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    for device in ("dev-1", "dev-2", "dev-3"):
+        index.observe("ship-01", device, DISK_FULL)
+    clock.advance(5)
+    index.observe("ship-01", "dev-1", FAN_LOW)
+    first = {device: dict(buckets) for _, device, buckets in index.snapshot()["devices"]}
+
+    index.observe("ship-01", "dev-1", DISK_FULL)  # minute still open at the last snapshot
+    clock.advance(1)
+    index.observe("ship-01", "dev-2", FAN_LOW)
+    second = {device: buckets for _, device, buckets in index.snapshot()["devices"]}
+
+    assert list(second["dev-1"].values()) == [[(DISK_FULL, 1)], [(FAN_LOW, 1), (DISK_FULL, 1)]]
+    # Closed minutes keep their copies and untouched devices are not re-read
+    assert second["dev-1"][min(first["dev-1"])] is first["dev-1"][min(first["dev-1"])]
+    assert all(second["dev-3"][m] is first["dev-3"][m] for m in first["dev-3"])
+
+    clock.advance(1440 - 6)
+    index.observe("ship-01", "dev-3", FAN_LOW)  # ages out every device's first minute
+    third = index.snapshot()
+    rebuilt = EventTimeIndex(clock=clock)
+    rebuilt.restore(third)
+    assert rebuilt.snapshot() == third
+    assert [len(buckets) for _, _, buckets in third["devices"]] == [1, 1, 1]
+
+
+def test_restore_skips_expired_buckets_and_bad_files(tmp_path):
+    clock = FakeClock()
+    index = EventTimeIndex(clock=clock)
+    index.observe("ship-01", "dev-1", DISK_FULL)
+    path = str(tmp_path / "event_index.json")
+    index.checkpoint(path)
+
+    clock.advance(25 * 60)
+    assert len(EventTimeIndex.from_checkpoint(path, clock=clock)) == 0
+
+    with open(path, 'w') as f:
+        f.write("{not json")
+    assert len(EventTimeIndex.from_checkpoint(path, clock=clock)) == 0
+    assert len(EventTimeIndex.from_checkpoint(str(tmp_path / "missing.json"))) == 0
+
+
+@pytest.mark.asyncio
+async def test_grouping_reports_index_history(tmp_path, monkeypatch):
+    monkeypatch.setenv('EVENT_INDEX_PATH', str(tmp_path / "event_index.json"))
+    service = enhanced_anomaly_service.EnrichedAnomalyDetectionService()
+    event = {"ship_id": "ship-01", "device_id": "dev-1", "log_message": "Disk usage at 91% on /dev/sda1"}
+
+    first = await service._group_anomalies_with_context(event)
+    second = await service._group_anomalies_with_context({**event, "log_message": "Disk usage at 97% on /dev/sda1"})
+
+    assert first["historical_patterns"]["pattern_type"] == "new_anomaly"
+    assert second["historical_patterns"]["pattern_type"] == "known_anomaly"
+    assert second["historical_patterns"]["similar_events_1h"] == 1
+    assert second["historical_patterns"]["message_template_id"] == first["historical_patterns"]["message_template_id"]
+
+    await service.checkpoint_event_index()
+    assert os.path.exists(tmp_path / "event_index.json")
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the LLM-backed analysis of the enhanced anomaly detection service
+"""
+
+import os
+import sys
+import asyncio
+import importlib.util
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+# Loaded under its own name: services/anomaly-detection also has an anomaly_service module
+if 'enhanced_anomaly_service' not in sys.modules:
+    _spec = importlib.util.spec_from_file_location(
+        'enhanced_anomaly_service',
+        os.path.join(os.path.dirname(__file__), '../../services/enhanced-anomaly-detection/anomaly_service.py'))
+    sys.modules['enhanced_anomaly_service'] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(sys.modules['enhanced_anomaly_service'])
+enhanced_anomaly_service = sys.modules['enhanced_anomaly_service']
+
+from llm_client import LLMClient, LLMUnavailable  # noqa: E402  (on sys.path via the service's shared-module fallback)
+
+LLMAnalysisBatcher = enhanced_anomaly_service.LLMAnalysisBatcher
+
+EVENT = {
+    "tracking_id": "trk-1",
+    "ship_id": "ship-01",
+    "anomaly_score": 0.5,
+    "log_message": "ERROR engine telemetry parse failure",
+    "enrichment_context": {"maritime_context": {"operational_status": "normal_operations"}},
+}
+
+
+def make_service(handler, window=0.01, **client_options):
+    service = enhanced_anomaly_service.EnrichedAnomalyDetectionService()
+    service.llm_client = LLMClient(transport=httpx.MockTransport(handler), **client_options)
+    service.llm_batcher.window = window
+    return service
+
+
+@pytest.mark.asyncio
+async def test_llm_response_drives_enhanced_analysis():
+    service = make_service(lambda request: httpx.Response(200, json={"response": "High risk: investigate engine"}))
+
+    analysis = await service._perform_enhanced_analysis_with_llm(EVENT)
+
+    assert analysis["analysis_method"] == "llm_enhanced"
+    assert analysis["risk_assessment"] == "high"
+    assert analysis["recommendations"] == ["immediate_investigation"]
+
+
+@pytest.mark.asyncio
+async def test_repeated_anomaly_is_served_from_prompt_cache():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"response": "medium"})
+
+    service = make_service(handler)
+    await service._perform_enhanced_analysis_with_llm(EVENT)
+    await service._perform_enhanced_analysis_with_llm({**EVENT, "tracking_id": "trk-2"})
+
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_saturated_llm_falls_back_to_rules_immediately():
+    release = asyncio.Event()
+
+    async def handler(request):
+        await release.wait()
+        return httpx.Response(200, json={"response": "medium"})
+
+    service = make_service(handler, max_concurrency=1, max_queue=0)
+    blocked = asyncio.ensure_future(service._perform_enhanced_analysis_with_llm(EVENT))
+    await asyncio.sleep(0.05)
+
+    analysis = await service._perform_enhanced_analysis_with_llm({**EVENT, "ship_id": "ship-02"})
+
+    assert analysis["analysis_method"] == "rule_based_enhanced"
+    assert service.llm_client.stats["rejected_saturated"] == 1
+    release.set()
+    assert (await blocked)["analysis_method"] == "llm_enhanced"
+
+
+@pytest.mark.asyncio
+async def test_llm_errors_fall_back_to_rules():
+    service = make_service(lambda request: httpx.Response(500))
+
+    analysis = await service._perform_enhanced_analysis_with_llm(EVENT)
+
+    assert analysis["analysis_method"] == "rule_based_enhanced"
+
+
+def test_generate_endpoint_is_ollama_compatible():
+    service = make_service(lambda request: httpx.Response(200, json={"response": "context"}))
+    client = TestClient(service.app)
+
+    response = client.post("/api/generate", json={"model": "llama2", "prompt": "Analyze", "stream": False})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "context"
+
+
+def test_generate_endpoint_returns_503_when_llm_unavailable():
+    service = make_service(lambda request: httpx.Response(500))
+    client = TestClient(service.app)
+
+    response = client.post("/api/generate", json={"prompt": "Analyze"})
+
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_burst_of_similar_events_sends_one_prompt():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, json={"response": "critical: investigate engine"})
+
+    service = make_service(handler, window=0.05)
+    events = [
+        {**EVENT, "tracking_id": f"trk-{i}", "device_id": "eng-01", "anomaly_score": score,
+         "log_message": f"ERROR engine telemetry parse failure at offset {i * 17}"}
+        for i, score in enumerate((0.4, 0.5, 0.6))
+    ]
+
+    results = await asyncio.gather(*(service._perform_enhanced_analysis_with_llm(e) for e in events))
+
+    assert len(calls) == 1
+    assert b"Occurrences in this burst: 3" in calls[0].content
+    assert [r["risk_assessment"] for r in results] == ["critical"] * 3
+    assert [r["enhanced_score"] for r in results] == [0.4 * 1.5, 0.5 * 1.5, 0.6 * 1.5]
+    assert service.llm_batcher.stats == {"events": 3, "batches": 1, "largest_batch": 3}
+
+
+@pytest.mark.asyncio
+async def test_batcher_keeps_ships_devices_and_messages_apart():
+    batches = []
+
+    async def analyze(events):
+        batches.append([e["id"] for e in events])
+        return len(events)
+
+    batcher = LLMAnalysisBatcher(analyze, window=0.02)
+    events = [
+        {"id": 1, "ship_id": "ship-01", "device_id": "d1", "log_message": "link down on port 3"},
+        {"id": 2, "ship_id": "ship-01", "device_id": "d1", "log_message": "link down on port 4"},
+        {"id": 3, "ship_id": "ship-02", "device_id": "d1", "log_message": "link down on port 3"},
+        {"id": 4, "ship_id": "ship-01", "device_id": "d2", "log_message": "link down on port 3"},
+        {"id": 5, "ship_id": "ship-01", "device_id": "d1", "log_message": "fan speed low"},
+    ]
+
+    results = await asyncio.gather(*(batcher.submit(e) for e in events))
+
+    assert sorted(batches) == [[1, 2], [3], [4], [5]]
+    assert results == [2, 2, 1, 1, 1]
+
+
+@pytest.mark.asyncio
+async def test_batch_flushes_early_at_max_size():
+    batches = []
+
+    async def analyze(events):
+        batches.append(len(events))
+        return "ok"
+
+    batcher = LLMAnalysisBatcher(analyze, window=60, max_batch=2)
+    event = {"ship_id": "ship-01", "log_message": "heartbeat missed"}
+
+    assert await asyncio.gather(batcher.submit(event), batcher.submit(event)) == ["ok", "ok"]
+    assert batches == [2]
+
+
+@pytest.mark.asyncio
+async def test_group_failure_reaches_every_member():
+    async def analyze(events):
+        raise LLMUnavailable("LLM circuit breaker open")
+
+    batcher = LLMAnalysisBatcher(analyze, window=0.01)
+    event = {"ship_id": "ship-01", "log_message": "heartbeat missed"}
+
+    results = await asyncio.gather(batcher.submit(event), batcher.submit(event), return_exceptions=True)
+
+    assert all(isinstance(r, LLMUnavailable) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_processes_events_concurrently():
+    service = make_service(lambda request: httpx.Response(200, json={"response": "medium"}))
+    started, release = [], asyncio.Event()
+
+    async def handle(msg):
+        started.append(msg)
+        await release.wait()
+
+    service._handle_enriched_event = handle
+    service.max_inflight_events = 2
+    await service._dispatch_enriched_event("a")
+    await service._dispatch_enriched_event("b")
+    third = asyncio.ensure_future(service._dispatch_enriched_event("c"))
+    await asyncio.sleep(0.01)
+
+    assert started == ["a", "b"]
+    assert not third.done()  # backpressure once the in-flight limit is reached
+    release.set()
+    await third
+    await asyncio.sleep(0.01)
+    assert started == ["a", "b", "c"]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Unit tests for incident point lookups and keyset pagination
+"""
+
+import os
+import sys
+import json
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/incident-api'))
+
+from incident_api import IncidentAPIService, INCIDENT_SELECT_COLUMNS, encode_cursor, decode_cursor
+
+
+class RecordingClickHouse:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, query, params=None):
+        self.queries.append((query, params))
+        return self.rows
+
+
+def make_row(incident_id="inc-1", created_at=datetime(2025, 9, 11, 13, 45, 54)):
+    values = {name: f"{name}-value" for name in INCIDENT_SELECT_COLUMNS}
+    values.update(incident_id=incident_id, created_at=created_at,
+                  correlated_events=json.dumps([{"id": "e1"}]), timeline="",
+                  metadata=json.dumps({"k": "v"}))
+    return tuple(values[name] for name in INCIDENT_SELECT_COLUMNS)
+
+
+@pytest.fixture
+def service():
+    return IncidentAPIService()
+
+
+def test_point_lookup_filters_on_incident_id(service):
+    service.clickhouse_client = RecordingClickHouse([make_row("inc-42")])
+
+    incident = service.get_incident_by_id("inc-42")
+
+    query, params = service.clickhouse_client.queries[0]
+    assert "WHERE incident_id = %(incident_id)s" in query
+    assert params == {"incident_id": "inc-42"}
+    assert incident["incident_id"] == "inc-42"
+    assert incident["correlated_events"] == [{"id": "e1"}]
+    assert incident["timeline"] == []
+
+
+def test_point_lookup_missing_returns_none(service):
+    service.clickhouse_client = RecordingClickHouse([])
+    assert service.get_incident_by_id("missing") is None
+
+
+def test_keyset_pagination_uses_sort_key(service):
+    service.clickhouse_client = RecordingClickHouse([])
+    after = (datetime(2025, 9, 1), "inc-9")
+
+    service.get_incidents(limit=20, ship_id="ship-a", cursor=after)
+
+    query, params = service.clickhouse_client.queries[0]
+    assert "(created_at, incident_id) < (%(cursor_created_at)s, %(cursor_incident_id)s)" in query
+    assert query.endswith("ORDER BY created_at DESC, incident_id DESC LIMIT %(limit)s")
+    assert "OFFSET" not in query
+    assert (params["cursor_created_at"], params["cursor_incident_id"]) == after
+    assert params["ship_id"] == "ship-a" and params["limit"] == 20
+
+
+def test_projection_selects_and_decodes_only_requested_columns(service):
+    service.clickhouse_client = RecordingClickHouse([("inc-1", datetime(2025, 9, 1), "open")])
+
+    incidents = service.get_incidents(fields=["status"])
+
+    query, _ = service.clickhouse_client.queries[0]
+    assert query.startswith("SELECT incident_id, created_at, status FROM")
+    assert incidents == [{"incident_id": "inc-1", "created_at": datetime(2025, 9, 1), "status": "open"}]
+
+
+def test_unknown_field_is_rejected(service):
+    with pytest.raises(ValueError):
+        service.get_incidents(fields=["status", "password"])
+
+
+def test_cursor_round_trip():
+    incident = {"incident_id": "inc-7", "created_at": datetime(2025, 9, 11, 13, 45, 54, 29000)}
+    assert decode_cursor(encode_cursor(incident)) == (incident["created_at"], "inc-7")
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
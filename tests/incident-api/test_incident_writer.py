@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batched ClickHouse incident writer
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/incident-api'))
+
+from clickhouse_driver.errors import ServerException
+
+from incident_api import IncidentBatchWriter, IncidentAPIService, INCIDENT_COLUMNS
+
+
+class FakeClickHouse:
+    def __init__(self, fail_times=0):
+        self.inserts = []
+        self.fail_times = fail_times
+
+    def execute(self, query, data, columnar=False):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise ConnectionError("clickhouse unavailable")
+        assert columnar
+        self.inserts.append((query, data))
+
+
+def make_row(i):
+    return tuple(f"{name}-{i}" for name in INCIDENT_COLUMNS)
+
+
+@pytest.mark.asyncio
+async def test_flushes_full_batches_as_columns():
+    fake = FakeClickHouse()
+    writer = IncidentBatchWriter(lambda: fake, batch_size=10, flush_interval=5)
+
+    for i in range(25):
+        await writer.submit(make_row(i))
+    await asyncio.sleep(0.05)
+
+    assert [len(data[0]) for _, data in fake.inserts] == [10, 10]
+    query, columns = fake.inserts[0]
+    assert query.startswith("INSERT INTO logs.incidents (incident_id, event_type")
+    assert len(columns) == len(INCIDENT_COLUMNS)
+    assert columns[0][:2] == ["incident_id-0", "incident_id-1"]
+
+    # The remainder is flushed on close
+    await writer.close()
+    assert writer.metrics()["rows_written"] == 25
+    assert writer.metrics()["queue_depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushes_after_interval():
+    fake = FakeClickHouse()
+    writer = IncidentBatchWriter(lambda: fake, batch_size=100, flush_interval=0.05)
+
+    await writer.submit(make_row(1))
+    await writer.submit(make_row(2))
+    await asyncio.sleep(0.15)
+
+    assert len(fake.inserts) == 1
+    assert writer.metrics()["last_batch_size"] == 2
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure():
+    release = asyncio.Event()
+
+    class BlockedWriter(IncidentBatchWriter):
+        async def _flush(self, batch):
+            await release.wait()
+
+    writer = BlockedWriter(lambda: FakeClickHouse(), batch_size=1, max_queue=2)
+    for i in range(3):  # one in flight, two buffered
+        await writer.submit(make_row(i))
+    await asyncio.sleep(0.01)
+
+    blocked = asyncio.create_task(writer.submit(make_row(99)))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+    assert writer.metrics()["queue_depth"] == 2
+
+    release.set()
+    await asyncio.wait_for(blocked, 1)
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_insert_is_retried():
+    fake = FakeClickHouse(fail_times=1)
+    writer = IncidentBatchWriter(lambda: fake, batch_size=1, flush_interval=0.01)
+
+    await writer.submit(make_row(1))
+    await asyncio.sleep(0.5)
+    await writer.close()
+
+    assert len(fake.inserts) == 1
+    assert writer.metrics()["flush_failures"] == 1
+    assert writer.metrics()["rows_dropped"] == 0
+
+
+class RejectingClickHouse(FakeClickHouse):
+    """Refuses any insert containing one of ``bad_ids``, like a server-side type error"""
+
+    def __init__(self, bad_ids):
+        super().__init__()
+        self.bad_ids = set(bad_ids)
+        self.attempts = 0
+
+    def execute(self, query, data, columnar=False):
+        self.attempts += 1
+        if self.bad_ids & set(data[0]):
+            raise ServerException("Cannot parse input", code=27)
+        super().execute(query, data, columnar)
+
+
+@pytest.mark.asyncio
+async def test_rejected_rows_are_isolated_and_the_rest_written():
+    fake = RejectingClickHouse({"incident_id-7", "incident_id-30"})
+    writer = IncidentBatchWriter(lambda: fake, batch_size=40, flush_interval=5)
+
+    for i in range(40):
+        await writer.submit(make_row(i))
+    await writer.close()
+
+    written = [incident_id for _, data in fake.inserts for incident_id in data[0]]
+    assert sorted(written) == sorted(f"incident_id-{i}" for i in range(40) if i not in (7, 30))
+    metrics = writer.metrics()
+    assert (metrics["rows_written"], metrics["rows_dropped"], metrics["rows_rejected"]) == (38, 2, 2)
+    assert fake.attempts < 40  # bisected, not retried row by row
+
+
+@pytest.mark.asyncio
+async def test_non_row_server_errors_are_retried_whole():
+    fake = RejectingClickHouse(set())
+    calls = []
+
+    def execute(query, data, columnar=False):
+        calls.append(len(data[0]))
+        if len(calls) == 1:
+            raise ServerException("Too many parts", code=252)
+        fake.inserts.append((query, data))
+
+    fake.execute = execute
+    writer = IncidentBatchWriter(lambda: fake, batch_size=4, flush_interval=5)
+    for i in range(4):
+        await writer.submit(make_row(i))
+    await writer.close()
+
+    assert calls == [4, 4]
+    assert writer.metrics()["rows_rejected"] == 0
+
+
+@pytest.mark.asyncio
+async def test_store_incident_queues_resolved_row():
+    service = IncidentAPIService()
+    fake = FakeClickHouse()
+    service.incident_writer = IncidentBatchWriter(lambda: fake, batch_size=1)
+
+    async def resolve(data):
+        return "dhruv-ship"
+    service.resolve_ship_id = resolve
+
+    await service.store_incident({
+        "incident_id": "test-incident-1",
+        "incident_type": "test_anomaly",
+        "incident_severity": "warning",
+        "host": "dhruv-system-01",
+        "service": "test-service",
+        "created_at": "2025-09-11T13:45:54.029Z",
+        "updated_at": "2025-09-11T13:45:54.029Z"
+    })
+    await service.incident_writer.close()
+
+    columns = dict(zip(INCIDENT_COLUMNS, fake.inserts[0][1]))
+    assert columns["incident_id"] == ["test-incident-1"]
+    assert columns["ship_id"] == ["dhruv-ship"]
+
+
+@pytest.mark.asyncio
+async def test_store_incident_records_log_template():
+    service = IncidentAPIService()
+    fake = FakeClickHouse()
+    service.incident_writer = IncidentBatchWriter(lambda: fake, batch_size=1)
+
+    async def resolve(data):
+        return "dhruv-ship"
+    service.resolve_ship_id = resolve
+
+    await service.store_incident({"incident_id": "log-1", "log_message": "ERROR disk full on /dev/sda1"})
+    await service.store_incident({"incident_id": "log-2", "log_template_id": 42, "log_template": "upstream"})
+    await service.store_incident({"incident_id": "metric-1", "metric_name": "cpu_usage"})
+    await service.incident_writer.close()
+
+    rows = [dict(zip(INCIDENT_COLUMNS, (col[0] for col in data))) for _, data in fake.inserts]
+    assert rows[0]["log_template"] == "ERROR disk full on /dev/sda<NUM>"
+    assert rows[0]["log_template_id"] > 0
+    assert (rows[1]["log_template_id"], rows[1]["log_template"]) == (42, "upstream")
+    assert (rows[2]["log_template_id"], rows[2]["log_template"]) == (0, "")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Unit tests for ship_id resolution through the shared device registry client
+"""
+
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/incident-api'))
+
+from incident_api import IncidentAPIService
+from registry_client import DeviceRegistryClient
+
+
+def make_service(handler):
+    service = IncidentAPIService()
+    service.registry_client = DeviceRegistryClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+@pytest.mark.asyncio
+async def test_registry_mapping_wins_and_is_cached():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"success": True, "mapping": {"ship_id": "ship-01", "device_id": "dev-1"}})
+
+    service = make_service(handler)
+
+    for _ in range(3):
+        assert await service.resolve_ship_id({"host": "bridge-01", "ship_id": "other-ship"}) == "ship-01"
+    assert calls == ["/lookup/bridge-01"]
+
+
+@pytest.mark.asyncio
+async def test_unknown_host_falls_back_without_repeat_requests():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(404, json={"detail": "Hostname not found in registry"})
+
+    service = make_service(handler)
+
+    assert await service.resolve_ship_id({"host": "dhruv-system-01"}) == "dhruv-ship"
+    assert await service.resolve_ship_id({"host": "dhruv-system-01", "ship_id": "ship-07"}) == "ship-07"
+    assert len(calls) == 1
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the single-pass incident summary and its TTL cache
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/incident-api'))
+
+from incident_api import IncidentAPIService, SummaryCache
+
+
+class CountingLoader:
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("clickhouse unavailable")
+        return {"total_incidents": self.calls}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_load():
+    loader = CountingLoader(delay=0.05)
+    cache = SummaryCache(loader, ttl=60)
+
+    results = await asyncio.gather(*(cache.get() for _ in range(20)))
+
+    assert loader.calls == 1
+    assert all(r == {"total_incidents": 1} for r in results)
+    assert await cache.get() == {"total_incidents": 1}
+    assert cache.stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_reloads_after_ttl_and_keeps_last_value_on_failure():
+    loader = CountingLoader()
+    cache = SummaryCache(loader, ttl=0.01)
+    assert await cache.get() == {"total_incidents": 1}
+
+    await asyncio.sleep(0.02)
+    assert await cache.get() == {"total_incidents": 2}
+
+    loader.fail = True
+    await asyncio.sleep(0.02)
+    assert await cache.get() == {"total_incidents": 2}
+    assert cache.stats["load_failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failure_without_cached_value_raises():
+    cache = SummaryCache(CountingLoader(fail=True), ttl=60)
+    with pytest.raises(ConnectionError):
+        await cache.get()
+
+
+def test_summary_counts_in_a_single_scan():
+    service = IncidentAPIService()
+    queries = []
+
+    class FakeClickHouse:
+        def execute(self, query, params=None):
+            queries.append(query)
+            return [(12, 5, 2)] if "countIf" in query else []
+
+    class RequestPathClient:
+        def execute(self, query, params=None):
+            raise AssertionError("summary must not share the request-path client")
+
+    service.summary_client = FakeClickHouse()
+    service.clickhouse_client = RequestPathClient()
+    summary = service.get_summary()
+
+    assert summary == {'total_incidents': 12, 'open_incidents': 5,
+                       'critical_incidents': 2, 'recent_incidents': []}
+    assert sum("FROM logs.incidents" in q and "count()" in q for q in queries) == 1
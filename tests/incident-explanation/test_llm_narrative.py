@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the optional LLM narrative of the incident explanation service
+"""
+
+import os
+import sys
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/incident-explanation'))
+
+from explanation_service import IncidentTranslator
+from llm_client import LLMClient
+
+INCIDENT = {
+    "incident_id": "inc-1",
+    "incident_type": "single_anomaly",
+    "incident_severity": "warning",
+    "ship_id": "ship-01",
+    "correlated_events": [{"metric_name": "cpu_usage", "value": 0.97}],
+}
+
+
+def make_translator(handler=None):
+    translator = IncidentTranslator()
+    if handler is not None:
+        translator.llm_client = LLMClient(transport=httpx.MockTransport(handler))
+    return translator
+
+
+@pytest.mark.asyncio
+async def test_template_explanation_when_llm_disabled():
+    explanation = await make_translator().translate_incident(INCIDENT)
+
+    assert explanation.incident_id == "inc-1"
+    assert explanation.what_happened.startswith("The cpu_usage measurement is showing unusual patterns")
+    assert explanation.historical_context == "No historical data available"
+
+
+@pytest.mark.asyncio
+async def test_llm_narrative_replaces_template_text():
+    translator = make_translator(lambda request: httpx.Response(200, json={"response": " The ship computer is overloaded. "}))
+
+    explanation = await translator.translate_incident(INCIDENT)
+
+    assert explanation.what_happened == "The ship computer is overloaded."
+
+
+@pytest.mark.asyncio
+async def test_llm_failure_keeps_template_text():
+    translator = make_translator(lambda request: httpx.Response(503))
+
+    explanation = await translator.translate_incident(INCIDENT)
+
+    assert explanation.what_happened.startswith("The cpu_usage measurement is showing unusual patterns")
+    assert explanation.confidence_level == "medium"
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared SNMP session: discovery sweeps, community caching
+and GETBULK interface table walks
+"""
+
+import os
+import sys
+import asyncio
+
+import pytest
+
+pytest.importorskip("pysnmp")
+pytest.importorskip("prometheus_client")
+pytest.importorskip("networkx")
+pytest.importorskip("aiohttp")
+
+from pysnmp.proto.rfc1902 import Counter32, Gauge32, Integer32, ObjectName, OctetString
+from pysnmp.proto.rfc1905 import endOfMibView
+from pysnmp.smi import view
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../services/network-device-collector'))
+
+import network_collector
+from network_collector import MIBRegistry, NetworkDeviceCollector, NetworkDevice, DeviceType, SnmpSession
+
+TIMEOUT = ("No SNMP response received before timeout", 0, 0, [])
+
+
+def oid(text):
+    return tuple(int(part) for part in text.split('.'))
+
+
+def interface_objects(indexes, in_octets=1000, out_octets=2000, speed=1000000):
+    objects = {}
+    for index in indexes:
+        objects.update({
+            f"{MIBRegistry.IF_DESCR}.{index}": OctetString(f"Gi0/{index}"),
+            f"{MIBRegistry.IF_SPEED}.{index}": Gauge32(speed),
+            f"{MIBRegistry.IF_ADMIN_STATUS}.{index}": Integer32(1),
+            f"{MIBRegistry.IF_OPER_STATUS}.{index}": Integer32(2 if index == indexes[-1] else 1),
+            f"{MIBRegistry.IF_IN_OCTETS}.{index}": Counter32(in_octets),
+            f"{MIBRegistry.IF_OUT_OCTETS}.{index}": Counter32(out_octets),
+            f"{MIBRegistry.IF_IN_PACKETS}.{index}": Counter32(10),
+            f"{MIBRegistry.IF_OUT_PACKETS}.{index}": Counter32(20),
+            f"{MIBRegistry.IF_IN_ERRORS}.{index}": Counter32(1),
+            f"{MIBRegistry.IF_OUT_ERRORS}.{index}": Counter32(2),
+            f"{MIBRegistry.IF_IN_DISCARDS}.{index}": Counter32(3),
+        })
+    # Only the first interface reports ifOutDiscards
+    objects[f"{MIBRegistry.IF_OUT_DISCARDS}.{indexes[0]}"] = Counter32(4)
+    return objects
+
+
+class FakeNetwork:
+    """SNMPv2c agents keyed by IP, answering the getCmd/bulkCmd coroutines
+
+    Requests with an unknown address or a wrong community time out, as a
+    real agent silently drops them.
+    """
+
+    def __init__(self, delay=0.0):
+        self.agents = {}
+        self.delay = delay
+        self.requests = []
+        self.in_flight = self.max_in_flight = 0
+
+    def add_agent(self, ip_address, community, objects):
+        self.agents[ip_address] = (community, {oid(name): value for name, value in objects.items()})
+
+    @staticmethod
+    def _requested(engine, varBinds):
+        mib = view.MibViewController(engine.getMibBuilder())
+        return [tuple(varBind.resolveWithMib(mib)[0].getOid()) for varBind in varBinds]
+
+    async def _answer(self, kind, engine, auth, target, varBinds):
+        ip_address = target.transportAddr[0]
+        self.requests.append((kind, ip_address, str(auth.communityName)))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        agent = self.agents.get(ip_address)
+        if agent is None or agent[0] != str(auth.communityName):
+            return None, None
+        return agent[1], self._requested(engine, varBinds)
+
+    async def get_cmd(self, engine, auth, target, context, *varBinds, lookupMib=True):
+        objects, requested = await self._answer("get", engine, auth, target, varBinds)
+        if objects is None:
+            return TIMEOUT
+        return None, 0, 0, [(ObjectName(name), objects[name]) for name in requested]
+
+    async def bulk_cmd(self, engine, auth, target, context, non_repeaters, max_repetitions, *varBinds,
+                       lookupMib=True):
+        objects, requested = await self._answer("bulk", engine, auth, target, varBinds)
+        if objects is None:
+            return TIMEOUT
+        names = sorted(objects)
+        table = []
+        for _ in range(max_repetitions):
+            row = []
+            for column, position in enumerate(requested):
+                following = next((name for name in names if name > position), None)
+                if following is None:
+                    row.append((ObjectName(position), endOfMibView))
+                else:
+                    requested[column] = following
+                    row.append((ObjectName(following), objects[following]))
+            table.append(row)
+        return None, 0, 0, table
+
+    def count(self, kind=None, ip_address=None):
+        return sum(1 for k, ip, _ in self.requests
+                   if (kind is None or k == kind) and (ip_address is None or ip == ip_address))
+
+
+@pytest.fixture
+def network(monkeypatch):
+    network = FakeNetwork()
+    monkeypatch.setattr(network_collector, 'getCmd', network.get_cmd)
+    monkeypatch.setattr(network_collector, 'bulkCmd', network.bulk_cmd)
+    return network
+
+
+@pytest.fixture(scope="module")
+def collector():
+    # Prometheus metrics register globally, so the collector is built once per module
+    return NetworkDeviceCollector("/nonexistent/config.yaml")
+
+
+@pytest.mark.asyncio
+async def test_bulk_walk_collects_every_column_over_several_round_trips(network):
+    objects = interface_objects([1, 2, 10])
+    objects["1.3.6.1.2.1.31.1.1.1.1.1"] = OctetString("ifXTable entry after ifTable")
+    network.add_agent("10.0.0.5", "public", objects)
+    session = SnmpSession(["public"], max_repetitions=2)
+
+    table = await session.bulk_walk("10.0.0.5", "public", *MIBRegistry.IF_TABLE_COLUMNS)
+
+    assert network.count("bulk") == 2
+    assert {index: str(value) for index, value in table[MIBRegistry.IF_DESCR].items()} == {
+        (1,): "Gi0/1", (2,): "Gi0/2", (10,): "Gi0/10"}
+    assert list(table[MIBRegistry.IF_OUT_DISCARDS]) == [(1,)]
+    assert all(len(table[column]) == 3 for column in MIBRegistry.IF_TABLE_COLUMNS
+               if column != MIBRegistry.IF_OUT_DISCARDS)
+
+
+@pytest.mark.asyncio
+async def test_bulk_walk_stops_at_end_of_mib_view(network):
+    network.add_agent("10.0.0.5", "public", interface_objects([1]))
+    session = SnmpSession(["public"], max_repetitions=50)
+
+    table = await session.bulk_walk("10.0.0.5", "public", MIBRegistry.IF_OUT_DISCARDS)
+
+    assert network.count("bulk") == 1
+    assert list(table[MIBRegistry.IF_OUT_DISCARDS]) == [(1,)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_walk_returns_none_when_the_device_stops_answering(network):
+    session = SnmpSession(["public"])
+
+    assert await session.bulk_walk("10.0.0.9", "public", *MIBRegistry.IF_TABLE_COLUMNS) is None
+    assert session.stats["no_response"] == 1
+
+
+@pytest.mark.asyncio
+async def test_probe_tries_communities_in_order_and_caches_the_answer(network):
+    network.add_agent("10.0.0.5", "private", {MIBRegistry.OID_SYSTEM_DESCR: OctetString("Cisco IOS")})
+    session = SnmpSession(["public", "private", "ship_monitor"])
+
+    community, descr = await session.probe("10.0.0.5")
+    assert (community, str(descr)) == ("private", "Cisco IOS")
+    assert [c for _, _, c in network.requests] == ["public", "private"]
+
+    network.requests.clear()
+    assert (await session.probe("10.0.0.5"))[0] == "private"
+    assert [c for _, _, c in network.requests] == ["private"]
+    assert session.stats["cached_community_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_cached_community_falls_back_to_the_others(network):
+    network.add_agent("10.0.0.5", "private", {MIBRegistry.OID_SYSTEM_DESCR: OctetString("Cisco IOS")})
+    session = SnmpSession(["public", "private"])
+    await session.probe("10.0.0.5")
+
+    network.add_agent("10.0.0.5", "public", {MIBRegistry.OID_SYSTEM_DESCR: OctetString("Cisco IOS")})
+    network.requests.clear()
+
+    assert (await session.probe("10.0.0.5"))[0] == "public"
+    assert [c for _, _, c in network.requests] == ["private", "public"]
+    assert session.community_cache == {"10.0.0.5": "public"}
+    assert await session.probe("10.0.0.6") is None
+    assert "10.0.0.6" not in session.community_cache
+
+
+@pytest.mark.asyncio
+async def test_parallel_probe_is_opt_in(network):
+    network.add_agent("10.0.0.5", "public", {MIBRegistry.OID_SYSTEM_DESCR: OctetString("Cisco IOS")})
+    session = SnmpSession(["public", "private", "ship_monitor"], parallel_probe=True)
+
+    assert (await session.probe("10.0.0.5"))[0] == "public"
+    assert sorted(c for _, _, c in network.requests) == ["private", "public", "ship_monitor"]
+
+
+@pytest.mark.asyncio
+async def test_sweep_bounds_concurrency_and_releases_slots_on_errors(network):
+    network.delay = 0.01
+    for last_octet in (5, 17):
+        network.add_agent(f"10.0.0.{last_octet}", "public",
+                          {MIBRegistry.OID_SYSTEM_DESCR: OctetString("Cisco IOS")})
+    session = SnmpSession(["public"], max_concurrency=8)
+    found = []
+
+    async def on_found(ip_address, community, descr):
+        found.append(ip_address)
+        if ip_address == "10.0.0.17":
+            raise RuntimeError("identification failed")
+
+    responding = await session.sweep([f"10.0.0.{n}" for n in range(1, 41)], on_found)
+
+    assert responding == 2
+    assert sorted(found) == ["10.0.0.17", "10.0.0.5"]
+    assert network.max_in_flight == 8
+    assert session.stats["errors"] == 1
+    # Every slot is back, so the next sweep is not starved
+    assert await asyncio.wait_for(session.sweep(["10.0.0.5"], on_found), 1) == 1
+
+
+def test_interface_metrics_handle_counter_wrap(collector):
+    collector.interface_counters.clear()
+    device = NetworkDevice(ip_address="10.0.0.5", hostname="sw1", device_type=DeviceType.SWITCH,
+                           vendor="cisco", model="", version="", location="", snmp_community="public",
+                           ports=0, uptime_seconds=0, last_seen="")
+
+    def table(in_octets, out_octets):
+        objects = interface_objects([1, 2], in_octets=in_octets, out_octets=out_octets)
+        walked = {column: {} for column in MIBRegistry.IF_TABLE_COLUMNS}
+        for name, value in objects.items():
+            column, _, index = name.rpartition('.')
+            walked[column][(int(index),)] = value
+        return walked
+
+    first = collector._build_interface_metrics(device, table(2 ** 32 - 500, 1000), now=100.0)
+    assert [i.utilization_percent for i in first] == [0.0, 0.0]
+    assert (first[0].oper_status, first[1].oper_status) == ("up", "down")
+    assert (first[0].out_discards, first[1].out_discards) == (4, 0)
+
+    # 1000 bytes in (across the 2**32 wrap) and 126000 bytes out over 2 s on a 1 Mbit/s link
+    second = collector._build_interface_metrics(device, table(500, 127000), now=102.0)
+    assert second[0].interface_name == "Gi0/1"
+    assert second[0].utilization_percent == 50.4
+
+
+@pytest.mark.asyncio
+async def test_discovery_sweeps_every_range_once_and_identifies_devices(collector, network):
+    network.add_agent("10.0.0.5", "public", {
+        MIBRegistry.OID_SYSTEM_DESCR: OctetString("Cisco Catalyst switch"),
+        MIBRegistry.OID_SYSTEM_NAME: OctetString("bridge-sw1"),
+        MIBRegistry.OID_SYSTEM_UPTIME: Integer32(4200),
+    })
+    collector.config['discovery']['ip_ranges'] = ['10.0.0.0/28', '10.0.0.0/29', 'not-a-range']
+    collector.config['discovery']['snmp_communities'] = ['public']
+    collector.snmp = SnmpSession.from_config(collector.config)
+    collector.devices.clear()
+
+    await collector._discover_devices()
+
+    assert collector.last_sweep['hosts_probed'] == 14
+    assert collector.last_sweep['devices_responding'] == 1
+    device = collector.devices["10.0.0.5"]
+    assert (device.hostname, device.device_type, device.uptime_seconds) == ("bridge-sw1", DeviceType.SWITCH, 4200)
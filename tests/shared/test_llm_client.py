@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared async LLM client
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from llm_client import CircuitBreaker, LLMClient, LLMUnavailable
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def ollama(calls, release=None, status=200):
+    """Mock Ollama transport recording prompts; optionally waits on ``release``"""
+    async def handler(request):
+        calls.append(request)
+        if release is not None:
+            await release.wait()
+        if status != 200:
+            return httpx.Response(status, json={"error": "model overloaded"})
+        return httpx.Response(200, json={"response": f"analysis #{len(calls)}"})
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_generate_posts_to_ollama_and_caches_result():
+    calls = []
+    client = LLMClient(transport=ollama(calls), model="mistral")
+
+    first = await client.generate("Analyze   this\nanomaly")
+    second = await client.generate("Analyze this anomaly")
+
+    assert first == second == "analysis #1"
+    assert len(calls) == 1
+    assert calls[0].url.path == "/api/generate"
+    assert b'"model":"mistral"' in calls[0].content.replace(b' ', b'')
+    assert client.stats["cache_hits"] == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_cache_entries_expire_after_ttl():
+    calls, clock = [], FakeClock()
+    client = LLMClient(transport=ollama(calls), cache_ttl=60, clock=clock)
+
+    await client.generate("prompt")
+    clock.now += 61
+    assert await client.generate("prompt") == "analysis #2"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_prompts_share_one_request():
+    calls, release = [], asyncio.Event()
+    client = LLMClient(transport=ollama(calls, release))
+
+    tasks = [asyncio.ensure_future(client.generate("same prompt")) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert results == ["analysis #1"] * 5
+    assert len(calls) == 1
+    assert client.stats["coalesced"] == 4
+    assert client.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_cap_and_saturation_fail_fast():
+    calls, release = [], asyncio.Event()
+    client = LLMClient(transport=ollama(calls, release), max_concurrency=2, max_queue=1)
+
+    tasks = [asyncio.ensure_future(client.generate(f"prompt {i}")) for i in range(3)]
+    await asyncio.sleep(0.01)
+    assert len(calls) == 2  # third prompt waits for a slot
+    assert client.pending == 3
+
+    with pytest.raises(LLMUnavailable, match="saturated"):
+        await client.generate("prompt 4")
+    assert client.stats["rejected_saturated"] == 1
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failures_open_the_breaker_until_reset():
+    calls, clock = [], FakeClock()
+    client = LLMClient(transport=ollama(calls, status=500), failure_threshold=2, reset_timeout=30, clock=clock)
+
+    for i in range(2):
+        with pytest.raises(LLMUnavailable, match="request failed"):
+            await client.generate(f"prompt {i}")
+    assert client.breaker.state == "open"
+
+    with pytest.raises(LLMUnavailable, match="circuit breaker open"):
+        await client.generate("prompt 2")
+    assert len(calls) == 2
+
+    clock.now += 31
+    assert client.breaker.state == "half_open"
+    with pytest.raises(LLMUnavailable, match="request failed"):
+        await client.generate("prompt 3")
+    assert client.breaker.state == "open"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_request():
+    calls, release = [], asyncio.Event()
+    client = LLMClient(transport=ollama(calls, release))
+
+    first = asyncio.ensure_future(client.generate("prompt"))
+    second = asyncio.ensure_future(client.generate("prompt"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    release.set()
+
+    assert await second == "analysis #1"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_request_frees_the_half_open_slot():
+    calls, clock, release = [], FakeClock(), asyncio.Event()
+    client = LLMClient(transport=ollama(calls, release), failure_threshold=1, reset_timeout=30, clock=clock)
+    client.breaker.record_failure()
+    clock.now += 31
+
+    trial = asyncio.ensure_future(client.generate("prompt"))
+    await asyncio.sleep(0.01)
+    next(iter(client._inflight.values())).cancel()  # e.g. shutdown cancelling pending tasks
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    release.set()
+    assert client.breaker.state == "half_open"
+    assert await client.generate("prompt") == "analysis #2"
+    assert client.breaker.state == "closed"
+
+
+def test_breaker_allows_single_trial_when_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_from_env_reads_configuration(monkeypatch):
+    monkeypatch.setenv('OLLAMA_URL', 'http://llm.local:11434/')
+    monkeypatch.setenv('LLM_MODEL', 'mistral')
+    monkeypatch.setenv('LLM_MAX_CONCURRENCY', '8')
+
+    client = LLMClient.from_env(max_queue=5)
+
+    assert client.base_url == 'http://llm.local:11434'
+    assert client.model == 'mistral'
+    assert client.max_concurrency == 8
+    assert client.max_queue == 5
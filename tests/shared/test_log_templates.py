@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared streaming log template miner
+"""
+
+import pytest
+
+from log_templates import LogTemplateMiner, mask, template_id
+
+
+def test_mask_replaces_variable_fields():
+    masked = mask("2025-09-11T13:45:54.029Z db 10.0.0.5:5432 timeout after 3000ms "
+                  "req=5f2b9c1e-1111-2222-3333-444455556666 on node-7 addr 0x7ffe")
+    assert masked == "<TS> db <IP> timeout after <NUM>ms req=<UUID> on node-<NUM> addr <HEX>"
+
+
+def test_same_shape_messages_share_a_template():
+    miner = LogTemplateMiner()
+    first = miner.add("Disk usage at 91% on /dev/sda1")
+    second = miner.add("Disk usage at 47% on /dev/sda2")
+
+    assert first is second
+    assert first.template == "Disk usage at <NUM>% on /dev/sda<NUM>"
+    assert first.size == 2
+    assert miner.stats["cache_hits"] == 1
+
+
+def test_differing_token_is_generalised():
+    miner = LogTemplateMiner()
+    miner.add("Session opened for alice from console")
+    template = miner.add("Session opened for bob from bridge")
+
+    assert template.template == "Session opened for <*> from <*>"
+    assert miner.stats["templates_changed"] == 1
+
+
+def test_template_id_is_kept_when_the_template_generalises():
+    miner = LogTemplateMiner()
+    first_id = miner.add("connection to db-primary lost after timeout").template_id
+    generalised = miner.add("connection to db-replica lost after timeout")
+
+    assert generalised.template == "connection to <*> lost after timeout"
+    assert generalised.template_id == first_id
+    assert miner.add("connection to db-primary lost after timeout").template_id == first_id
+    # A fresh miner in another service agrees, whichever line it sees first
+    assert LogTemplateMiner().add("connection to db-replica lost after timeout").template_id == first_id
+
+
+def test_dissimilar_messages_get_separate_templates():
+    miner = LogTemplateMiner()
+    a = miner.add("Connection established to ntp server")
+    b = miner.add("Connection refused by gps receiver")
+    c = miner.add("Heartbeat ok")
+
+    assert len({a.template_id, b.template_id, c.template_id}) == 3
+    assert len(miner.templates) == 3
+
+
+def test_template_ids_do_not_depend_on_arrival_order():
+    lines = ["Session opened for alice from console", "Session opened for bob from bridge",
+             "Session opened for carol from 10.0.0.7"]
+    ids = set()
+    for order in (lines, lines[::-1], lines[1:] + lines[:1]):
+        miner = LogTemplateMiner()
+        ids.update(miner.add(line).template_id for line in order)
+        assert len(miner.templates) == 1
+    assert len(ids) == 1
+    assert 0 <= ids.pop() < 2 ** 64
+
+
+def test_dissimilar_templates_on_one_route_get_distinct_ids():
+    miner = LogTemplateMiner()
+    a = miner.add("Pump one started on upper deck")
+    b = miner.add("Pump one tripped by thermal overload")
+
+    assert a is not b
+    assert a.template_id == template_id("6 Pump one")
+    assert b.template_id != a.template_id
+
+
+def test_match_does_not_learn():
+    miner = LogTemplateMiner()
+    assert miner.match("Process started pid=12") is None
+    learned = miner.add("Process started pid=12")
+    assert miner.match("Process started pid=98765") is learned
+    assert len(miner.templates) == 1
+
+
+def test_max_children_routes_overflow_to_wildcard():
+    miner = LogTemplateMiner(max_children=2)
+    for word in ("alpha", "beta", "gamma", "delta"):
+        miner.add(f"{word} service restarted cleanly")
+    # alpha and beta own children; gamma and delta share the wildcard branch and merge
+    assert len(miner.templates) == 3
+
+
+def test_depth_must_allow_a_prefix_level():
+    with pytest.raises(ValueError):
+        LogTemplateMiner(depth=2)
+
+
+def test_least_recently_used_templates_are_evicted():
+    miner = LogTemplateMiner(max_templates=2)
+    heartbeat = miner.add("Heartbeat ok")
+    miner.add("Connection established to ntp server")
+    miner.add("Heartbeat ok")
+    miner.add("Pump alarm on deck")
+
+    assert miner.templates == [heartbeat, miner.match("Pump alarm on deck")]
+    assert miner.stats["templates_evicted"] == 1
+    assert miner.match("Connection established to ntp server") is None
+    # The evicted template's now-empty branch is pruned from the prefix tree
+    assert 5 not in miner._root
+
+    again = miner.add("Connection established to ntp server")
+    assert again.size == 1 and len(miner.templates) == 2
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the shared device registry client
+"""
+
+import json
+import asyncio
+
+import httpx
+import pytest
+
+from registry_client import DeviceRegistryClient, INVALIDATION_SUBJECT
+
+MAPPINGS = {
+    "bridge-01": {"ship_id": "ship-01", "device_id": "dev-1"},
+    "10.0.0.5": {"ship_id": "ship-02", "device_id": "dev-2"},
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def registry(calls, release=None, fail=False):
+    """Mock device-registry serving single and bulk lookups from MAPPINGS"""
+    async def handler(request):
+        calls.append((request.method, request.url.path))
+        if release is not None:
+            await release.wait()
+        if fail:
+            return httpx.Response(503)
+        if request.url.path == "/lookup/bulk":
+            hostnames = json.loads(request.content)["hostnames"]
+            found = {h: MAPPINGS[h] for h in hostnames if h in MAPPINGS}
+            return httpx.Response(200, json={"success": True, "mappings": found,
+                                             "not_found": [h for h in hostnames if h not in found]})
+        hostname = request.url.path.rsplit('/', 1)[-1]
+        if hostname not in MAPPINGS:
+            return httpx.Response(404, json={"detail": "Hostname not found in registry"})
+        return httpx.Response(200, json={"success": True, "hostname": hostname, "mapping": MAPPINGS[hostname]})
+    return httpx.MockTransport(handler)
+
+
+def make_client(calls, release=None, fail=False, **options):
+    return DeviceRegistryClient(transport=registry(calls, release, fail), **options)
+
+
+@pytest.mark.asyncio
+async def test_unknown_hosts_are_negatively_cached_for_shorter_ttl():
+    calls, clock = [], FakeClock()
+    client = make_client(calls, ttl=300, negative_ttl=30, clock=clock)
+
+    assert await client.lookup_hostname("ghost-01") is None
+    assert await client.lookup_hostname("ghost-01") is None
+    assert await client.lookup_hostname("bridge-01") == MAPPINGS["bridge-01"]
+    assert len(calls) == 2
+    assert client.stats["negative_hits"] == 1
+
+    clock.now += 31
+    await client.lookup_hostname("ghost-01")
+    await client.lookup_hostname("bridge-01")
+    assert calls.count(("GET", "/lookup/ghost-01")) == 2
+    assert calls.count(("GET", "/lookup/bridge-01")) == 1
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_registry_errors_are_cached_briefly():
+    calls = []
+    client = make_client(calls, fail=True)
+
+    assert await client.lookup_hostname("bridge-01") is None
+    assert await client.lookup_hostname("bridge-01") is None
+    assert len(calls) == 1
+    assert client.stats["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_request():
+    calls, release = [], asyncio.Event()
+    client = make_client(calls, release)
+
+    tasks = [asyncio.ensure_future(client.lookup_hostname("bridge-01")) for _ in range(10)]
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await asyncio.gather(*tasks) == [MAPPINGS["bridge-01"]] * 10
+    assert len(calls) == 1
+    assert client.stats["coalesced"] == 9
+
+
+@pytest.mark.asyncio
+async def test_lru_is_bounded():
+    calls = []
+    client = make_client(calls, cache_size=2)
+
+    for hostname in ("a", "b", "c", "a"):
+        await client.lookup_hostname(hostname)
+
+    assert client.snapshot()["cache_entries"] == 2
+    assert calls.count(("GET", "/lookup/a")) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_lookup_fetches_only_misses_in_chunks():
+    calls = []
+    client = make_client(calls, bulk_size=2)
+    await client.lookup_hostname("bridge-01")
+
+    results = await client.lookup_hostnames(["bridge-01", "10.0.0.5", "ghost-01", "ghost-02", "unknown", "10.0.0.5"])
+
+    assert results == {"bridge-01": MAPPINGS["bridge-01"], "10.0.0.5": MAPPINGS["10.0.0.5"],
+                       "ghost-01": None, "ghost-02": None, "unknown": None}
+    assert calls.count(("POST", "/lookup/bulk")) == 2
+    assert await client.lookup_hostname("ghost-02") is None
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_invalidation_drops_cached_entries():
+    calls = []
+    client = make_client(calls)
+    await client.lookup_hostname("ghost-01")
+    await client.lookup_hostname("bridge-01")
+
+    client.invalidate(["ghost-01"])
+    await client.lookup_hostname("ghost-01")
+    await client.lookup_hostname("bridge-01")
+    assert calls.count(("GET", "/lookup/ghost-01")) == 2
+    assert calls.count(("GET", "/lookup/bridge-01")) == 1
+
+    client.invalidate()
+    await client.lookup_hostname("bridge-01")
+    assert calls.count(("GET", "/lookup/bridge-01")) == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_lookup_is_not_overwritten():
+    calls, release = [], asyncio.Event()
+    client = make_client(calls, release)
+
+    pending = asyncio.ensure_future(client.lookup_hostname("ghost-01"))
+    await asyncio.sleep(0.01)
+    client.invalidate(["ghost-01"])
+    release.set()
+    assert await pending is None
+
+    assert client.snapshot()["cache_entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_nats_invalidation_events():
+    client = make_client([])
+
+    class FakeNats:
+        async def subscribe(self, subject, cb):
+            self.subject, self.cb = subject, cb
+
+    class Msg:
+        def __init__(self, payload):
+            self.data = payload
+
+    nats_client = FakeNats()
+    await client.subscribe_invalidations(nats_client)
+    await client.lookup_hostname("bridge-01")
+    await client.lookup_hostname("ghost-01")
+
+    await nats_client.cb(Msg(json.dumps({"hostnames": ["bridge-01"], "device_id": "dev-1"}).encode()))
+    assert nats_client.subject == INVALIDATION_SUBJECT
+    assert client.snapshot()["cache_entries"] == 1
+
+    await nats_client.cb(Msg(b"not json"))
+    assert client.snapshot()["cache_entries"] == 0
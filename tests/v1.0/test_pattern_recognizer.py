@@ -0,0 +1,50 @@
+"""
+Test cases for log template patterns in the post-incident Pattern Recognizer
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../src/v1_0'))
+
+from post_incident_review.pattern_recognizer import PatternRecognizer, PatternType, LearningType
+
+
+def make_incidents():
+    incidents = [
+        {
+            "incident_id": f"inc_{i}",
+            "start_time": f"2025-09-1{i}T10:00:00",
+            "affected_systems": ["navigation"],
+            "log_message": f"GPS fix lost after {i * 7} seconds on receiver {i}"
+        }
+        for i in range(4)
+    ]
+    incidents.append({"incident_id": "other", "start_time": "2025-09-15T10:00:00",
+                      "log_message": "Disk full on /var"})
+    return incidents
+
+
+def test_log_template_patterns():
+    """Incidents with the same error template form one pattern"""
+    recognizer = PatternRecognizer(min_pattern_frequency=3)
+
+    patterns = [p for p in recognizer.analyze_incidents(make_incidents())
+                if p.pattern_type == PatternType.LOG_TEMPLATE]
+
+    assert len(patterns) == 1
+    assert patterns[0].frequency == 4
+    assert patterns[0].affected_systems == {"navigation"}
+    assert patterns[0].metadata["log_template"] == "GPS fix lost after <NUM> seconds on receiver <NUM>"
+
+
+def test_log_template_learning():
+    """Recurring templates suggest a new detection scenario"""
+    recognizer = PatternRecognizer(min_pattern_frequency=3)
+    patterns = [p for p in recognizer.analyze_incidents(make_incidents())
+                if p.pattern_type == PatternType.LOG_TEMPLATE]
+
+    learnings = recognizer.extract_learning_insights(patterns)
+
+    assert learnings[0].learning_type == LearningType.NEW_SCENARIO
+    assert learnings[0].metadata["log_template_id"] == patterns[0].metadata["log_template_id"]